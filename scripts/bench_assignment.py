@@ -0,0 +1,123 @@
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.asignaciontentativa import assign_bundles_to_couriers
+from src.coord_transform import LAT_MIN, LAT_MAX, LON_MIN, LON_MAX
+from src.epoch_context import EpochContext
+from src.main import Courier, Order, Restaurant
+from src.simtime import SimClock
+
+
+def random_epoch(n_couriers, n_bundles, n_restaurants, seed):
+    """Couriers and bundles of one synthetic epoch with a mix of urgencies.
+
+    Orders were placed in the last 15 minutes and get ready up to 20
+    minutes later, so some can still meet the target click-to-door time
+    (Groups II and III) while the far ones cannot (Group I).
+    """
+    rng = random.Random(seed)
+    t0 = datetime(2025, 1, 1, 12, 0)
+
+    def point():
+        return (rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX))
+
+    restaurants = [Restaurant(i, point()) for i in range(n_restaurants)]
+    couriers = [Courier(i, t0, t0 + timedelta(hours=4), point()) for i in range(n_couriers)]
+    bundles = []
+    for k in range(n_bundles):
+        rest = rng.choice(restaurants)
+        bundle = []
+        for i in range(rng.randint(1, 3)):
+            placed = t0 - timedelta(seconds=rng.uniform(0, 900))
+            ready = placed + timedelta(seconds=rng.uniform(0, 1200))
+            o = Order(f'{k}-{i}', rest, placed, ready, point())
+            o.status = 'ready'
+            bundle.append(o)
+        bundles.append(bundle)
+    # la asignación trabaja en tiempo de simulación
+    clock = SimClock(t0)
+    clock.convert([o for b in bundles for o in b], couriers)
+    return couriers, bundles, clock.sim(t0)
+
+
+def run_mode(mode, couriers, bundles, t0):
+    """Assign a private copy of the epoch with ``ASSIGNMENT_MODE=mode``.
+
+    Returns the wall time and the (courier index, bundle index) pairs
+    that got a commitment.
+    """
+    couriers, bundles = copy.deepcopy((couriers, bundles))
+    os.environ['ASSIGNMENT_MODE'] = mode
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assign_bundles_to_couriers(couriers, bundles, t0)
+    elapsed = time.perf_counter() - started
+    column = {id(b): j for j, b in enumerate(bundles)}
+    pairs = [
+        (i, column[id(c.current_route['orders'])])
+        for i, c in enumerate(couriers) if c.current_route is not None
+    ]
+    return elapsed, pairs
+
+
+def run_benchmark(n_couriers=150, n_bundles=100, n_restaurants=15, epochs=5, seed=0):
+    """Compare the three-pass and the combined solve on random epochs.
+
+    Routing runs on the Euclidean fallback and the leg caches are warmed
+    first, so the time measured is classification, scoring, solving and
+    commitment.  Returns one dict of figures per mode; ``bundles`` counts
+    the bundles of each group over all epochs.
+    """
+    os.environ['USE_EUCLIDEAN'] = '1'
+    totals = {
+        mode: {'mode': mode, 'elapsed_s': 0.0, 'bundles': [0, 0, 0], 'assigned': [0, 0, 0], 'score': 0.0}
+        for mode in ('sequential', 'combined')
+    }
+    for epoch in range(epochs):
+        couriers, bundles, t0 = random_epoch(n_couriers, n_bundles, n_restaurants, seed + epoch)
+        context = EpochContext(couriers, bundles, t0)
+        groups = context.groups()
+        scores = context.scores()
+        for mode, total in totals.items():
+            for g in groups:
+                total['bundles'][g - 1] += 1
+            elapsed, pairs = run_mode(mode, couriers, bundles, t0)
+            total['elapsed_s'] += elapsed
+            for i, j in pairs:
+                total['assigned'][groups[j] - 1] += 1
+                total['score'] += scores[i, j]
+    return list(totals.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the three-pass and the combined courier-bundle assignment")
+    parser.add_argument('--couriers', type=int, default=150)
+    parser.add_argument('--bundles', type=int, default=100)
+    parser.add_argument('--restaurants', type=int, default=15)
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.couriers, args.bundles, args.restaurants, args.epochs, args.seed)
+    group_i, group_ii, group_iii = results[0]['bundles']
+    print(f"bundles per group: I={group_i} II={group_ii} III={group_iii}")
+    for result in results:
+        group_i, group_ii, group_iii = result['assigned']
+        print(
+            f"{result['mode']:>10}: {result['elapsed_s'] / args.epochs * 1000.0:.1f} ms/epoch | "
+            f"assigned I={group_i} II={group_ii} III={group_iii} | "
+            f"total score={result['score']:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import getrouteOSMR as routing
+from src.coord_transform import LAT_MIN, LAT_MAX, LON_MIN, LON_MAX
+from src.osrm_standin import OSRMStandin
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, math.ceil(q / 100.0 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def random_queries(n, stops, seed):
+    rng = random.Random(seed)
+
+    def point():
+        return (rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX))
+
+    return [(point(), [point() for _ in range(stops)]) for _ in range(n)]
+
+
+def run_benchmark(n_queries=500, stops=3, mode='sequential', seed=0, callers=8, **standin_options):
+    """Route ``n_queries`` random queries against a fresh stand-in server.
+
+    Every query is one timed ``get_route_details`` call; ``mode='sequential'``
+    issues them one after another, ``mode='concurrent'`` from ``callers``
+    threads.  Caches are cleared first so every query hits the server.
+    Returns a dict of throughput/latency figures.
+    """
+    queries = random_queries(n_queries, stops, seed)
+    with OSRMStandin(seed=seed, **standin_options) as server:
+        os.environ['OSRM_URL'] = server.url
+        os.environ['USE_EUCLIDEAN'] = '0'
+        os.environ.pop('OSRM_CACHE_PATH', None)
+        routing._osrm_cache.clear()
+        routing.clear_leg_cache()
+        routing.reset_routing_stats()
+
+        def timed(query):
+            t0 = time.perf_counter()
+            routing.get_route_details(*query)
+            return time.perf_counter() - t0
+
+        started = time.perf_counter()
+        if mode == 'concurrent':
+            with ThreadPoolExecutor(max_workers=callers) as pool:
+                latencies = list(pool.map(timed, queries))
+        else:
+            latencies = [timed(q) for q in queries]
+        elapsed = time.perf_counter() - started
+        counts = dict(server.counts)
+
+    snapshot = routing.routing_stats()
+    return {
+        'mode': mode,
+        'queries': n_queries,
+        'elapsed_s': elapsed,
+        'throughput_qps': n_queries / elapsed if elapsed > 0 else float('inf'),
+        'p50_ms': percentile(latencies, 50) * 1000.0,
+        'p95_ms': percentile(latencies, 95) * 1000.0,
+        'p99_ms': percentile(latencies, 99) * 1000.0,
+        'max_ms': max(latencies) * 1000.0 if latencies else 0.0,
+        'server': counts,
+        'fallbacks': snapshot['counters']['fallbacks'],
+        'http_errors': snapshot['counters']['http_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OSRM client throughput against the local stand-in")
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--stops', type=int, default=3, help="waypoints per query after the start")
+    parser.add_argument('--mode', choices=['sequential', 'concurrent', 'both'], default='both')
+    parser.add_argument('--callers', type=int, default=8, help="threads in concurrent mode")
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=3.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"OSRM_MAX_RETRIES={os.environ.get('OSRM_MAX_RETRIES', '3')} "
+          f"OSRM_BACKOFF_FACTOR={os.environ.get('OSRM_BACKOFF_FACTOR', '0.5')} "
+          f"OSRM_MAX_WORKERS={routing._max_workers()}")
+    modes = ['sequential', 'concurrent'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        result = run_benchmark(
+            args.queries, args.stops, mode, args.seed, args.callers,
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        )
+        print(
+            f"{mode:>10}: {result['throughput_qps']:.1f} queries/s in {result['elapsed_s']:.2f}s | "
+            f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms "
+            f"p99={result['p99_ms']:.1f}ms max={result['max_ms']:.1f}ms | "
+            f"server={result['server']} fallbacks={result['fallbacks']} errors={result['http_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,15 @@ from datetime import timedelta
 from src import config
 from src.main import run_simulation, Restaurant
 from src.grubhub_loader import load_instance
+from src.getrouteOSMR import set_planar_network
 import os
 
 def run_instance(instance_path):
-    orders, couriers, restaurants, params = load_instance(instance_path)
+    # PLANAR_TRAVEL_TIMES=1 routes on the instance's own planar travel times
+    # (same as the official evaluator) instead of OSRM over La Paz.
+    planar = os.environ.get('PLANAR_TRAVEL_TIMES') == '1'
+    orders, couriers, restaurants, params = load_instance(instance_path, planar=planar)
+    set_planar_network(params.pop('planar_network', None))
 
     
 
@@ -18,6 +23,11 @@ def run_instance(instance_path):
 
     # Enable OSRM routing by default
     os.environ['USE_EUCLIDEAN'] = '0'
+    # Reuse OSRM responses from previous runs (see src/route_cache.py)
+    os.environ.setdefault(
+        'OSRM_CACHE_PATH',
+        os.path.join(os.path.dirname(__file__), '..', 'results', 'cache', 'osrm_routes.sqlite'),
+    )
 
     simulation_start = min(
         min(c.on_time for c in couriers),
@@ -1,14 +1,15 @@
-from datetime import timedelta
+import os
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 
 from src.config import (
-    OPTIMIZATION_FREQUENCY,
-    TARGET_CLICK_TO_DOOR,
+    OPTIMIZATION_FREQUENCY_US,
+    TARGET_CLICK_TO_DOOR_US,
     SERVICE_TIME,
 )
-from src.getrouteOSMR import get_route_details
-from src.bundling import calculate_bundle_score
+from src.getrouteOSMR import get_route_summary, get_route_summaries, location_xy
+from src.epoch_context import EpochContext
+from src.assignment_solvers import INFEASIBLE_COST, lexicographic_costs, solve_assignment, solve_sparse
+from src.simtime import minutes_to_us, seconds_to_us, us_to_minutes
 
 def assign_order_to_nearest_courier(order, couriers, current_time):
     """
@@ -17,29 +18,59 @@ def assign_order_to_nearest_courier(order, couriers, current_time):
     best_courier = None
     min_dist = float('inf')
 
+    rx, ry = location_xy(order.restaurant.location)
     for courier in couriers:
         if courier.current_route is None:
             # Simplified distance calculation (Euclidean)
-            dist = np.sqrt((courier.location[0] - order.restaurant.location[0])**2 + 
-                         (courier.location[1] - order.restaurant.location[1])**2)
+            cx, cy = location_xy(courier.location)
+            dist = np.sqrt((cx - rx)**2 + (cy - ry)**2)
             if dist < min_dist:
                 min_dist = dist
                 best_courier = courier
 
     if best_courier:
-        route_data = get_route_details(
-            best_courier.location,
-            [order.restaurant.location, order.dropoff_loc]
-        )
-        if route_data:
-            best_courier.current_route = {
-                'orders': [order],
-                'route': route_data,
-                'start_time': current_time,
-                'completion_time': current_time + timedelta(seconds=route_data['duration']),
-                'commitment_type': 'final'
-            }
-            order.status = 'assigned'
+        commit_fcfs_order(order, best_courier, current_time)
+
+
+def commit_fcfs_order(order, courier, current_time):
+    """
+    Gives ``order`` to ``courier`` as a final route. Returns False when no
+    route could be computed (the courier stays free).
+    """
+    route_data = get_route_summary(
+        courier.location,
+        [order.restaurant.location, order.dropoff_loc]
+    )
+    if not route_data:
+        return False
+    courier.current_route = {
+        'orders': [order],
+        'route': route_data,
+        'start_time': current_time,
+        'completion_time': current_time + seconds_to_us(route_data['duration']),
+        'commitment_type': 'final',
+        'end_location': order.dropoff_loc
+    }
+    order.status = 'assigned'
+    return True
+
+
+def assign_orders_fcfs(orders, courier_index, current_time):
+    """
+    Batched FCFS: dispatches ``orders`` in turn, each to the nearest courier
+    of ``courier_index`` (a :class:`CourierGrid` of free couriers). Couriers
+    that get an order are removed from the index. Same result as calling
+    ``assign_order_to_nearest_courier`` per order when the index ranks
+    couriers in list order.
+    """
+    for order in orders:
+        if order.status != 'ready':
+            continue
+        courier = courier_index.nearest(*location_xy(order.restaurant.location))
+        if courier is None:
+            break
+        if commit_fcfs_order(order, courier, current_time):
+            courier_index.remove(courier)
 
 
 ###############################################################################
@@ -55,9 +86,16 @@ def classify_bundle(bundle, couriers, current_time):
     Group III: Everything else.
     """
     
+    # Request every route this classification needs in one concurrent batch
+    r_loc = bundle[0].restaurant.location
+    get_route_summaries(
+        [(c.location, [r_loc]) for c in couriers]
+        + [(r_loc, [o.dropoff_loc for o in bundle])]
+    )
+
     # 1) For each order in the bundle, find earliest_placement_time:
     earliest_placement = min(o.placement_time for o in bundle)
-    target_dropoff_time = earliest_placement + TARGET_CLICK_TO_DOOR
+    target_dropoff_time = earliest_placement + TARGET_CLICK_TO_DOOR_US
 
     # 2) We'll see if *any* courier can drop off by target_dropoff_time
     #    If none can, => Group I.
@@ -105,10 +143,10 @@ def tentative_assignment(route_data, current_time):
     if not route_data:
         return False
     duracion_min = (route_data['duration'] / 60.0) * 0.5  # mitad del tiempo de viaje por simplificación, se podría mejorar con un modelo de tráfico y ubicando el tiempo exacto desde su ubicación actual al restaurante
-    arrival_time = current_time + timedelta(minutes=duracion_min) 
-    return arrival_time <= current_time + OPTIMIZATION_FREQUENCY #Bool donde si el tiempo de llegada es menor al horizonte se considera true en el return
+    arrival_time = current_time + minutes_to_us(duracion_min) 
+    return arrival_time <= current_time + OPTIMIZATION_FREQUENCY_US #Bool donde si el tiempo de llegada es menor al horizonte se considera true en el return
 
-def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15):
+def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15, context=None):
     """
     Compromiso final: Si el repartidor puede llegar al restaurante antes de current_time + OPTIMIZATION_FREQUENCY 
     y todos los pedidos están listos, se hace un compromiso final (el repartidor recibe instrucciones para viajar al restaurante, recoger y entregar los pedidos).
@@ -124,14 +162,17 @@ def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15):
 
     Excepción:
     Si alguno de los pedidos en el paquete lleva listo más de 15 minutos (X_COMMITMENT), se omiten las reglas anteriores y se fuerza un compromiso final.
+
+    Con ``context`` (EpochContext) las rutas se arman con los tramos ya calculados en la época.
     """
+    route_summary = context.route if context is not None else get_route_summary
     # variable que revisa si alguna orden lleva lista más de 15 minutos
     ready_too_long = any(
-        (current_time - o.ready_time).total_seconds() / 60.0 > X_COMMITMENT for o in bundle
+        us_to_minutes(current_time - o.ready_time) > X_COMMITMENT for o in bundle
     )
     
     # obtener la ruta del buldle
-    route_data = get_route_details(
+    route_data = route_summary(
         courier.location,
         [o.restaurant.location for o in bundle] + [o.dropoff_loc for o in bundle]
     )
@@ -139,7 +180,7 @@ def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15):
         return False  # no se puede asignar si no hay ruta
 
     # Built in function all() que revisa si todas las ordenes en el bundle están listas
-    all_ready = all(o.ready_time <= current_time + OPTIMIZATION_FREQUENCY for o in bundle)
+    all_ready = all(o.ready_time <= current_time + OPTIMIZATION_FREQUENCY_US for o in bundle)
     
     # Excepción: si alguna orden lleva lista más de 15 minutos, se fuerza un compromiso final
     if ready_too_long:
@@ -147,8 +188,9 @@ def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15):
             'orders': bundle,
             'route': route_data,
             'start_time': current_time,
-            'completion_time': current_time + timedelta(seconds=route_data['duration']),
-            'commitment_type': 'final'
+            'completion_time': current_time + seconds_to_us(route_data['duration']),
+            'commitment_type': 'final',
+            'end_location': bundle[-1].dropoff_loc
         }
         return True
 
@@ -158,20 +200,22 @@ def two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15):
             'orders': bundle,
             'route': route_data,
             'start_time': current_time,
-            'completion_time': current_time + timedelta(seconds=route_data['duration']),
-            'commitment_type': 'final'
+            'completion_time': current_time + seconds_to_us(route_data['duration']),
+            'commitment_type': 'final',
+            'end_location': bundle[-1].dropoff_loc
         }
         return True
     else:
         # Caso 2: Compromiso parcial si el repartidor termina su última asignación antes de current_time + OPTIMIZATION_FREQUENCY
-        inbound_only = get_route_details(courier.location, [bundle[0].restaurant.location])
+        inbound_only = route_summary(courier.location, [bundle[0].restaurant.location])
         if inbound_only:
             courier.current_route = {
                 'orders': bundle,
                 'route': inbound_only,
                 'start_time': current_time,
-                'completion_time': current_time + timedelta(seconds=inbound_only['duration']),
-                'commitment_type': 'partial'
+                'completion_time': current_time + seconds_to_us(inbound_only['duration']),
+                'commitment_type': 'partial',
+                'end_location': bundle[0].restaurant.location
             }
             return True
 
@@ -187,6 +231,7 @@ def earliest_possible_dropoff(bundle, courier, current_time):
     """
     Returns the earliest drop-off time if 'courier' starts delivering 'bundle' NOW
     (i.e., from courier.location at current_time).
+    Times are simulation time (microseconds, see src/simtime.py).
 
     Simplistic approach:
       1) Compute inbound route to restaurant (time_inbound).
@@ -199,7 +244,7 @@ def earliest_possible_dropoff(bundle, courier, current_time):
 
     # Step 1: inbound route from courier.location -> bundle[0].restaurant
     r_loc = bundle[0].restaurant.location
-    inbound = get_route_details(courier.location, [r_loc])
+    inbound = get_route_summary(courier.location, [r_loc])
     if not inbound:
         return None  # no route => no feasible assignment
 
@@ -210,13 +255,13 @@ def earliest_possible_dropoff(bundle, courier, current_time):
     service_min = SERVICE_TIME.total_seconds() / 60.0
     earliest_pickup = max(
         bundle_ready_time,
-        current_time + timedelta(minutes=time_inbound_min + service_min)
+        current_time + minutes_to_us(time_inbound_min + service_min)
     )
 
     # Step 3: route from restaurant to each drop-off (in the order they appear).
     #   We'll do a naive approach: restaurant -> dropoff1 -> dropoff2 -> ... -> dropoffN
     dropoff_points = [o.dropoff_loc for o in bundle] 
-    route_outbound = get_route_details(r_loc, dropoff_points)
+    route_outbound = get_route_summary(r_loc, dropoff_points)
     if not route_outbound:
         return None
     time_outbound_min = route_outbound["duration"] / 60.0
@@ -224,7 +269,7 @@ def earliest_possible_dropoff(bundle, courier, current_time):
     # Step 4: final drop-off time
     #   After picking up, we add time_outbound_min + half-service per order
     total_drop_service_min = service_min * len(bundle)
-    final_dropoff = earliest_pickup + timedelta(minutes=time_outbound_min + total_drop_service_min)
+    final_dropoff = earliest_pickup + minutes_to_us(time_outbound_min + total_drop_service_min)
     return final_dropoff
 
 
@@ -236,25 +281,41 @@ def earliest_pickup_estimate(bundle, courier, current_time):
     Returns the earliest possible pickup time ignoring outbound deliveries.
     Just focuses on inbound route + half the pickup service time.
     """
-    from src.getrouteOSMR import get_route_details
     r_loc = bundle[0].restaurant.location
-    inbound = get_route_details(courier.location, [r_loc])
+    inbound = get_route_summary(courier.location, [r_loc])
     if not inbound:
-        return current_time + timedelta(days=999999)  # effectively infinite
+        return float('inf')  # no route: never
     time_inbound_min = inbound["duration"] / 60.0
     half_sr = (SERVICE_TIME.total_seconds()/60.0)/2
-    return current_time + timedelta(minutes=time_inbound_min + half_sr)
+    return current_time + minutes_to_us(time_inbound_min + half_sr)
+
+
+# ASSIGNMENT_MODE=combined resuelve los tres grupos en un solo matching con
+# costos lexicográficos; 'sequential' (default) hace una pasada por grupo.
+def _assignment_mode():
+    return os.environ.get('ASSIGNMENT_MODE', 'sequential').lower()
+
+
+# Con más de ASSIGNMENT_K_NEAREST=k repartidores libres (20 por defecto, 0 lo
+# desactiva) cada bundle sólo considera sus k repartidores más cercanos en
+# línea recta, elegidos antes de rutear la época, y se resuelve un matching
+# disperso sobre esos pares.
+def _candidate_couriers():
+    return int(os.environ.get('ASSIGNMENT_K_NEAREST', '20'))
 
 
 ###############################################################################
 # HELPER: do_linear_assignment(couriers, candidate_bundles, current_time)
 #   Builds the cost matrix and solves bipartite matching for courier-bundle.
 ###############################################################################
-def do_linear_assignment(couriers, candidate_bundles, current_time):
+def do_linear_assignment(couriers, candidate_bundles, current_time, context=None, priority=None):
     """
-    1) For each (courier,bundle), get a "score" from your code (calculate_bundle_score).
+    1) For each (courier,bundle), get a "score" (calculate_bundle_score, batched by score_bundles).
     2) Convert to a cost = -score (Hungarian is min-cost).
     3) Solve. Then two_stage_commitment for each matched pair.
+    ``context`` (EpochContext) holds the epoch's travel figures; one is built if not given.
+    ``priority`` (group of each bundle, 1 = most urgent) turns the solve
+    lexicographic: groups are served in order within one matching.
     """
     if not couriers or not candidate_bundles:
         return
@@ -266,27 +327,51 @@ def do_linear_assignment(couriers, candidate_bundles, current_time):
 
     num_couriers = len(free_couriers)
     num_bundles = len(candidate_bundles)
-    print(f"      Building cost matrix for {num_couriers} couriers and {num_bundles} bundles...")
-
-    cost_matrix = np.zeros((num_couriers, num_bundles), dtype=float)
-
-    for i, courier in enumerate(free_couriers):
-        for j, bundle in enumerate(candidate_bundles):
-            score = calculate_bundle_score(bundle, courier, current_time)
-            if score == float('-inf'):
-                # infeasible => set cost high so it won't be chosen
-                cost_matrix[i, j] = 1e9
-            else:
-                # cost is negative of the 'score' so we can minimize
-                cost_matrix[i, j] = -score
+    if context is None:
+        context = EpochContext(free_couriers, candidate_bundles, current_time, k=_candidate_couriers())
+
+    sparse = context.pruned
+    if sparse:
+        # Sólo los pares conservados al construir el contexto (que llegan a tiempo)
+        rows, cols = context.candidate_pairs(free_couriers, candidate_bundles)
+        print(f"      Scoring {len(rows)} candidate pairs of {num_couriers} couriers x {num_bundles} bundles...")
+        scores = context.pair_scores(free_couriers, candidate_bundles, rows, cols)
+    else:
+        print(f"      Building cost matrix for {num_couriers} couriers and {num_bundles} bundles...")
+        # Score de todos los pares en un solo cálculo vectorizado
+        scores = context.scores(free_couriers, candidate_bundles)
+    feasible = ~np.isneginf(scores)
+
+    # infeasible => set cost high so it won't be chosen; otherwise cost is
+    # the negative of the 'score' so we can minimize
+    if priority is None:
+        costs = np.where(feasible, -scores, INFEASIBLE_COST)
+        unmatched = INFEASIBLE_COST
+    else:
+        # prioridad de grupo como bonos lexicográficos en un solo problema
+        priority = np.asarray(priority)
+        levels = priority[cols] if sparse else priority[None, :]
+        costs, unmatched = lexicographic_costs(
+            -scores, levels, feasible, min(num_couriers, num_bundles)
+        )
 
-    row_ind, col_ind = linear_sum_assignment(cost_matrix)
+    if sparse:
+        row_ind, col_ind = solve_sparse(rows, cols, costs, num_couriers, num_bundles, unmatched)
+        pair = {rc: i for i, rc in enumerate(zip(rows.tolist(), cols.tolist()))}
+        matched = [(r, c) for r, c in zip(row_ind.tolist(), col_ind.tolist()) if feasible[pair[(r, c)]]]
+    else:
+        row_ind, col_ind = solve_assignment(
+            costs, unmatched,
+            row_keys=[courier.id for courier in free_couriers],
+            col_keys=[tuple(o.id for o in b) for b in candidate_bundles],
+        )
+        matched = [(r, c) for r, c in zip(row_ind, col_ind) if feasible[r, c]]
+    if priority is not None:
+        # se comprometen primero los bundles más urgentes
+        matched.sort(key=lambda rc: priority[rc[1]])
 
     # For each matched pair, attempt two_stage_commitment
-    for r, c in zip(row_ind, col_ind):
-        if cost_matrix[r, c] >= 1e9:
-            continue  # means it was infeasible
-
+    for r, c in matched:
         courier = free_couriers[r]
         bundle  = candidate_bundles[c]
 
@@ -295,7 +380,7 @@ def do_linear_assignment(couriers, candidate_bundles, current_time):
             continue
 
         # Attempt to assign
-        success = two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15)
+        success = two_stage_commitment(courier, bundle, current_time, X_COMMITMENT=15, context=context)
         if success:
             # The courier now has current_route set (partial or final).
             # If partial, the route can be updated in next optimization iteration.
@@ -314,32 +399,37 @@ def assign_bundles_to_couriers(couriers, bundles, current_time):
 
     Then runs a bipartite matching for each group in ascending order of group number,
     so that Group I (most urgent) is matched first, then II, then III.
+    With ASSIGNMENT_MODE=combined the three groups go into one matching whose
+    costs rank every Group I match above any Group II match, and so on.
     """
     if not couriers or not bundles:
         return
 
-    # 1) Classify each bundle
+    # 1) Classify each bundle (inbound/outbound of every pair, or of the k
+    #    nearest couriers of each bundle, computed once and shared with
+    #    scoring and commitment)
     print(f"    Classifying {len(bundles)} bundles...")
-    groupI, groupII, groupIII = [], [], []
-    for b in bundles:
-        g = classify_bundle(b, couriers, current_time)
-        if g == 1:
-            groupI.append(b)
-        elif g == 2:
-            groupII.append(b)
-        else:
-            groupIII.append(b)
+    context = EpochContext(couriers, bundles, current_time, k=_candidate_couriers())
+    groups = context.groups()
+    groupI = [b for b, g in zip(bundles, groups) if g == 1]
+    groupII = [b for b, g in zip(bundles, groups) if g == 2]
+    groupIII = [b for b, g in zip(bundles, groups) if g == 3]
     
     print(f"    Group I: {len(groupI)}, Group II: {len(groupII)}, Group III: {len(groupIII)}")
 
+    if _assignment_mode() == 'combined':
+        print("    Assigning all groups in one solve...")
+        do_linear_assignment(couriers, bundles, current_time, context, priority=groups)
+        return
+
     # 2) Solve assignment in that order:
     #    Group I first => then Group II => then Group III
     if groupI:
         print("    Assigning Group I bundles...")
-        do_linear_assignment(couriers, groupI, current_time)
+        do_linear_assignment(couriers, groupI, current_time, context)
     if groupII:
         print("    Assigning Group II bundles...")
-        do_linear_assignment(couriers, groupII, current_time)
+        do_linear_assignment(couriers, groupII, current_time, context)
     if groupIII:
         print("    Assigning Group III bundles...")
-        do_linear_assignment(couriers, groupIII, current_time)
+        do_linear_assignment(couriers, groupIII, current_time, context)
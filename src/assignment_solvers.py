@@ -0,0 +1,394 @@
+"""Courier-bundle assignment solvers.
+
+Exact solves (dense ``linear_sum_assignment`` and sparse matching) and, for
+epochs whose estimated exact solve exceeds ``ASSIGNMENT_TIME_BUDGET``, a
+greedy regret heuristic.  ``ASSIGNMENT_SOLVER=auto`` (default) only chooses
+between exact and greedy.  The auction solver is experimental and
+manual-only: it runs only with ``ASSIGNMENT_SOLVER=auction``.  Every
+approximate solve reports an upper bound on its optimality gap.
+"""
+import os
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+# ======================
+# Solvers de asignación courier-bundle
+# ======================
+
+# Costo de los pares no factibles y de dejar un bundle sin repartidor.
+INFEASIBLE_COST = 1e9
+
+
+def solve_dense(cost_matrix):
+    """Exact min-cost assignment of a dense (couriers x bundles) matrix."""
+    return linear_sum_assignment(cost_matrix)
+
+
+def lexicographic_costs(costs, levels, feasible, n_matches):
+    """Fold priority levels into the costs of a single assignment solve.
+
+    ``levels`` (broadcast against ``costs``) holds the priority of each pair,
+    1 being the most urgent.  Each level gets a bonus larger than anything
+    the less urgent levels can add up over ``n_matches`` pairs, so the
+    solver first matches as many level-1 pairs as possible, then level-2,
+    and so on, and only then minimizes the cost.  Infeasible pairs get a
+    cost above every bonus.  Returns ``(weighted, unmatched_cost)``, the
+    latter to be used as the cost of an infeasible or unmatched pair.
+    """
+    costs = np.asarray(costs, dtype=float)
+    feasible = np.broadcast_to(feasible, costs.shape)
+    levels = np.broadcast_to(levels, costs.shape)
+    values = costs[feasible]
+    span = values.max() - values.min() + 1.0 if values.size else 1.0
+
+    bonus = np.zeros(costs.shape)
+    weight = 0.0
+    for level in sorted(np.unique(levels[feasible]).tolist(), reverse=True):
+        bonus[levels == level] = weight
+        weight = (n_matches + 1) * span if weight == 0.0 else weight * (n_matches + 1)
+    unmatched = max(weight, (n_matches + 1) * span)
+    return np.where(feasible, costs - bonus, unmatched), unmatched
+
+
+def solve_sparse(rows, cols, costs, n_rows, n_cols, unmatched_cost=INFEASIBLE_COST):
+    """Exact min-cost assignment over the listed (row, col) pairs only.
+
+    Same optimum as ``solve_dense`` on a matrix that holds ``costs`` at the
+    listed pairs and ``unmatched_cost`` everywhere else: as many columns
+    as possible are matched, then the total cost is minimized.  Every
+    column gets a private dummy row at ``unmatched_cost`` so that a full
+    matching always exists; columns matched to their dummy are left out of
+    the result.  Returns ``(row_ind, col_ind)`` sorted by column.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    costs = np.asarray(costs, dtype=float)
+    if n_cols == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    # the matching needs non-zero weights: shift real edges to >= 1 (every
+    # column is matched exactly once, so the shift does not move the optimum)
+    shift = 1.0 - costs.min() if len(costs) else 0.0
+    weights = costs + shift
+    dummy = max(unmatched_cost + shift, 2.0 * weights.max(initial=0.0) + 1.0)
+
+    # bipartite graph: bundles (columns) x (couriers + one dummy per bundle)
+    graph = coo_matrix(
+        (
+            np.concatenate([weights, np.full(n_cols, dummy)]),
+            (np.concatenate([cols, np.arange(n_cols)]),
+             np.concatenate([rows, n_rows + np.arange(n_cols)])),
+        ),
+        shape=(n_cols, n_rows + n_cols),
+    ).tocsr()
+    col_ind, row_ind = min_weight_full_bipartite_matching(graph)
+    real = row_ind < n_rows
+    return row_ind[real], col_ind[real]
+
+
+# ======================
+# Solvers aproximados y selección automática
+# ======================
+#
+# ASSIGNMENT_SOLVER elige el solver de la matriz densa: 'exact'
+# (linear_sum_assignment), 'greedy' o 'auto' (default), que usa el exacto si
+# su duración estimada cabe en ASSIGNMENT_TIME_BUDGET segundos y si no el
+# greedy.  'auction' es experimental y sólo se usa si se pide: medido, es
+# 30-50x más lento que linear_sum_assignment (0.65 s vs 0.03 s en
+# 1000x1500), también con precios de la época anterior.
+# Cada solve aproximado imprime una cota de su gap (assignment_lower_bound,
+# barata); con ASSIGNMENT_REPORT_GAP=1 además se compara con el exacto.
+
+SOLVERS = ('exact', 'auction', 'greedy')
+# Candidatos de 'auto', del más exacto al más rápido
+AUTO_SOLVERS = ('exact', 'greedy')
+
+# Precios del auction por llave de fila (id del repartidor), de una época a la siguiente
+_auction_prices = {}
+# Segundos por unidad de trabajo de cada solver, medidos con matrices
+# aleatorias de 1000x1500 a 3000x3000 (linear_sum_assignment resuelve
+# 2000x3000 en ~0.1 s); se recalibran con cada solve del mismo solver.
+_DEFAULT_RATES = {'exact': 1e-11, 'auction': 5e-8, 'greedy': 2e-8}
+_solver_rates = dict(_DEFAULT_RATES)
+# Por debajo de este trabajo el tiempo es casi todo costo fijo de la llamada:
+# esos solves no recalibran (medir 3x4 daría una tasa 10^4 veces mayor) y
+# 'auto' usa siempre el exacto (~500x500, unos milisegundos).
+_MIN_CALIBRATION_WORK = {'exact': 1e8, 'auction': 1e6, 'greedy': 1e6}
+# Las tasas recalibradas quedan dentro de este factor de las medidas
+_RATE_CLAMP = 10.0
+_solver_stats = {'exact': 0, 'auction': 0, 'greedy': 0, 'max_gap': 0.0, 'max_gap_bound': 0.0}
+
+
+def _solver_choice():
+    return os.environ.get('ASSIGNMENT_SOLVER', 'auto').lower()
+
+
+def _time_budget():
+    return float(os.environ.get('ASSIGNMENT_TIME_BUDGET', '0.5'))
+
+
+def _report_gap():
+    return os.environ.get('ASSIGNMENT_REPORT_GAP', '0') == '1'
+
+
+def solver_info():
+    """Solves run by each solver and the largest gap (and gap bound) reported."""
+    return dict(_solver_stats)
+
+
+def clear_solver_state():
+    _auction_prices.clear()
+    _solver_rates.update(_DEFAULT_RATES)
+    for key in _solver_stats:
+        _solver_stats[key] = 0.0 if key.startswith('max_gap') else 0
+
+
+def assignment_lower_bound(cost_matrix):
+    """Lower bound on the min-cost assignment of ``min(rows, cols)`` pairs.
+
+    Every element of the smaller side is matched to a different element of
+    the larger one, so the optimum is at least the sum of their cheapest
+    costs, and at least the sum of the cheapest costs of the ``k`` larger-side
+    elements that are cheapest to reach.  O(rows x cols).
+    """
+    cost = np.asarray(cost_matrix, dtype=float)
+    if cost.shape[0] > cost.shape[1]:
+        cost = cost.T
+    k = cost.shape[0]
+    if k == 0:
+        return 0.0
+    by_row = cost.min(axis=1).sum()
+    by_col = np.partition(cost.min(axis=0), k - 1)[:k].sum()
+    return float(max(by_row, by_col))
+
+
+def solve_auction(cost_matrix, prices=None, tolerance=1e-2):
+    """Epsilon-scaling auction for a dense min-cost assignment (experimental).
+
+    The smaller side bids for the larger one (the objects), all unassigned
+    bidders at once (Jacobi style), so ``min(rows, cols)`` pairs are matched
+    as in ``linear_sum_assignment``, within ``tolerance`` of the optimum.
+    As there are more objects than bidders, the objects left unassigned
+    then bid in reverse (or drop their price) until none is dearer than
+    the cheapest assigned one, which is what makes the asymmetric result
+    optimal.  ``prices`` (one per
+    object: per column if rows <= cols, per row otherwise) warm-starts the
+    bidding, e.g. with the prices of the previous epoch; then the coarse
+    scaling phases are skipped.  Returns ``(row_ind, col_ind, prices)``
+    with the pairs sorted by row.  Much slower than ``solve_dense`` at
+    every size measured, so ``auto`` never picks it.
+    """
+    cost = np.asarray(cost_matrix, dtype=float)
+    n_rows, n_cols = cost.shape
+    if n_rows == 0 or n_cols == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.zeros(max(n_rows, n_cols))
+    transposed = n_rows > n_cols
+    if transposed:
+        cost = cost.T
+    n_bidders, n_objects = cost.shape
+    benefit = cost.max() - cost
+    span = benefit.max() + 1.0
+
+    eps_final = tolerance / n_bidders
+    if prices is None:
+        price = np.zeros(n_objects)
+        eps = max(span / 4.0, eps_final)
+    else:
+        price = np.array(prices, dtype=float)
+        eps = max(span / 1000.0, eps_final)
+
+    owner = np.empty(n_objects, dtype=np.intp)
+    assigned = np.empty(n_bidders, dtype=np.intp)
+    rows = np.arange(n_bidders)
+
+    def bid():
+        while True:
+            bidders = np.flatnonzero(assigned < 0)
+            if not len(bidders):
+                return
+            values = benefit[bidders] - price
+            idx = np.arange(len(bidders))
+            best = np.argmax(values, axis=1)
+            first = values[idx, best]
+            values[idx, best] = -np.inf
+            second = values.max(axis=1) if n_objects > 1 else first
+            bids = price[best] + (first - second) + eps
+
+            # cada objeto se lo queda la puja más alta
+            order = np.lexsort((bids, best))
+            objects = best[order]
+            last = np.append(objects[1:] != objects[:-1], True)
+            objects = objects[last]
+            winners = bidders[order][last]
+            outbid = owner[objects]
+            assigned[outbid[outbid >= 0]] = -1
+            owner[objects] = winners
+            assigned[winners] = objects
+            price[objects] = bids[order][last]
+
+    while True:
+        owner[:] = -1
+        assigned[:] = -1
+        bid()
+        if eps <= eps_final:
+            break
+        eps = max(eps / 5.0, eps_final)
+
+    # Sobran objetos: los libres no pueden quedar más caros que el más barato
+    # de los asignados (lam).  Cada objeto libre y caro puja en reversa por el
+    # postor que más lo valora, o baja a lam si no le conviene a nadie.
+    if n_objects > n_bidders:
+        lam = price[owner >= 0].min()
+        profit = benefit[rows, assigned] - price[assigned]
+        pending = np.flatnonzero((owner < 0) & (price > lam)).tolist()
+        while pending:
+            j = pending.pop()
+            values = benefit[:, j] - profit
+            i = int(np.argmax(values))
+            first = values[i]
+            if n_bidders > 1:
+                values[i] = -np.inf
+                second = values.max()
+            else:
+                second = -np.inf
+            if lam >= first - eps:
+                price[j] = lam
+                continue
+            delta = min(first - lam, first - second + eps)
+            price[j] = first - delta
+            profit[i] = benefit[i, j] - price[j]
+            left = assigned[i]
+            owner[left] = -1
+            owner[j] = i
+            assigned[i] = j
+            if price[left] > lam:
+                pending.append(int(left))
+
+    if transposed:
+        order = np.argsort(assigned)
+        return assigned[order], rows[order], price
+    return rows, assigned.copy(), price
+
+
+def solve_greedy_regret(cost_matrix):
+    """Greedy assignment in decreasing order of regret.
+
+    Each column's regret is the gap between its two cheapest rows; columns
+    are served from the largest regret down, each with the cheapest row
+    still free.  O(rows x cols), no optimality guarantee.  Returns
+    ``(row_ind, col_ind)`` sorted by row.
+    """
+    cost = np.asarray(cost_matrix, dtype=float)
+    n_rows, n_cols = cost.shape
+    if n_rows == 0 or n_cols == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    if n_rows > 1:
+        two = np.partition(cost, 1, axis=0)[:2]
+        regret = two[1] - two[0]
+    else:
+        regret = -cost[0]
+
+    free = np.ones(n_rows, dtype=bool)
+    rows = []
+    cols = []
+    for j in np.argsort(-regret, kind='stable'):
+        if len(rows) == n_rows:
+            break
+        i = int(np.argmin(np.where(free, cost[:, j], np.inf)))
+        free[i] = False
+        rows.append(i)
+        cols.append(j)
+    order = np.argsort(rows)
+    return np.asarray(rows, dtype=np.intp)[order], np.asarray(cols, dtype=np.intp)[order]
+
+
+def _work(solver, n_rows, n_cols):
+    small, large = sorted((n_rows, n_cols))
+    if solver == 'exact':
+        return float(small) * small * large
+    if solver == 'auction':
+        return float(large) * large * max(1.0, np.log2(large))
+    return float(n_rows) * n_cols
+
+
+def choose_solver(n_rows, n_cols, budget=None):
+    """Most exact of ``AUTO_SOLVERS`` whose estimated time fits in ``budget`` seconds."""
+    budget = _time_budget() if budget is None else budget
+    if _work('exact', n_rows, n_cols) <= _MIN_CALIBRATION_WORK['exact']:
+        return 'exact'
+    for solver in AUTO_SOLVERS[:-1]:
+        if _solver_rates[solver] * _work(solver, n_rows, n_cols) <= budget:
+            return solver
+    return AUTO_SOLVERS[-1]
+
+
+def _compress_unmatched(cost, unmatched_cost):
+    # los pares no factibles pasan a un costo apenas mayor que cualquier
+    # combinación de pares factibles, para no escalar el epsilon del auction
+    feasible = cost < unmatched_cost
+    if not feasible.any():
+        return np.zeros_like(cost)
+    values = cost[feasible]
+    span = values.max() - values.min() + 1.0
+    return np.where(feasible, cost, values.max() + (min(cost.shape) + 1) * span)
+
+
+def solve_assignment(cost_matrix, unmatched_cost=INFEASIBLE_COST, row_keys=None, col_keys=None):
+    """Min-cost assignment of a dense matrix with the configured solver.
+
+    Pairs at ``unmatched_cost`` or above are infeasible.  ``row_keys`` and
+    ``col_keys`` (e.g. courier ids, bundle order ids) let the auction reuse
+    the prices of the previous epoch.  Every solve big enough to be timed
+    reliably recalibrates the time estimate of its solver.  Returns
+    ``(row_ind, col_ind)`` sorted by row.
+    """
+    cost = np.asarray(cost_matrix, dtype=float)
+    solver = _solver_choice()
+    if solver == 'auto':
+        solver = choose_solver(*cost.shape)
+
+    started = time.perf_counter()
+    solved = cost
+    if solver == 'exact':
+        row_ind, col_ind = solve_dense(cost)
+    elif solver == 'auction':
+        # el lado mayor son los objetos con precio
+        keys = col_keys if cost.shape[0] <= cost.shape[1] else row_keys
+        warm = None
+        if keys is not None:
+            warm = np.array([_auction_prices.get(k, 0.0) for k in keys])
+        solved = _compress_unmatched(cost, unmatched_cost)
+        row_ind, col_ind, prices = solve_auction(solved, warm)
+        if keys is not None:
+            _auction_prices.update(zip(keys, prices.tolist()))
+    else:
+        solved = _compress_unmatched(cost, unmatched_cost)
+        row_ind, col_ind = solve_greedy_regret(solved)
+    elapsed = time.perf_counter() - started
+
+    work = _work(solver, *cost.shape)
+    if work >= _MIN_CALIBRATION_WORK[solver] and elapsed > 0:
+        rate = 0.5 * _solver_rates[solver] + 0.5 * elapsed / work
+        default = _DEFAULT_RATES[solver]
+        _solver_rates[solver] = min(max(rate, default / _RATE_CLAMP), default * _RATE_CLAMP)
+    _solver_stats[solver] += 1
+
+    if solver != 'exact':
+        value = solved[row_ind, col_ind].sum()
+        bound = float(value - assignment_lower_bound(solved))
+        _solver_stats['max_gap_bound'] = max(_solver_stats['max_gap_bound'], bound)
+        print(f"      {solver} solve of {cost.shape[0]}x{cost.shape[1]} in {elapsed * 1000.0:.1f} ms: "
+              f"gap <= {bound:.4f} ({bound / max(abs(value), 1e-12):.4%})")
+
+    if solver != 'exact' and _report_gap():
+        exact_rows, exact_cols = solve_dense(cost)
+        optimum = cost[exact_rows, exact_cols].sum()
+        gap = cost[row_ind, col_ind].sum() - optimum
+        _solver_stats['max_gap'] = max(_solver_stats['max_gap'], gap)
+        print(f"      {solver} solve in {elapsed * 1000.0:.1f} ms: gap {gap:.4f} "
+              f"({gap / max(abs(optimum), 1e-12):.4%}) vs exact")
+    return row_ind, col_ind
@@ -0,0 +1,236 @@
+import math
+
+import numpy as np
+
+# ======================
+# Motor de inserción para bundling
+# ======================
+#
+# Los bundles de un restaurante se representan como listas de nodos sobre una
+# matriz de tiempos D (segundos): el nodo 0 es el restaurante y los nodos
+# 1..n son las entregas de sus órdenes, en orden de ready_time.  La ruta es
+# abierta: restaurante -> entrega_1 -> ... -> entrega_k.
+
+
+class BundleRoute:
+    """Drop-off sequence of one bundle with its cached travel time.
+
+    ``travel`` is the duration (seconds) of the open route from the
+    restaurant through ``stops``, kept up to date on every insert/remove, so
+    the travel time of the bundle with one more stop at any position is
+    answered in O(1) from the neighbouring legs.
+    """
+
+    __slots__ = ("stops", "travel")
+
+    def __init__(self, stops=(), durations=None):
+        self.stops = list(stops)
+        self.travel = 0.0
+        if durations is not None:
+            self.refresh(durations)
+
+    def __len__(self):
+        return len(self.stops)
+
+    def refresh(self, D):
+        travel = 0.0
+        prev = 0
+        for s in self.stops:
+            travel += D[prev][s]
+            prev = s
+        self.travel = travel
+
+    def insertion_delta(self, D, node, pos):
+        """Extra travel time of inserting ``node`` before ``stops[pos]``."""
+        stops = self.stops
+        prev = stops[pos - 1] if pos else 0
+        if pos < len(stops):
+            nxt = stops[pos]
+            return D[prev][node] + D[node][nxt] - D[prev][nxt]
+        return D[prev][node]
+
+    def travel_with(self, D, node, pos):
+        """Travel time of the bundle after inserting ``node`` at ``pos``."""
+        if math.isinf(self.travel):
+            # an unreachable leg would make the delta inf - inf
+            candidate = BundleRoute(self.stops[:pos] + [node] + self.stops[pos:], D)
+            return candidate.travel
+        return self.travel + self.insertion_delta(D, node, pos)
+
+    def insert(self, D, node, pos):
+        self.stops.insert(pos, node)
+        self.refresh(D)
+
+    def remove(self, D, node):
+        """Remove ``node`` and return the position it had."""
+        pos = self.stops.index(node)
+        del self.stops[pos]
+        self.refresh(D)
+        return pos
+
+
+def parallel_insertion(D, n_orders, target_bundle_size, n_bundles, service_min, theta, seeds=()):
+    """Insert nodes 1..n_orders one by one at their cheapest (bundle, position).
+
+    Starts from the ``seeds`` bundles (node sequences kept from a previous
+    epoch) plus empty bundles up to ``n_bundles``; nodes already in a seed
+    are not inserted again.  A bundle that already reached
+    ``target_bundle_size`` only accepts an order if its average time per
+    order (travel + service) improves.  Ties keep the first candidate found.
+    An order with no feasible candidate opens a new bundle.
+
+    Empty bundles are all alike, so they are not materialized: they are
+    evaluated once per order, after the non-empty ones (which is where they
+    sit in the list), and only counted.  Returns ``(bundles, n_empty)`` with
+    the non-empty bundles and the number of empty ones left.
+    """
+    bundles = [BundleRoute(seed, D) for seed in seeds]
+    n_empty = max(0, n_bundles - len(bundles))
+    opening_penalty = theta * (service_min + service_min)
+    seeded = {s for seed in seeds for s in seed}
+    for node in range(1, n_orders + 1):
+        if node in seeded:
+            continue
+        best_cost = float('inf')
+        best_bundle = None
+        best_pos = None
+        for bundle in bundles:
+            size = len(bundle.stops)
+            penalty = theta * (service_min + service_min * (size + 1))
+            gated = size >= target_bundle_size
+            if gated:
+                current_efficiency = (bundle.travel / 60.0 + service_min * size) / size
+            for pos in range(size + 1):
+                travel = bundle.travel_with(D, node, pos)
+                if gated:
+                    new_efficiency = (travel / 60.0 + service_min * (size + 1)) / (size + 1)
+                    if not new_efficiency < current_efficiency:
+                        continue
+                cost = travel / 60.0 + penalty
+                if cost < best_cost:
+                    best_cost = cost
+                    best_bundle = bundle
+                    best_pos = pos
+        if n_empty and D[0][node] / 60.0 + opening_penalty < best_cost:
+            best_bundle = None
+            n_empty -= 1
+        if best_bundle is not None:
+            best_bundle.insert(D, node, best_pos)
+        else:
+            bundles.append(BundleRoute([node], D))
+    return bundles, n_empty
+
+
+def insertion_costs(D, node, stops, lengths, travels, service_min, theta):
+    """Cost of every (bundle, position) insertion of ``node`` in one shot.
+
+    ``stops`` is a (bundles x width) array with the drop-off nodes of each
+    bundle left-aligned, ``lengths`` and ``travels`` the size and cached
+    travel time of each bundle.  Returns a (bundles x width) array with the
+    cost (as in the insertion phase) of inserting ``node`` before position
+    ``p``; positions past the end of a bundle are ``inf``.
+    """
+    width = stops.shape[1]
+    positions = np.arange(width)
+    prev = np.empty_like(stops)
+    prev[:, 0] = 0
+    prev[:, 1:] = stops[:, :-1]
+    has_next = positions[None, :] < lengths[:, None]
+    to_node = D[prev, node]
+    with np.errstate(invalid='ignore'):
+        # same operation order as BundleRoute.insertion_delta
+        delta = np.where(has_next, to_node + D[node, stops] - D[prev, stops], to_node)
+        cost = (travels[:, None] + delta) / 60.0 + theta * (
+            service_min + service_min * (lengths[:, None] + 1)
+        )
+    valid = (positions[None, :] <= lengths[:, None]) & np.isfinite(cost)
+    return np.where(valid, cost, np.inf)
+
+
+def remove_reinsert(D, bundles, service_min, theta, n_empty=0, max_passes=50):
+    """Improvement phase: local search with remove-reinsert moves.
+
+    Each order is taken out of its bundle and the cost of putting it back at
+    every (bundle, position) is computed at once with ``insertion_costs``.
+    It moves to the cheapest one only if that is strictly cheaper than its
+    old place.  Passes over all orders repeat until none moves (or
+    ``max_passes`` is reached).
+
+    ``n_empty`` empty bundles are available besides ``bundles``.  Only one
+    empty row is kept in the cost tensor (the first one, as all give the
+    same cost), so its size depends on the orders and not on the fleet.
+    """
+    bundles = list(bundles)
+    spare = n_empty
+    if spare and all(b.stops for b in bundles):
+        bundles.append(BundleRoute())
+        spare -= 1
+    Dn = np.asarray(D, dtype=float)
+    width = max((len(b.stops) for b in bundles), default=0) + 2
+    stops = np.zeros((len(bundles), width), dtype=np.intp)
+    lengths = np.zeros(len(bundles), dtype=np.intp)
+    travels = np.zeros(len(bundles))
+
+    def load(i):
+        b = bundles[i]
+        stops[i, :] = 0
+        stops[i, :len(b.stops)] = b.stops
+        lengths[i] = len(b.stops)
+        travels[i] = b.travel
+
+    for i in range(len(bundles)):
+        load(i)
+    where = {s: i for i, b in enumerate(bundles) for s in b.stops}
+
+    for _ in range(max_passes):
+        moved = False
+        for node in [s for b in bundles for s in b.stops]:
+            source = where[node]
+            source_pos = bundles[source].remove(D, node)
+            load(source)
+
+            cost = insertion_costs(Dn, node, stops, lengths, travels, service_min, theta)
+            stay = cost[source, source_pos]
+            empty_rows = np.flatnonzero(lengths == 0)
+            cost[empty_rows[1:]] = np.inf
+            target, pos = divmod(int(np.argmin(cost)), width)
+            if cost[target, pos] < stay:
+                moved = True
+            else:
+                target, pos = source, source_pos
+
+            bundles[target].insert(D, node, pos)
+            where[node] = target
+            if len(bundles[target].stops) + 1 > width:
+                grow = np.zeros((len(bundles), width), dtype=np.intp)
+                stops = np.hstack([stops, grow])
+                width *= 2
+            load(target)
+            if spare and len(empty_rows) == 1 and empty_rows[0] == target:
+                # the last empty row was used: bring in another one
+                bundles.append(BundleRoute())
+                spare -= 1
+                stops = np.vstack([stops, np.zeros((1, width), dtype=np.intp)])
+                lengths = np.append(lengths, 0)
+                travels = np.append(travels, 0.0)
+        if not moved:
+            break
+    return bundles
+
+
+def solve_bundles(task):
+    """Run the full bundling of one restaurant from its compact task tuple.
+
+    ``task`` is ``(durations, n_orders, target_bundle_size, n_bundles,
+    service_min, theta, seeds)`` with ``durations`` the (n+1)x(n+1) NumPy
+    matrix and ``seeds`` the bundles to repair (tuples of nodes, may be
+    empty), so it is cheap to pickle to a worker process.  Returns the
+    non-empty bundles as tuples of node indices (1..n_orders).
+    """
+    durations, n_orders, target_bundle_size, n_bundles, service_min, theta, seeds = task
+    D = durations.tolist()
+    bundles, n_empty = parallel_insertion(
+        D, n_orders, target_bundle_size, n_bundles, service_min, theta, seeds
+    )
+    bundles = remove_reinsert(D, bundles, service_min, theta, n_empty)
+    return [tuple(b.stops) for b in bundles if b.stops]
@@ -1,12 +1,26 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
+
+import numpy as np
+
 from src.config import (
-    ASSIGNMENT_HORIZON,
-    MAX_CLICK_TO_DOOR,
+    ASSIGNMENT_HORIZON_US,
+    MAX_CLICK_TO_DOOR_US,
     SERVICE_TIME,
-    DELTA_1,
-    DELTA_2,
+    DELTA_1_US,
+    DELTA_2_US,
+)
+from src.getrouteOSMR import (
+    build_travel_matrix,
+    get_epoch_matrix,
+    get_route_summaries,
+    get_route_summary,
 )
-from src.getrouteOSMR import get_route_details
+from src.bundle_engine import solve_bundles
+from src.simtime import minutes_to_us, us_to_minutes
 from src.config import GROUP_I_PENALTY, GROUP_II_PENALTY, FRESHNESS_PENALTY_THETA
 # ======================
 # Bundling
@@ -16,8 +30,8 @@ from src.config import GROUP_I_PENALTY, GROUP_II_PENALTY, FRESHNESS_PENALTY_THET
 def compute_target_bundle_size(current_time, orders, couriers):
     """Compute dynamic target bundle size using DELTA_1 and DELTA_2."""
 
-    orders_ready = [o for o in orders if o.ready_time <= current_time + DELTA_1]
-    couriers_available = [c for c in couriers if c.off_time >= current_time + DELTA_2]
+    orders_ready = [o for o in orders if o.ready_time <= current_time + DELTA_1_US]
+    couriers_available = [c for c in couriers if c.off_time >= current_time + DELTA_2_US]
 
     if not couriers_available:
         return 1
@@ -29,10 +43,11 @@ def calculate_bundle_score(bundle, courier, current_time):
     """
     Calcula el score para asignar un bundle a un courier específico.
     Considera ventanas exactas para pickup y drop-off según Reyes (2018).
+    Los tiempos son de simulación (microsegundos, ver src/simtime.py).
     """
 
     # 1. Obtener la ruta completa (inbound a restaurante + entregas)
-    full_route = get_route_details(
+    full_route = get_route_summary(
         courier.location,
         [bundle[0].restaurant.location] + [o.dropoff_loc for o in bundle]
     )
@@ -42,12 +57,12 @@ def calculate_bundle_score(bundle, courier, current_time):
     total_travel_time_min = full_route['duration'] / 60.0
 
     # 1) Calcular tiempo de llegada al restaurante (inbound)
-    inbound_route = get_route_details(courier.location, [bundle[0].restaurant.location])
+    inbound_route = get_route_summary(courier.location, [bundle[0].restaurant.location])
     if not inbound_route:
         return float('-inf')
 
     inbound_duration_min = inbound_route['duration'] / 60.0
-    courier_arrival_at_restaurant = current_time + timedelta(minutes=inbound_duration_min)
+    courier_arrival_at_restaurant = current_time + minutes_to_us(inbound_duration_min)
 
     # Según Reyes (2018), la hora exacta del pickup es:
     # max(e_o, llegada_repartidor + s_r/2)
@@ -55,15 +70,15 @@ def calculate_bundle_score(bundle, courier, current_time):
     bundle_ready_time = max(o.ready_time for o in bundle)
     pickup_time = max(
         bundle_ready_time,
-        courier_arrival_at_restaurant + timedelta(minutes=service_half_min)
+        courier_arrival_at_restaurant + minutes_to_us(service_half_min)
     )
-    departure_from_restaurant_time = pickup_time + timedelta(minutes=service_half_min)
+    departure_from_restaurant_time = pickup_time + minutes_to_us(service_half_min)
     
     # Tiempo de entrega (drop-off)
     # Tiempo al cliente + s_o/2 por orden entregada
     customer_half_min = SERVICE_TIME.total_seconds() / 60.0 / 2
-    delivery_finish_time = departure_from_restaurant_time + timedelta(
-        minutes=total_travel_time_min + customer_half_min * len(bundle)
+    delivery_finish_time = departure_from_restaurant_time + minutes_to_us(
+        total_travel_time_min + customer_half_min * len(bundle)
     )
 
     # 2) Calcular pérdidas de frescura
@@ -71,7 +86,7 @@ def calculate_bundle_score(bundle, courier, current_time):
 
     # 2) Penalizaciones de Prioridad (grupos I, II, III)
     earliest_placement = min(o.placement_time for o in bundle)
-    if delivery_finish_time > earliest_placement + MAX_CLICK_TO_DOOR:
+    if delivery_finish_time > earliest_placement + MAX_CLICK_TO_DOOR_US:
         priority_penalty = GROUP_I_PENALTY  # No se puede cumplir entrega a tiempo
     elif pickup_time > max(o.ready_time for o in bundle):
         priority_penalty = GROUP_II_PENALTY  # Retraso en la recogida
@@ -85,7 +100,7 @@ def calculate_bundle_score(bundle, courier, current_time):
     
     # 4) Frescura (considerando la orden con mayor espera)
     freshness_penalty = FRESHNESS_PENALTY_THETA * max(
-        max((pickup_time - o.ready_time).total_seconds() / 60.0, 0.0) for o in bundle
+        max(us_to_minutes(pickup_time - o.ready_time), 0.0) for o in bundle
     )
 
     # 3) Score Final
@@ -93,6 +108,65 @@ def calculate_bundle_score(bundle, courier, current_time):
 
     return score
 
+# ======================
+# Score en bloque (couriers x bundles)
+# ======================
+
+def bundle_score_matrix(inbound, outbound, sizes, ready_max, ready_min, placement_min):
+    """
+    Versión vectorizada de ``calculate_bundle_score`` para C couriers y B bundles.
+
+    Parámetros (tiempos en microsegundos relativos a current_time):
+      - inbound: (C x B) segundos de viaje courier -> restaurante del bundle (inf si no hay ruta).
+      - outbound: (B x L) segundos de cada tramo restaurante -> entrega_1 -> ... (0 de relleno).
+      - sizes: (B,) número de órdenes del bundle.
+      - ready_max, ready_min: (B,) mayor y menor ready_time del bundle.
+      - placement_min: (B,) menor placement_time del bundle.
+
+    Retorna la matriz (C x B) de scores, -inf donde no hay ruta. Da los
+    mismos valores que el cálculo escalar.
+    """
+    inbound = np.asarray(inbound, dtype=float)
+    sizes = np.asarray(sizes)
+
+    # ruta completa courier -> restaurante -> entregas, sumada tramo a tramo
+    # en el mismo orden que get_route_summary
+    full = 0.0 + inbound
+    for leg in np.asarray(outbound, dtype=float).T:
+        full = full + leg[None, :]
+    feasible = np.isfinite(full) & np.isfinite(inbound)
+    full = np.where(feasible, full, 0.0)
+    inbound = np.where(feasible, inbound, 0.0)
+
+    service_min = SERVICE_TIME.total_seconds() / 60.0
+    service_half_min = service_min / 2
+    half_us = minutes_to_us(service_half_min)
+
+    total_travel_time_min = full / 60.0
+    arrival = minutes_to_us(inbound / 60.0)
+    pickup = np.maximum(ready_max[None, :], arrival + half_us)
+    departure = pickup + half_us
+    delivery_finish = departure + minutes_to_us(total_travel_time_min + service_half_min * sizes[None, :])
+
+    priority_penalty = np.where(
+        delivery_finish > (placement_min + MAX_CLICK_TO_DOOR_US)[None, :],
+        GROUP_I_PENALTY,
+        np.where(pickup > ready_max[None, :], GROUP_II_PENALTY, 0),
+    )
+
+    total_time = total_travel_time_min + service_min
+    with np.errstate(divide='ignore', invalid='ignore'):
+        throughput = np.where(total_time > 0, sizes[None, :] / total_time, sizes[None, :])
+
+    # la orden con mayor espera es la de menor ready_time
+    freshness_penalty = FRESHNESS_PENALTY_THETA * np.maximum(
+        us_to_minutes(pickup - ready_min[None, :]), 0.0
+    )
+
+    score = throughput - freshness_penalty - priority_penalty
+    return np.where(feasible, score, -np.inf)
+
+
 def calculate_cost(route_details, service_delay):
     """Calculate the cost of a candidate route.
 
@@ -115,7 +189,7 @@ def calculate_route_efficiency(restaurant_location, bundle):
         return float('inf')
     
     dropoff_points = [o.dropoff_loc for o in bundle]
-    route = get_route_details(restaurant_location, dropoff_points)
+    route = get_route_summary(restaurant_location, dropoff_points)
     if not route:
         return float('inf')
 
@@ -126,6 +200,125 @@ def calculate_route_efficiency(restaurant_location, bundle):
     return total_time / len(bundle)
 
 
+def restaurant_travel_times(restaurant_location, orders):
+    """
+    Matriz (n+1)x(n+1) de tiempos de viaje en segundos entre el restaurante
+    (nodo 0) y las entregas de ``orders`` (nodos 1..n). Se toma de la matriz
+    de la época si la cubre; si no, se pide en bloque. Los tramos que no se
+    pueden calcular quedan en inf.
+    """
+    points = [restaurant_location] + [o.dropoff_loc for o in orders]
+    unique = list(dict.fromkeys(points))
+    matrix = get_epoch_matrix()
+    if matrix is not None and matrix.covers(unique):
+        matrix = matrix.submatrix(unique)
+    else:
+        matrix = build_travel_matrix(unique)
+    if matrix is not None:
+        idx = matrix.indices(points)
+        return matrix.durations[np.ix_(idx, idx)]
+
+    # Sin tabla: tramo por tramo (cache de legs + cliente concurrente)
+    pairs = [(a, b) for a in unique for b in unique]
+    routes = get_route_summaries([(a, [b]) for a, b in pairs])
+    legs = {pair: (r['duration'] if r else float('inf')) for pair, r in zip(pairs, routes)}
+    return np.array([[0.0 if a == b else legs[(a, b)] for b in points] for a in points])
+
+
+# ======================
+# Cache de bundles entre épocas
+# ======================
+
+# restaurant.id -> (target_bundle_size, target_bundles, órdenes pendientes,
+# bundles). Con ``BUNDLE_CACHE=0`` se reconstruye todo en cada época.
+_bundle_cache = {}
+_bundle_cache_stats = {'reused': 0, 'repaired': 0, 'rebuilt': 0}
+
+def _bundle_cache_enabled():
+    return os.environ.get('BUNDLE_CACHE', '1') == '1'
+
+def clear_bundle_cache():
+    """Olvida los bundles guardados (p. ej. al iniciar otra simulación)."""
+    _bundle_cache.clear()
+    for key in _bundle_cache_stats:
+        _bundle_cache_stats[key] = 0
+
+def bundle_cache_info():
+    return dict(_bundle_cache_stats)
+
+
+def bundling_task(restaurant, current_time, target_bundle_size, couriers_available):
+    """
+    Prepara el subproblema de bundling de un restaurante.
+
+    Retorna ``(orders, task)``: las órdenes listas ordenadas por ready_time
+    (el nodo i es orders[i-1]) y la tupla compacta que recibe
+    ``solve_bundles``; o ``None`` si el restaurante no tiene órdenes.
+
+    Si el restaurante tiene las mismas órdenes pendientes, el mismo tamaño
+    objetivo y el mismo número de bundles que en la época anterior, ``task``
+    es ``None`` y se reutilizan sus bundles (``_bundles_from_cache``).  Si
+    sólo cambió el conjunto de órdenes, los bundles anteriores (sin las
+    órdenes ya asignadas) van como semillas y sólo se insertan las nuevas.
+    """
+    # 1. Filtrar órdenes pendientes que estén listas dentro del horizonte de asignación (por ejemplo, ASSIGNMENT_HORIZON)
+    restaurant_orders = [
+        order for order in restaurant.orders
+        if order.status == 'ready' and order.ready_time <= current_time + ASSIGNMENT_HORIZON_US
+    ]
+    if not restaurant_orders:
+        _bundle_cache.pop(restaurant.id, None)
+        return None
+
+    # 2. Ordenar las órdenes por su ready_time (de menor a mayor)
+    restaurant_orders.sort(key=lambda o: o.ready_time)
+
+    # 3. Calcular el número objetivo de bundles a crear para este restaurante.
+    # Nunca hay más bundles que órdenes, así que el tope no cambia el
+    # resultado y la clave del cache no depende de cuántos repartidores
+    # sobran.
+    target_bundles = min(
+        max(len(restaurant_orders) // target_bundle_size, couriers_available),
+        len(restaurant_orders),
+    )
+
+    # Reutilizar o reparar los bundles de la época anterior
+    seeds = ()
+    entry = _bundle_cache.get(restaurant.id) if _bundle_cache_enabled() else None
+    if entry is not None and entry[0] == target_bundle_size:
+        if entry[1] == target_bundles and entry[2] == frozenset(restaurant_orders):
+            _bundle_cache_stats['reused'] += 1
+            return restaurant_orders, None
+        node_of = {o: i + 1 for i, o in enumerate(restaurant_orders)}
+        seeds = [tuple(node_of[o] for o in b if o in node_of) for b in entry[3]]
+        seeds = [seed for seed in seeds if seed]
+    _bundle_cache_stats['repaired' if seeds else 'rebuilt'] += 1
+
+    # 4. Matriz de tiempos: nodo 0 = restaurante, nodo i = restaurant_orders[i-1]
+    D = restaurant_travel_times(restaurant.location, restaurant_orders)
+    task = (
+        np.ascontiguousarray(D, dtype=float),
+        len(restaurant_orders),
+        target_bundle_size,
+        target_bundles,
+        SERVICE_TIME.total_seconds() / 60.0,
+        FRESHNESS_PENALTY_THETA,
+        seeds,
+    )
+    return restaurant_orders, task
+
+
+def _bundles_from_nodes(restaurant, orders, task, nodes):
+    bundles = [[orders[s - 1] for s in b] for b in nodes]
+    if _bundle_cache_enabled():
+        _bundle_cache[restaurant.id] = (task[2], task[3], frozenset(orders), bundles)
+    return [list(b) for b in bundles]
+
+
+def _bundles_from_cache(restaurant):
+    return [list(b) for b in _bundle_cache[restaurant.id][3]]
+
+
 def generate_bundles_for_restaurant(restaurant, current_time, target_bundle_size, couriers_available):
     """
     Genera bundles (rutas) de órdenes para un restaurante, siguiendo la lógica de inserción paralela.
@@ -138,114 +331,77 @@ def generate_bundles_for_restaurant(restaurant, current_time, target_bundle_size
       
     Retorna:
       - Una lista de bundles (cada bundle es una lista de órdenes) para ser asignados a repartidores.
+
+    Las inserciones se evalúan en O(1) con ``src.bundle_engine`` sobre la
+    matriz de tiempos restaurante/entregas, sin una llamada de ruta por
+    candidato.
     """
-    # 1. Filtrar órdenes pendientes que estén listas dentro del horizonte de asignación (por ejemplo, ASSIGNMENT_HORIZON)
-    restaurant_orders = [
-        order for order in restaurant.orders
-        if order.status == 'ready' and order.ready_time <= current_time + ASSIGNMENT_HORIZON
-    ]
-    
-    # Si no hay órdenes, retorna una lista vacía
-    if not restaurant_orders:
+    prepared = bundling_task(restaurant, current_time, target_bundle_size, couriers_available)
+    if prepared is None:
         return []
-    
-    # 2. Ordenar las órdenes por su ready_time (de menor a mayor)
-    restaurant_orders.sort(key=lambda o: o.ready_time)
-    
-    # 3. Calcular el número objetivo de bundles a crear para este restaurante.
-    target_bundles = max(len(restaurant_orders) // target_bundle_size, couriers_available)
-    
-    # 4. Inicializar mr bundles vacíos.
-    bundles = [[] for _ in range(target_bundles)]
-    
-    # 5. Para cada orden, buscar el bundle y la posición de inserción que minimicen el incremento del costo.
-    for order in restaurant_orders:
-        best_bundle = None
-        best_cost_increase = float('inf')
-        best_position = None
-        
-        # Para cada bundle existente, evaluar todas las posiciones de inserción
-        for bundle in bundles:
-            # Si el bundle está vacío, la única opción es insertarla en la posición 0.
-            if not bundle: #evalua si el bundle esta vacio
-                # Coste base: calcular ruta desde la ubicación del restaurante del objeto restaurant (o se podría usar restaurant_orders[0].restaurant.location)
-                route = get_route_details(restaurant.location, [order.dropoff_loc])
-                if route!=None:
-                    cost = calculate_cost(route, SERVICE_TIME*2)
-                    if cost < best_cost_increase:
-                        best_cost_increase = cost
-                        best_bundle = bundle
-                        best_position = 0
-            else:
-                # Probar todas las posiciones posibles (de 0 a len(bundle))
-                for pos in range(len(bundle) + 1):
-                    # --- INICIO DE LA MODIFICACIÓN: Verificación de eficiencia ---
-                    # Si el bundle ya alcanzó el tamaño objetivo, solo se inserta si mejora la eficiencia.
-                    if len(bundle) >= target_bundle_size:
-                        current_efficiency = calculate_route_efficiency(restaurant.location, bundle)
-                        candidate_bundle_for_efficiency = bundle[:pos] + [order] + bundle[pos:]
-                        new_efficiency = calculate_route_efficiency(restaurant.location, candidate_bundle_for_efficiency)
-                        
-                        # Si la nueva eficiencia no es mejor (menor), se ignora esta inserción.
-                        if new_efficiency >= current_efficiency:
-                            continue
-                    # --- FIN DE LA MODIFICACIÓN ---
-
-                    candidate_bundle = bundle[:pos] + [order] + bundle[pos:] #concatenación de listas
-                    # Calcular la ruta completa para este candidate_bundle.
-                    # Suponemos que la ruta inicia en la ubicación del restaurante.
-                    dropoff_points = [o.dropoff_loc for o in candidate_bundle]  #asignamos a dropoff_points la ubicacion de entrega del bundle completo con la configuración iterandose
-                    route = get_route_details(restaurant.location, dropoff_points) #se calcula la ruta con la configuración tentativa 
-                    if route:
-                        service_delay = SERVICE_TIME + (SERVICE_TIME * len(candidate_bundle)) #Total Service Time=Pickup (once per bundle)+Drop-offs (once per order)=SERVICE_TIME+(SERVICE_TIME×number of orders)
-                        cost = calculate_cost(route, service_delay)
-                        if cost < best_cost_increase:
-                            best_cost_increase = cost
-                            best_bundle = bundle
-                            best_position = pos
-        
-        # Si se encontró un bundle adecuado, inserta la orden en la posición óptima.
-        if best_bundle is not None and best_position is not None:
-            best_bundle.insert(best_position, order)
-        else:
-            # Si no se encontró un bundle (caso raro), se podría crear un nuevo bundle.
-            bundles.append([order])
-
-    # --- INICIO DE LA MODIFICACIÓN: Fase de mejora con "remove-reinsert" ---
-    for _ in range(2): # Se puede iterar varias veces para una mejor solución
-        for bundle_idx, bundle in enumerate(list(bundles)):
-            for order_idx, order in enumerate(list(bundle)):
-                # 1. Extraer la orden del bundle actual
-                original_bundle = list(bundle)
-                del original_bundle[order_idx]
-                bundles[bundle_idx] = original_bundle
-
-                # 2. Encontrar la mejor posición para re-insertar la orden en CUALQUIER bundle
-                best_new_bundle_idx = -1
-                best_new_pos = -1
-                min_cost = float('inf')
-
-                for target_bundle_idx, target_bundle in enumerate(bundles):
-                    for pos in range(len(target_bundle) + 1):
-                        candidate_bundle = target_bundle[:pos] + [order] + target_bundle[pos:]
-                        
-                        dropoff_points = [o.dropoff_loc for o in candidate_bundle]
-                        route = get_route_details(restaurant.location, dropoff_points)
-                        
-                        if route:
-                            service_delay = SERVICE_TIME + (SERVICE_TIME * len(candidate_bundle))
-                            cost = calculate_cost(route, service_delay)
-                            
-                            if cost < min_cost:
-                                min_cost = cost
-                                best_new_bundle_idx = target_bundle_idx
-                                best_new_pos = pos
-                
-                # 3. Si se encontró una mejor posición, realizar el cambio
-                if best_new_bundle_idx != -1:
-                    bundles[best_new_bundle_idx].insert(best_new_pos, order)
-    # --- FIN DE LA MODIFICACIÓN ---
-
-    # Remove any empty bundles that may have been preallocated but not filled
-    return [b for b in bundles if b]
+    orders, task = prepared
+    if task is None:
+        return _bundles_from_cache(restaurant)
+    # 5. Inserción paralela + fase de mejora "remove-reinsert"
+    return _bundles_from_nodes(restaurant, orders, task, solve_bundles(task))
+
+
+# ======================
+# Bundling en paralelo
+# ======================
+
+# Pool persistente de procesos para resolver restaurantes en paralelo.
+# ``BUNDLING_WORKERS`` fija el número de procesos (1 = secuencial, 0 = uno
+# por núcleo).
+_bundling_pool = None
+
+def _bundling_workers():
+    workers = int(os.environ.get('BUNDLING_WORKERS', '1'))
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def _get_bundling_pool():
+    global _bundling_pool
+    if _bundling_pool is None:
+        # spawn: the parent already runs OSRM threads, which fork does not copy safely
+        _bundling_pool = ProcessPoolExecutor(
+            max_workers=_bundling_workers(),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+        atexit.register(_bundling_pool.shutdown)
+    return _bundling_pool
+
 
+def generate_all_bundles(restaurants, current_time, target_bundle_size, couriers_available):
+    """
+    Bundles de todos los restaurantes de la época, en el orden de ``restaurants``.
+
+    Las matrices de tiempos se preparan en este proceso (usan la matriz de la
+    época y las caches de ruteo); los subproblemas, independientes entre
+    restaurantes, se resuelven en el pool de procesos si ``BUNDLING_WORKERS``
+    es mayor que 1. El resultado es el mismo que con el cálculo secuencial.
+    """
+    prepared = []
+    for rest in restaurants:
+        p = bundling_task(rest, current_time, target_bundle_size, couriers_available)
+        if p is not None:
+            prepared.append((rest,) + p)
+    tasks = [task for _, _, task in prepared if task is not None]
+    workers = _bundling_workers()
+    results = None
+    if workers > 1 and len(tasks) > 1:
+        try:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = list(_get_bundling_pool().map(solve_bundles, tasks, chunksize=chunksize))
+        except Exception as e:
+            print(f"Parallel bundling failed ({e}); solving sequentially")
+    if results is None:
+        results = [solve_bundles(task) for task in tasks]
+
+    results = iter(results)
+    all_bundles = []
+    for rest, orders, task in prepared:
+        if task is None:
+            all_bundles.extend(_bundles_from_cache(rest))
+        else:
+            all_bundles.extend(_bundles_from_nodes(rest, orders, task, next(results)))
+    return all_bundles
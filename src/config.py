@@ -21,3 +21,14 @@ DELTA_2 = timedelta(minutes=20)
 MIN_PAY_PER_HOUR = 15.0  # p2
 PAY_PER_ORDER = 10.0  # p1
 
+
+# Los mismos intervalos en microsegundos, la unidad del tiempo interno de la
+# simulación (ver src/simtime.py)
+_US = timedelta(microseconds=1)
+OPTIMIZATION_FREQUENCY_US = OPTIMIZATION_FREQUENCY // _US
+ASSIGNMENT_HORIZON_US = ASSIGNMENT_HORIZON // _US
+TARGET_CLICK_TO_DOOR_US = TARGET_CLICK_TO_DOOR // _US
+MAX_CLICK_TO_DOOR_US = MAX_CLICK_TO_DOOR // _US
+SERVICE_TIME_US = SERVICE_TIME // _US
+DELTA_1_US = DELTA_1 // _US
+DELTA_2_US = DELTA_2 // _US
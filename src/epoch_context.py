@@ -0,0 +1,300 @@
+import numpy as np
+
+from src.bundling import bundle_score_matrix
+from src.config import MAX_CLICK_TO_DOOR_US, SERVICE_TIME, TARGET_CLICK_TO_DOOR_US
+from src.getrouteOSMR import get_route_summaries, get_route_summary, max_speed, straight_line_matrix
+from src.route_summary import RouteSummary
+from src.simtime import minutes_to_us
+
+# ======================
+# Contexto de evaluación de la época
+# ======================
+
+
+class EpochContext:
+    """Travel figures of every (courier, bundle) pair of one optimization epoch.
+
+    All the legs the epoch needs (courier -> restaurant, restaurant ->
+    restaurant and the drop-off legs of every bundle) are fetched in one
+    concurrent batch.  From them the inbound time, outbound time, earliest
+    pickup and earliest drop-off of each pair are computed once as
+    (couriers x bundles) arrays, and classification, scoring and commitment
+    all read from here.
+
+    With ``0 < k < len(couriers)`` the context is *pruned*: before routing,
+    each bundle keeps its ``k`` nearest couriers by a straight-line lower
+    bound (``straight_line_matrix`` over ``max_speed``), preferring those
+    that could still deliver within ``MAX_CLICK_TO_DOOR``.  Only the inbound
+    legs of the kept pairs are routed, and ``inbound``, ``feasible``,
+    ``earliest_pickup`` and ``earliest_dropoff`` hold one entry per kept
+    pair (``pair_rows``, ``pair_cols``) instead of a matrix.  Pairs left out
+    count as infeasible.
+
+    Instants are microseconds relative to ``current_time`` (simulation
+    time, see ``src.simtime``), so every comparison gives the same answer as
+    the scalar helpers (``classify_bundle``, ``calculate_bundle_score``,
+    ``earliest_possible_dropoff``, ...).
+    """
+
+    def __init__(self, couriers, bundles, current_time, k=0):
+        self.couriers = list(couriers)
+        self.bundles = list(bundles)
+        self.current_time = current_time
+        self._row = {c: i for i, c in enumerate(self.couriers)}
+        # bundles are lists, so they are looked up by identity
+        self._col = {id(b): j for j, b in enumerate(self.bundles)}
+
+        def offsets(values):
+            return np.array([v - current_time for v in values], dtype=np.int64)
+
+        self.sizes = np.array([len(b) for b in self.bundles], dtype=np.int64)
+        self.ready_max = offsets(max(o.ready_time for o in b) for b in self.bundles)
+        self.ready_min = offsets(min(o.ready_time for o in b) for b in self.bundles)
+        self.placement_min = offsets(min(o.placement_time for o in b) for b in self.bundles)
+
+        restaurants = list(dict.fromkeys(b[0].restaurant.location for b in self.bundles))
+        self.pruned = 0 < k < len(self.couriers)
+        if self.pruned:
+            self.pair_rows, self.pair_cols = self._nearest_pairs(restaurants, k)
+            self._pair = {
+                rc: p for p, rc in enumerate(zip(self.pair_rows.tolist(), self.pair_cols.tolist()))
+            }
+            legs = [
+                (self.couriers[i].location, self.bundles[j][0].restaurant.location)
+                for i, j in self._pair
+            ]
+        else:
+            legs = [(c.location, r) for c in self.couriers for r in restaurants]
+        legs += [(r, r) for r in restaurants]
+        for b in self.bundles:
+            points = [b[0].restaurant.location] + [o.dropoff_loc for o in b]
+            legs += zip(points[:-1], points[1:])
+        legs = list(dict.fromkeys(legs))
+        routes = get_route_summaries([(a, [b]) for a, b in legs])
+        self._legs = {
+            leg: (r.duration, r.distance) for leg, r in zip(legs, routes) if r is not None
+        }
+
+        inf = float('inf')
+        if self.pruned:
+            self.inbound = np.array(
+                [self._legs.get((self.couriers[i].location, self.bundles[j][0].restaurant.location), (inf,))[0]
+                 for i, j in self._pair],
+                dtype=float,
+            )
+            at = lambda values: values[self.pair_cols]
+        else:
+            self.inbound = np.array(
+                [[self._legs.get((c.location, b[0].restaurant.location), (inf,))[0] for b in self.bundles]
+                 for c in self.couriers],
+                dtype=float,
+            ).reshape(len(self.couriers), len(self.bundles))
+            at = lambda values: values[None, :]
+
+        self.outbound_legs = np.zeros((len(self.bundles), self.sizes.max(initial=0)))
+        for j, b in enumerate(self.bundles):
+            points = [b[0].restaurant.location] + [o.dropoff_loc for o in b]
+            for n, leg in enumerate(zip(points[:-1], points[1:])):
+                self.outbound_legs[j, n] = self._legs.get(leg, (inf,))[0]
+        # restaurante -> entregas, sumado en el orden de get_route_summary
+        self.outbound = np.zeros(len(self.bundles))
+        for leg in self.outbound_legs.T:
+            self.outbound = self.outbound + leg
+
+        service_min = SERVICE_TIME.total_seconds() / 60.0
+        inbound_min = np.where(np.isfinite(self.inbound), self.inbound, 0.0) / 60.0
+        outbound_min = np.where(np.isfinite(self.outbound), self.outbound, 0.0) / 60.0
+        self.feasible = np.isfinite(self.inbound) & at(np.isfinite(self.outbound))
+
+        # earliest_pickup_estimate: llegada + s_r/2
+        self.earliest_pickup = minutes_to_us(inbound_min + service_min / 2)
+        # earliest_possible_dropoff: recogida más temprana + entregas
+        pickup = np.maximum(at(self.ready_max), minutes_to_us(inbound_min + service_min))
+        self.earliest_dropoff = pickup + minutes_to_us(
+            at(outbound_min) + service_min * at(self.sizes)
+        )
+
+    def _nearest_pairs(self, restaurants, k):
+        """Nearest couriers of each bundle by straight-line lower bounds.
+
+        Same rule as ``candidate_pairs``, on travel times bounded from below
+        by the straight-line distance at ``max_speed()``: couriers whose bound
+        already misses ``MAX_CLICK_TO_DOOR`` are dropped unless every courier
+        misses it.  A bundle keeps ``k`` couriers plus one per other bundle
+        of its restaurant.  Returns ``(rows, cols)`` sorted by bundle.
+        """
+        column = {r: i for i, r in enumerate(restaurants)}
+        rest = np.array([column[b[0].restaurant.location] for b in self.bundles], dtype=np.intp)
+        minutes_per_meter = 1.0 / max_speed()
+        inbound = straight_line_matrix([c.location for c in self.couriers], restaurants)[:, rest]
+        inbound_min = inbound * minutes_per_meter
+        outbound_min = np.zeros(len(self.bundles))
+        for j, b in enumerate(self.bundles):
+            points = [b[0].restaurant.location] + [o.dropoff_loc for o in b]
+            legs = straight_line_matrix(points[:-1], points[1:])
+            outbound_min[j] = np.trace(legs) * minutes_per_meter
+
+        service_min = SERVICE_TIME.total_seconds() / 60.0
+        pickup = np.maximum(self.ready_max[None, :], minutes_to_us(inbound_min + service_min))
+        dropoff = pickup + minutes_to_us(outbound_min[None, :] + service_min * self.sizes[None, :])
+        reachable = dropoff <= (self.placement_min + MAX_CLICK_TO_DOOR_US)[None, :]
+        key = np.where(reachable | ~reachable.any(axis=0)[None, :], inbound, np.inf)
+
+        # los bundles de un mismo restaurante comparten sus repartidores más
+        # cercanos: cada uno conserva k más los que piden sus vecinos
+        wanted = k - 1 + np.bincount(rest, minlength=len(restaurants))[rest]
+        nearest = np.argsort(key, axis=0, kind='stable')[:wanted.max(initial=0)]
+        r = nearest.ravel()
+        c = np.tile(np.arange(len(self.bundles)), len(nearest))
+        rank = np.repeat(np.arange(len(nearest)), len(self.bundles))
+        keep = np.isfinite(key[r, c]) & (rank < wanted[c])
+        order = np.lexsort((r[keep], c[keep]))
+        return r[keep][order], c[keep][order]
+
+    def _pairs_within(self, couriers, bundles):
+        """Kept pairs inside the given subsets (pruned contexts).
+
+        Returns local ``(rows, cols)`` indexing ``couriers`` and ``bundles``
+        and the position of each pair in the per-pair arrays.
+        """
+        rows = np.full(len(self.couriers), -1, dtype=np.intp)
+        rows[[self.row(c) for c in couriers]] = np.arange(len(couriers))
+        cols = np.full(len(self.bundles), -1, dtype=np.intp)
+        cols[[self.column(b) for b in bundles]] = np.arange(len(bundles))
+        r = rows[self.pair_rows]
+        c = cols[self.pair_cols]
+        p = np.flatnonzero((r >= 0) & (c >= 0))
+        return r[p], c[p], p
+
+    def row(self, courier):
+        return self._row[courier]
+
+    def column(self, bundle):
+        return self._col[id(bundle)]
+
+    def groups(self):
+        """Priority group (1, 2 or 3) of every bundle, as ``classify_bundle``."""
+        target = self.placement_min + TARGET_CLICK_TO_DOOR_US
+        if self.pruned:
+            # sólo cuentan los pares conservados
+            cols = self.pair_cols
+            on_time = self.feasible & (self.earliest_dropoff <= target[cols])
+            pickup_ok = self.feasible & (self.earliest_pickup <= self.ready_max[cols])
+            any_on_time = np.bincount(cols[on_time], minlength=len(self.bundles)) > 0
+            any_pickup_ok = np.bincount(cols[pickup_ok], minlength=len(self.bundles)) > 0
+            return np.where(~any_on_time, 1, np.where(~any_pickup_ok, 2, 3))
+        on_time = self.feasible & (self.earliest_dropoff <= target[None, :])
+        pickup_ok = self.feasible & (self.earliest_pickup <= self.ready_max[None, :])
+        return np.where(~on_time.any(axis=0), 1, np.where(~pickup_ok.any(axis=0), 2, 3))
+
+    def _score_pairs(self, inbound, cols):
+        return bundle_score_matrix(
+            inbound[None, :],
+            self.outbound_legs[cols],
+            self.sizes[cols],
+            self.ready_max[cols],
+            self.ready_min[cols],
+            self.placement_min[cols],
+        )[0]
+
+    def scores(self, couriers=None, bundles=None):
+        """Score matrix (``calculate_bundle_score``) for a subset of pairs.
+
+        In a pruned context the pairs left out score ``-inf``.
+        """
+        if self.pruned:
+            couriers = self.couriers if couriers is None else couriers
+            bundles = self.bundles if bundles is None else bundles
+            r, c, p = self._pairs_within(couriers, bundles)
+            scores = np.full((len(couriers), len(bundles)), -np.inf)
+            scores[r, c] = self._score_pairs(self.inbound[p], self.pair_cols[p])
+            return scores
+        rows = slice(None) if couriers is None else [self.row(c) for c in couriers]
+        cols = slice(None) if bundles is None else [self.column(b) for b in bundles]
+        return bundle_score_matrix(
+            self.inbound[rows][:, cols],
+            self.outbound_legs[cols],
+            self.sizes[cols],
+            self.ready_max[cols],
+            self.ready_min[cols],
+            self.placement_min[cols],
+        )
+
+    def candidate_pairs(self, couriers, bundles, k=None):
+        """Pairs worth scoring: the ``k`` nearest couriers of each bundle.
+
+        Nearness is the inbound time, already known for every pair (every
+        kept pair, in a pruned context).  Only couriers that can still
+        deliver within ``MAX_CLICK_TO_DOOR`` are considered, unless none can
+        (the bundle is late for everybody, and then its ``k`` nearest
+        feasible couriers are kept).  ``k=None`` keeps all of them.
+        Returns ``(rows, cols)`` indexing ``couriers`` and ``bundles``.
+        """
+        if k is None:
+            k = len(couriers)
+        if self.pruned:
+            r, c, p = self._pairs_within(couriers, bundles)
+            deadline = self.placement_min[self.pair_cols[p]] + MAX_CLICK_TO_DOOR_US
+            reachable = self.feasible[p] & (self.earliest_dropoff[p] <= deadline)
+            any_reachable = np.bincount(c[reachable], minlength=len(bundles)) > 0
+            pool = np.where(any_reachable[c], reachable, self.feasible[p])
+            key = np.where(pool, self.inbound[p], np.inf)
+            # por bundle, de más cercano a más lejano (empates por repartidor)
+            order = np.lexsort((r, key, c))
+            first = np.searchsorted(c[order], c[order])
+            keep = order[(np.arange(len(order)) - first < k) & np.isfinite(key[order])]
+            keep = keep[np.lexsort((r[keep], c[keep]))]
+            return r[keep], c[keep]
+
+        rows = [self.row(c) for c in couriers]
+        cols = [self.column(b) for b in bundles]
+        inbound = self.inbound[rows][:, cols]
+        feasible = self.feasible[rows][:, cols]
+        deadline = self.placement_min[cols] + MAX_CLICK_TO_DOOR_US
+        reachable = feasible & (self.earliest_dropoff[rows][:, cols] <= deadline[None, :])
+        pool = np.where(reachable.any(axis=0)[None, :], reachable, feasible)
+
+        key = np.where(pool, inbound, np.inf)
+        k = min(k, len(rows))
+        nearest = np.argsort(key, axis=0, kind='stable')[:k]
+        r = nearest.ravel()
+        c = np.tile(np.arange(len(cols)), k)
+        keep = np.isfinite(key[r, c])
+        order = np.lexsort((r[keep], c[keep]))
+        return r[keep][order], c[keep][order]
+
+    def pair_scores(self, couriers, bundles, r, c):
+        """Scores of the pairs ``(couriers[r[i]], bundles[c[i]])``."""
+        rows = np.array([self.row(x) for x in couriers], dtype=np.intp)[r]
+        cols = np.array([self.column(x) for x in bundles], dtype=np.intp)[c]
+        if self.pruned:
+            inbound = np.array(
+                [self.inbound[self._pair[rc]] if rc in self._pair else np.inf
+                 for rc in zip(rows.tolist(), cols.tolist())],
+                dtype=float,
+            )
+        else:
+            inbound = self.inbound[rows, cols]
+        return self._score_pairs(inbound, cols)
+
+    def route(self, start, waypoints):
+        """:class:`RouteSummary` for start -> waypoints from the epoch's legs.
+
+        Falls back to ``get_route_summary`` if a leg was not prefetched.
+        """
+        duration = 0.0
+        distance = 0.0
+        origin = start
+        for destination in waypoints:
+            leg = self._legs.get((origin, destination))
+            if leg is None:
+                return get_route_summary(start, waypoints)
+            duration += leg[0]
+            distance += leg[1]
+            origin = destination
+        return RouteSummary(duration, distance, start, waypoints)
+
+
+def score_bundles(couriers, bundles, current_time):
+    """Matriz (couriers x bundles) de ``calculate_bundle_score`` calculada en bloque."""
+    return EpochContext(couriers, bundles, current_time).scores()
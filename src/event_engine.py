@@ -0,0 +1,100 @@
+import heapq
+import itertools
+
+# ======================
+# Motor de simulación por eventos discretos
+# ======================
+#
+# Alternativa al ciclo de paso fijo de run_simulation (SIM_ENGINE=events).
+# Los eventos se guardan en un heap por (instante, tipo, orden, secuencia);
+# dentro de un mismo instante se procesan primero las llegadas (turnos y
+# órdenes), luego la época de optimización y al final las rutas terminadas.
+#
+# Tiempos de los eventos (SIM_EVENT_TIMES):
+#   exact (default)  cada evento ocurre en su instante: un repartidor queda
+#                    libre en cuanto termina su ruta y entra o sale de turno
+#                    a su hora.  Los KPIs no son los del ciclo de paso fijo
+#                    (en la instancia sintética de La Paz con RH baja el
+#                    click-to-door medio, de 124 a 83 min).
+#   tick             los eventos se mueven al siguiente instante de la malla
+#                    de OPTIMIZATION_FREQUENCY, como los ve el ciclo de paso
+#                    fijo: mismos resultados que SIM_ENGINE=loop.
+#
+# No hay evento ORDER_READY: una orden entra al pool de pendientes al
+# colocarse y cada época elige las que estarán listas dentro del horizonte
+# de asignación (ready_time), así que el instante en que queda lista no
+# cambia ningún estado por sí mismo.
+
+COURIER_ON = 0
+COURIER_OFF = 1
+ORDER_PLACED = 2
+EPOCH = 3
+ROUTE_DONE = 4
+
+
+def tick_ceil(t, start_time, frequency):
+    """First instant of the ``start_time + k * frequency`` grid at or after ``t``."""
+    if t <= start_time:
+        return start_time
+    steps = -((start_time - t) // frequency)
+    return start_time + steps * frequency
+
+
+def simulate_events(couriers, orders, start_time, simulation_end, frequency,
+                    on_shift, off_shift, placed, epoch, completed, exact=True):
+    """Run the simulation as a sequence of timestamped events.
+
+    The handlers carry the policy: ``on_shift(c, t)``, ``off_shift(c, t)``,
+    ``placed(order, t)``, ``completed(c, t)`` and ``epoch(t)``, which must
+    return ``(busy, waiting)``: the couriers that got a route and whether
+    orders are still waiting for one.  Epochs run on the
+    ``start_time + k * frequency`` grid only while orders are waiting; a new
+    order restarts them at the next grid instant, so idle periods cost
+    nothing.
+
+    With ``exact`` (default) every event happens at its own timestamp,
+    e.g. a courier is free again as soon as its route ends.  With
+    ``exact=False`` events are moved to the next grid instant, which
+    reproduces the fixed-step loop (and its KPIs).  Events at or after
+    ``simulation_end`` are not processed.
+    """
+    def when(t):
+        return t if exact else tick_ceil(t, start_time, frequency)
+
+    queue = []
+    seq = itertools.count()
+
+    def push(t, kind, rank, payload):
+        heapq.heappush(queue, (t, kind, rank, next(seq), payload))
+
+    for i, c in enumerate(couriers):
+        push(when(c.on_time), COURIER_ON, i, c)
+    for i, o in enumerate(sorted(orders, key=lambda o: o.placement_time)):
+        push(when(o.placement_time), ORDER_PLACED, i, o)
+
+    rank = {}  # orden de activación, como la lista de repartidores activos
+    next_epoch = None
+    while queue:
+        t, kind, _, _, payload = heapq.heappop(queue)
+        if t >= simulation_end:
+            break
+        if kind == COURIER_ON:
+            rank[payload] = len(rank)
+            on_shift(payload, t)
+            push(when(payload.off_time), COURIER_OFF, rank[payload], payload)
+        elif kind == COURIER_OFF:
+            off_shift(payload, t)
+        elif kind == ORDER_PLACED:
+            placed(payload, t)
+            if next_epoch is None:
+                next_epoch = tick_ceil(t, start_time, frequency)
+                push(next_epoch, EPOCH, 0, None)
+        elif kind == EPOCH:
+            busy, waiting = epoch(t)
+            for c in busy:
+                push(when(c.current_route['completion_time']), ROUTE_DONE, rank[c], c)
+            next_epoch = t + frequency if waiting else None
+            if next_epoch is not None:
+                push(next_epoch, EPOCH, 0, None)
+        else:
+            completed(payload, t)
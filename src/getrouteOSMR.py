@@ -1,10 +1,16 @@
 import requests
 import os
 import math
+import numpy as np
 import polyline
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from src.route_cache import LRUCache, RouteStore, RoutingStats, route_key
+from src.route_summary import RouteSummary
+from src.travel_matrix import TravelMatrix
 
 def haversine_distance(pt1, pt2):
     """Calculate the great-circle distance in meters between two points
@@ -26,15 +32,61 @@ def haversine_distance(pt1, pt2):
 
     return R * c
 
+def _haversine_arrays(lat1, lon1, lat2, lon2):
+    """NumPy version of :func:`haversine_distance` on broadcastable arrays."""
+    R = 6371e3  # Earth radius in meters
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    half_dphi = np.sin(np.radians(lat2 - lat1) / 2)
+    half_dlambda = np.sin(np.radians(lon2 - lon1) / 2)
+    a = half_dphi * half_dphi + np.cos(phi1) * np.cos(phi2) * half_dlambda * half_dlambda
+    return R * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+def haversine_matrix(points_a, points_b=None):
+    """Great-circle distance in meters between every pair of points.
+
+    ``points_a`` and ``points_b`` are sequences (or ``(n, 2)`` arrays) of
+    (lat, lon); the result has shape ``(len(points_a), len(points_b))``.  With a
+    single argument the square matrix of ``points_a`` is returned.
+    """
+    a = np.asarray(points_a, dtype=float).reshape(-1, 2)
+    b = a if points_b is None else np.asarray(points_b, dtype=float).reshape(-1, 2)
+    return _haversine_arrays(a[:, None, 0], a[:, None, 1], b[None, :, 0], b[None, :, 1])
+
+def haversine_legs(coords):
+    """Distances in meters between consecutive points of ``coords``."""
+    c = np.asarray(coords, dtype=float).reshape(-1, 2)
+    return _haversine_arrays(c[:-1, 0], c[:-1, 1], c[1:, 0], c[1:, 1])
+
+def _meters_per_minute():
+    return float(os.environ.get("METERS_PER_MINUTE", 320))
+
+def _euclidean_route(coords):
+    """Route dict for ``coords`` at constant speed over great-circle legs."""
+    leg_distances = haversine_legs(coords)
+    # Sum leg by leg so the figures match a gather-and-sum over the epoch
+    # TravelMatrix bit for bit.
+    distance = sum(leg_distances.tolist(), 0.0)
+    duration_sec = sum(((leg_distances / _meters_per_minute()) * 60.0).tolist(), 0.0)
+    legs = [{"steps": [{"maneuver": {"location": (b[1], b[0])}}]} for b in coords[1:]]
+    geometry = polyline.encode(coords)
+    return {"distance": distance, "duration": duration_sec, "geometry": geometry, "legs": legs}
+
 # Configure a requests Session with retry/backoff to be resilient to
 # transient errors and common server-side rate limiting (HTTP 429).
 _session = None
+_session_lock = threading.Lock()
 
 def _get_session():
     global _session
     if _session is not None:
         return _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+    return _session
 
+def _build_session():
     s = requests.Session()
     retries = Retry(
         total=int(os.environ.get('OSRM_MAX_RETRIES', '3')),
@@ -42,11 +94,57 @@ def _get_session():
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["GET", "POST"]
     )
-    adapter = HTTPAdapter(max_retries=retries)
+    # One pooled connection per worker thread so concurrent requests reuse
+    # keep-alive connections instead of opening new sockets.
+    pool_size = _max_workers()
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
     s.mount('http://', adapter)
     s.mount('https://', adapter)
-    _session = s
-    return _session
+    return s
+
+def _max_workers():
+    return max(1, int(os.environ.get('OSRM_MAX_WORKERS', str(min(32, (os.cpu_count() or 1) * 4)))))
+
+# Thread pool used to issue batches of OSRM requests in parallel.
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers(), thread_name_prefix='osrm')
+    return _executor
+
+# Optional on-disk route store shared across runs and worker processes.  It is
+# enabled by pointing ``OSRM_CACHE_PATH`` at a SQLite file;
+# ``OSRM_CACHE_MAX_ENTRIES`` bounds its size and ``OSRM_CACHE_READONLY=1``
+# opens it without ever writing to it.
+_route_store = None
+_route_store_path = None
+
+def _get_route_store():
+    global _route_store, _route_store_path
+    path = os.environ.get('OSRM_CACHE_PATH')
+    if not path:
+        return None
+    if _route_store is not None and _route_store_path == path:
+        return _route_store
+
+    store = RouteStore(
+        path,
+        max_entries=int(os.environ.get('OSRM_CACHE_MAX_ENTRIES', '200000')),
+        read_only=os.environ.get('OSRM_CACHE_READONLY') == '1',
+    )
+    try:
+        store._connect()
+    except Exception as e:
+        print(f"Route store unavailable at {path}: {e}")
+        store = None
+    _route_store = store
+    _route_store_path = path
+    return _route_store
+
+def _osrm_base_url():
+    return os.environ.get('OSRM_URL', 'http://localhost:5000').rstrip('/')
 
 def as_lonlat(pt):
     """Convert (lat, lon) -> (lon, lat)"""
@@ -62,48 +160,114 @@ def as_latlon(pt):
 # Funcion de ruteo OSRM
 # ======================
 
-_osrm_cache = {}
+# Counters and latency histograms for every routing layer; see routing_stats().
+stats = RoutingStats()
 
-def get_route_details(start_coords, waypoints):
-    cache_key = (start_coords,) + tuple(waypoints)
-    if cache_key in _osrm_cache:
-        return _osrm_cache[cache_key]
-    """Return routing information for start_coords -> waypoints.
+# Full route dicts (with geometry/steps) by waypoint tuple.  Bounded because
+# OSRM responses are large; OSRM_CACHE_CAPACITY sets the number of entries.
+_osrm_cache = LRUCache(
+    int(os.environ.get('OSRM_CACHE_CAPACITY', '2000')),
+    on_evict=lambda: stats.incr("route_evictions"),
+)
 
-    If the environment variable ``USE_EUCLIDEAN`` is set to ``1`` the route is
-    computed using simple Euclidean distance with constant speed given by the
-    ``METERS_PER_MINUTE`` environment variable (default 320).  Otherwise the
-    If explicitly requested, use Euclidean fallback only and skip HTTP calls.
+def routing_stats():
+    """Return a snapshot of routing counters and latency histograms."""
+    return stats.snapshot()
+
+def reset_routing_stats():
+    stats.reset()
+
+def dump_routing_stats():
+    print(stats.report())
+
+# Planar travel-time backend for MDRPLib instances (see src/planar.py).
+_planar_network = None
+
+def set_planar_network(network):
+    """Route on integer location ids of ``network`` (``None`` disables it)."""
+    global _planar_network
+    _planar_network = network
+
+def get_planar_network():
+    return _planar_network
+
+def location_xy(location):
+    """Return a coordinate pair for straight-line comparisons.
+
+    (lat, lon) tuples are returned unchanged; planar location ids are mapped to
+    their (x, y) coordinates in meters.
     """
+    if _planar_network is not None and not isinstance(location, tuple):
+        return tuple(_planar_network.xy[location])
+    return location
 
-    use_euclidean = os.environ.get('USE_EUCLIDEAN') == '1'
+def straight_line_matrix(points_a, points_b):
+    """Straight-line distance in meters between every pair of locations.
 
-    # If explicitly requested, use Euclidean fallback only and skip HTTP calls.
-    if use_euclidean:
-        speed = float(os.environ.get("METERS_PER_MINUTE", 320))
-        coords = [start_coords] + waypoints
-        distance = 0.0
-        legs = []
-        for a, b in zip(coords[:-1], coords[1:]):
-            seg = haversine_distance(a, b)  # Use Haversine for meters
-            distance += seg
-            legs.append({"steps": [{"maneuver": {"location": (b[1], b[0])}}]})
-        duration_sec = (distance / speed) * 60.0
-        geometry = polyline.encode(coords)
-        result = {"distance": distance, "duration": duration_sec, "geometry": geometry, "legs": legs}
-        _osrm_cache[cache_key] = result
-        return result
+    Planar location ids use their (x, y) coordinates, (lat, lon) tuples the
+    great-circle distance.  No travel time is shorter than this distance over
+    ``max_speed()``, so it gives cheap lower bounds before any routing.
+    """
+    a = [location_xy(p) for p in points_a]
+    b = [location_xy(p) for p in points_b]
+    if _planar_network is not None and not isinstance(points_a[0] if points_a else (), tuple):
+        a = np.asarray(a, dtype=float).reshape(-1, 2)
+        b = np.asarray(b, dtype=float).reshape(-1, 2)
+        return np.sqrt((a[:, None, 0] - b[None, :, 0]) ** 2 + (a[:, None, 1] - b[None, :, 1]) ** 2)
+    return haversine_matrix(a, b)
+
+def max_speed():
+    """Upper bound of the travel speed, in meters per minute.
+
+    ``ASSIGNMENT_MAX_SPEED`` if set; otherwise the speed of the planar network
+    or of the Euclidean fallback, and 1500 m/min (90 km/h) for OSRM.
+    """
+    if 'ASSIGNMENT_MAX_SPEED' in os.environ:
+        return float(os.environ['ASSIGNMENT_MAX_SPEED'])
+    if _planar_network is not None:
+        return _planar_network.meters_per_minute
+    if os.environ.get('USE_EUCLIDEAN') == '1':
+        return _meters_per_minute()
+    return 1500.0
+
+def _request_route(points, full=True):
+    """Query OSRM ``/route`` for ``points`` (lat, lon) and return the route dict.
+
+    With ``full=False`` geometry, steps and annotations are not requested and
+    only ``duration``/``distance`` are kept.  Responses go through the
+    persistent route store when it is enabled.  Returns ``None`` on failure.
+    """
+    store = _get_route_store()
+    store_key = None
+    if store is not None:
+        store_key = route_key(points) if full else "summary:" + route_key(points)
+        try:
+            stored = store.get(store_key)
+        except Exception as e:
+            print(f"Route store read failed: {e}")
+            stored = None
+        if stored is not None:
+            stats.incr("store_hits")
+            return stored
 
-    points = [start_coords] + waypoints
     coordinates = ";".join(
         f"{lon},{lat}" for lon, lat in map(as_lonlat, points)
     )
-    url = f"http://localhost:5000/route/v1/driving/{coordinates}"
-    params = {"overview": "full", "steps": "true", "annotations": "true"}
+    url = f"{_osrm_base_url()}/route/v1/driving/{coordinates}"
+    if full:
+        params = {"overview": "full", "steps": "true", "annotations": "true"}
+    else:
+        # Only duration/distance are read: skip geometry, steps and annotations
+        params = {"overview": "false", "steps": "false", "annotations": "false"}
 
     try:
         session = _get_session()
-        response = session.get(url, params=params, timeout=float(os.environ.get('OSRM_TIMEOUT', '30')))
+        stats.incr("http_requests")
+        started = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=float(os.environ.get('OSRM_TIMEOUT', '30')))
+        finally:
+            stats.record_latency("route", time.perf_counter() - started)
         # If the server returns a non-200 status this will raise and be
         # handled by the retry logic in the adapter; otherwise continue.
         response.raise_for_status()
@@ -111,7 +275,13 @@ def get_route_details(start_coords, waypoints):
         code = data.get('code')
         if code == 'Ok' and data.get('routes'):
             result = data['routes'][0]
-            _osrm_cache[cache_key] = result
+            if not full:
+                result = {"duration": result["duration"], "distance": result["distance"]}
+            if store is not None:
+                try:
+                    store.put(store_key, result)
+                except Exception as e:
+                    print(f"Route store write failed: {e}")
             return result
 
         # Handle situations where OSRM returns an error code (e.g., NoRoute,
@@ -119,14 +289,59 @@ def get_route_details(start_coords, waypoints):
         # Euclidean estimate rather than fail hard.
         msg = data.get('message') if isinstance(data, dict) else None
         print(f"OSRM returned code={code} message={msg}")
+        stats.incr("http_errors")
 
     except requests.exceptions.HTTPError as e:
         # If we received a 429 or 5xx after retries, fall through to fallback
         # handling below. Print a short diagnostic.
         print(f"OSRM HTTP error: {e} (status={getattr(e.response, 'status_code', None)})")
+        stats.incr("http_errors")
     except Exception as e:
         # Generic catch-all for connectivity/timeouts/etc.
         print(f"Routing error: {e}")
+        stats.incr("http_errors")
+
+    return None
+
+def get_route_details(start_coords, waypoints):
+    """Return routing information for start_coords -> waypoints.
+
+    When a planar network is installed (``set_planar_network``) locations are
+    integer ids and the route comes from its travel-time matrix.
+    If the environment variable ``USE_EUCLIDEAN`` is set to ``1`` the route is
+    computed using simple Euclidean distance with constant speed given by the
+    ``METERS_PER_MINUTE`` environment variable (default 320).  Otherwise the
+    local OSRM server is queried; successful responses are kept in memory and,
+    when ``OSRM_CACHE_PATH`` is set, in the persistent route store so later
+    runs can skip the HTTP call entirely.
+    """
+    if _planar_network is not None:
+        summary = _planar_network.route_summary(start_coords, waypoints)
+        if summary is None:
+            return None
+        return {"distance": summary.distance, "duration": summary.duration,
+                "geometry": None, "legs": []}
+
+    cache_key = (start_coords,) + tuple(waypoints)
+    cached = _osrm_cache.get(cache_key)
+    if cached is not None:
+        stats.incr("route_hits")
+        return cached
+    stats.incr("route_misses")
+
+    use_euclidean = os.environ.get('USE_EUCLIDEAN') == '1'
+
+    # If explicitly requested, use Euclidean fallback only and skip HTTP calls.
+    if use_euclidean:
+        result = _euclidean_route([start_coords] + list(waypoints))
+        _osrm_cache[cache_key] = result
+        return result
+
+    points = [start_coords] + list(waypoints)
+    result = _request_route(points, full=True)
+    if result is not None:
+        _osrm_cache[cache_key] = result
+        return result
 
     # If we get here the OSRM call failed or returned an error. Respect an
     # environment-driven policy to fallback to Euclidean routing which is
@@ -134,20 +349,307 @@ def get_route_details(start_coords, waypoints):
     fallback = os.environ.get('USE_EUCLIDEAN_ON_FAILURE', '1') == '1'
     if fallback:
         try:
-            speed = float(os.environ.get("METERS_PER_MINUTE", 320))
-            coords = [start_coords] + waypoints
-            distance = 0.0
-            legs = []
-            for a, b in zip(coords[:-1], coords[1:]):
-                seg = haversine_distance(a, b)  # Use Haversine for meters
-                distance += seg
-                legs.append({"steps": [{"maneuver": {"location": (b[1], b[0])}}]})
-            duration_sec = (distance / speed) * 60.0
-            geometry = polyline.encode(coords)
-            return {"distance": distance, "duration": duration_sec, "geometry": geometry, "legs": legs}
+            result = _euclidean_route(points)
+            # Marked so callers know not to cache the estimate.
+            result["fallback"] = True
+            stats.incr("fallbacks")
+            return result
         except Exception as e:
             print(f"Euclidean fallback failed: {e}")
 
     return None
 
 
+# ======================
+# Matriz de tiempos por época (OSRM /table)
+# ======================
+
+def get_table(points):
+    """Fetch the full duration/distance matrix between ``points`` from OSRM.
+
+    OSRM limits the number of coordinates accepted by ``/table`` (100 by
+    default, ``--max-table-size``), so the matrix is assembled from blocks of
+    sources x destinations of at most ``OSRM_TABLE_MAX_COORDS`` coordinates per
+    request, fetched in parallel.  Returns ``(durations, distances)`` as NumPy
+    arrays in seconds and meters (``inf`` for unreachable pairs) or ``None`` if
+    any request fails.
+
+    With the persistent route store enabled every cell is kept there as a
+    single-leg summary (the entry ``_request_route(..., full=False)`` uses),
+    and blocks whose cells are all stored are not requested again.
+    """
+    n = len(points)
+    durations = np.full((n, n), np.inf)
+    distances = np.full((n, n), np.inf)
+    if n == 0:
+        return durations, distances
+
+    max_coords = max(2, int(os.environ.get('OSRM_TABLE_MAX_COORDS', '100')))
+    block = n if n <= max_coords else max_coords // 2
+    blocks = [list(range(i, min(i + block, n))) for i in range(0, n, block)]
+    pairs = [(src, dst) for src in blocks for dst in blocks]
+
+    store = _get_route_store()
+    keys = None
+    if store is not None:
+        keys = _table_cell_keys(points)
+        known = _load_table_cells(store, keys, durations, distances)
+        pairs = [(src, dst) for src, dst in pairs if not known[np.ix_(src, dst)].all()]
+
+    # Blocks are independent requests: fetch them concurrently.
+    results = _get_executor().map(lambda pair: _fetch_table_block(points, *pair), pairs)
+    for (src, dst), result in zip(pairs, list(results)):
+        if result is None:
+            return None
+        durations[np.ix_(src, dst)], distances[np.ix_(src, dst)] = result
+    if store is not None and pairs:
+        _save_table_cells(store, keys, pairs, durations, distances)
+    return durations, distances
+
+def _table_cell_keys(points):
+    """Route store key of every (origin, destination) cell of the table."""
+    point_keys = [route_key([p]) for p in points]
+    return [["summary:" + a + ";" + b for b in point_keys] for a in point_keys]
+
+def _load_table_cells(store, keys, durations, distances):
+    """Fill the cells found in ``store``; returns the mask of cells filled."""
+    n = len(keys)
+    known = np.zeros((n, n), dtype=bool)
+    try:
+        found = store.get_many(key for row in keys for key in row)
+    except Exception as e:
+        print(f"Route store read failed: {e}")
+        return known
+    stats.incr("store_hits", len(found))
+    for i, row in enumerate(keys):
+        for j, key in enumerate(row):
+            leg = found.get(key)
+            if leg is not None:
+                durations[i, j], distances[i, j] = leg["duration"], leg["distance"]
+                known[i, j] = True
+    return known
+
+def _save_table_cells(store, keys, pairs, durations, distances):
+    # Unreachable pairs are not stored: /route would not have answered them
+    # either, and JSON has no infinity.
+    items = []
+    for src, dst in pairs:
+        for i in src:
+            for j in dst:
+                if np.isfinite(durations[i, j]) and np.isfinite(distances[i, j]):
+                    items.append((keys[i][j], {"duration": float(durations[i, j]),
+                                               "distance": float(distances[i, j])}))
+    try:
+        store.put_many(items)
+    except Exception as e:
+        print(f"Route store write failed: {e}")
+
+def _fetch_table_block(points, src, dst):
+    """Fetch the ``src`` x ``dst`` block of the table, or ``None`` on error."""
+    if src is dst:
+        coord_idx = src
+        sources = destinations = None
+    else:
+        coord_idx = src + dst
+        sources = ";".join(str(k) for k in range(len(src)))
+        destinations = ";".join(str(k) for k in range(len(src), len(coord_idx)))
+    coordinates = ";".join(
+        f"{lon},{lat}" for lon, lat in (as_lonlat(points[k]) for k in coord_idx)
+    )
+    url = f"{_osrm_base_url()}/table/v1/driving/{coordinates}"
+    params = {"annotations": "duration,distance"}
+    if sources is not None:
+        params["sources"] = sources
+        params["destinations"] = destinations
+    stats.incr("http_requests")
+    started = time.perf_counter()
+    try:
+        response = _get_session().get(url, params=params, timeout=float(os.environ.get('OSRM_TIMEOUT', '30')))
+        response.raise_for_status()
+        data = response.json()
+    except Exception as e:
+        print(f"OSRM table error: {e}")
+        stats.incr("http_errors")
+        return None
+    finally:
+        stats.record_latency("table", time.perf_counter() - started)
+    if data.get('code') != 'Ok':
+        print(f"OSRM table returned code={data.get('code')} message={data.get('message')}")
+        stats.incr("http_errors")
+        return None
+
+    block_dur = np.array(data['durations'], dtype=float)
+    block_dist = np.array(data.get('distances', data['durations']), dtype=float)
+    # OSRM uses null for unreachable pairs -> nan after the cast
+    block_dur[np.isnan(block_dur)] = np.inf
+    block_dist[np.isnan(block_dist)] = np.inf
+    return block_dur, block_dist
+
+
+def build_travel_matrix(points):
+    """Return a :class:`TravelMatrix` for ``points`` using bulk requests.
+
+    Duplicated points are collapsed.  With a planar network installed the
+    matrix is sliced from it; with ``USE_EUCLIDEAN=1`` it is
+    computed in one vectorized haversine call; otherwise it is fetched from
+    OSRM ``/table``.  Returns ``None`` if the table could not be fetched, in
+    which case callers keep using per-route requests.
+    """
+    unique = list(dict.fromkeys(points))
+    if not unique:
+        return None
+    if _planar_network is not None:
+        return _planar_network.submatrix(unique)
+    if os.environ.get('USE_EUCLIDEAN') == '1':
+        distances = haversine_matrix(unique)
+        durations = (distances / _meters_per_minute()) * 60.0
+        return TravelMatrix(unique, durations, distances)
+    table = get_table(unique)
+    if table is None:
+        return None
+    durations, distances = table
+    return TravelMatrix(unique, durations, distances)
+
+
+# Matrix prefetched for the current optimization epoch (see run_simulation).
+_epoch_matrix = None
+
+def set_epoch_matrix(matrix):
+    """Install ``matrix`` as the source for route summaries (``None`` clears it)."""
+    global _epoch_matrix
+    _epoch_matrix = matrix
+
+def get_epoch_matrix():
+    return _epoch_matrix
+
+# ======================
+# Cache de tramos (legs)
+# ======================
+
+# Duration/distance of every single leg seen so far, keyed on (origin,
+# destination).  Bundling probes many permutations of the same drop-offs, so
+# whole-route keys rarely repeat while their legs almost always do.
+_leg_cache = LRUCache(
+    int(os.environ.get('OSRM_LEG_CACHE_CAPACITY', '1000000')),
+    on_evict=lambda: stats.incr("leg_evictions"),
+)
+
+def leg_cache_info():
+    """Return hit/miss counters and size of the leg cache."""
+    counters = stats.snapshot()["counters"]
+    hits, misses = counters["leg_hits"], counters["leg_misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": len(_leg_cache),
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+def clear_leg_cache():
+    """Drop every cached leg; routing counters are kept (see reset_routing_stats)."""
+    _leg_cache.clear()
+
+def _fetch_leg(origin, destination):
+    """Return ``(duration, distance)`` for one leg, or ``None``."""
+    if os.environ.get('USE_EUCLIDEAN') == '1':
+        distance = float(haversine_legs([origin, destination])[0])
+        leg = ((distance / _meters_per_minute()) * 60.0, distance)
+        _leg_cache[(origin, destination)] = leg
+        return leg
+    route = _request_route([origin, destination], full=False)
+    if route is not None:
+        leg = (route["duration"], route["distance"])
+        _leg_cache[(origin, destination)] = leg
+        return leg
+    if os.environ.get('USE_EUCLIDEAN_ON_FAILURE', '1') == '1':
+        # Same fallback as get_route_details; not cached.
+        stats.incr("fallbacks")
+        distance = float(haversine_legs([origin, destination])[0])
+        return ((distance / _meters_per_minute()) * 60.0, distance)
+    return None
+
+# Legs currently being fetched, so concurrent callers asking for the same leg
+# wait on a single request instead of issuing duplicates.
+_inflight = {}
+_inflight_lock = threading.RLock()
+
+def _submit_leg(leg):
+    with _inflight_lock:
+        future = _inflight.get(leg)
+        if future is None:
+            future = _get_executor().submit(_fetch_leg, *leg)
+            _inflight[leg] = future
+            future.add_done_callback(lambda f, leg=leg: _inflight.pop(leg, None))
+    return future
+
+def prefetch_legs(legs):
+    """Fetch every leg of ``legs`` not cached yet, in parallel.
+
+    Duplicate legs, and legs already being fetched by another thread, are
+    coalesced into a single request.  Returns the number of legs requested.
+    """
+    missing = [leg for leg in dict.fromkeys(legs) if leg not in _leg_cache]
+    if not missing:
+        return 0
+    stats.incr("leg_misses", len(missing))
+    if os.environ.get('USE_EUCLIDEAN') == '1' or len(missing) == 1:
+        for leg in missing:
+            _fetch_leg(*leg)
+        return len(missing)
+    futures = [_submit_leg(leg) for leg in missing]
+    for future in futures:
+        future.result()
+    return len(missing)
+
+def get_route_summaries(queries):
+    """Batch version of :func:`get_route_summary`.
+
+    ``queries`` is a sequence of ``(start_coords, waypoints)``.  All legs not
+    answered by the planar network, the epoch matrix or the leg cache are
+    fetched concurrently first, then every summary is composed from cache.
+    """
+    queries = [(start, list(waypoints)) for start, waypoints in queries]
+    if _planar_network is None:
+        legs = []
+        for start, waypoints in queries:
+            points = [start] + waypoints
+            if _epoch_matrix is not None and _epoch_matrix.covers(points):
+                continue
+            legs.extend(zip(points[:-1], points[1:]))
+        prefetch_legs(legs)
+    return [get_route_summary(start, waypoints) for start, waypoints in queries]
+
+def get_route_summary(start_coords, waypoints):
+    """Return a :class:`RouteSummary` for start_coords -> waypoints.
+
+    Scoring, bundling and commitment only need duration and distance; the
+    geometry is fetched lazily if the route is ever drawn.  When an epoch matrix
+    covers every location the answer comes straight from it; otherwise the
+    route is assembled from cached legs and only unseen legs are requested
+    (OSRM composes multi-stop routes from independent legs the same way).
+    Returns ``None`` if a leg cannot be routed.
+    """
+    if _planar_network is not None:
+        return _planar_network.route_summary(start_coords, waypoints)
+    if _epoch_matrix is not None:
+        summary = _epoch_matrix.route_summary(start_coords, waypoints)
+        if summary is not None:
+            return summary
+
+    duration = 0.0
+    distance = 0.0
+    origin = start_coords
+    for destination in waypoints:
+        leg = _leg_cache.get((origin, destination))
+        if leg is None:
+            stats.incr("leg_misses")
+            leg = _fetch_leg(origin, destination)
+            if leg is None:
+                return None
+        else:
+            stats.incr("leg_hits")
+        duration += leg[0]
+        distance += leg[1]
+        origin = destination
+    return RouteSummary(duration, distance, start_coords, waypoints)
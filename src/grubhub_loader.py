@@ -3,48 +3,71 @@ import pandas as pd
 from datetime import datetime, timedelta
 from src.main import Order, Courier, Restaurant
 from src.coord_transform import xy_to_latlon
+from src.planar import PlanarNetwork
 
 START_TIME = datetime(2025, 1, 1)
 
-def load_instance(path):
+def load_instance(path, planar=False):
     """Load a Grubhub benchmark instance from ``path``.
 
     Returns a tuple ``(orders, couriers, restaurants, params)``.
+
+    By default the planar coordinates are mapped to La Paz lat/lon with
+    ``xy_to_latlon``.  With ``planar=True`` every location is instead an
+    integer id into a :class:`PlanarNetwork` returned as
+    ``params['planar_network']``; install it with
+    ``src.getrouteOSMR.set_planar_network`` to route with the evaluator's
+    travel times.
     """
     orders_df = pd.read_table(os.path.join(path, 'orders.txt'))
     rest_df = pd.read_table(os.path.join(path, 'restaurants.txt'))
     cour_df = pd.read_table(os.path.join(path, 'couriers.txt'))
     params_df = pd.read_table(os.path.join(path, 'instance_parameters.txt'))
+    params = params_df.iloc[0].to_dict()
+
+    if planar:
+        # ids: restaurants first, then order drop-offs, then courier starts
+        frames = [rest_df, orders_df, cour_df]
+        offsets = [0, len(rest_df), len(rest_df) + len(orders_df)]
+        xy = pd.concat([f[['x', 'y']] for f in frames]).to_numpy()
+        params['planar_network'] = PlanarNetwork(xy, params['meters_per_minute'])
+        rest_locs, order_locs, cour_locs = (
+            [offset + k for k in range(len(f))] for offset, f in zip(offsets, frames)
+        )
+    else:
+        rest_locs, order_locs, cour_locs = (
+            [xy_to_latlon(x, y) for x, y in zip(f['x'], f['y'])]
+            for f in (rest_df, orders_df, cour_df)
+        )
 
     restaurants = []
     rest_map = {}
-    for _, row in rest_df.iterrows():
-        r = Restaurant(row['restaurant'], xy_to_latlon(row['x'], row['y']))
+    for (_, row), loc in zip(rest_df.iterrows(), rest_locs):
+        r = Restaurant(row['restaurant'], loc)
         restaurants.append(r)
         rest_map[row['restaurant']] = r
 
     orders = []
-    for _, row in orders_df.iterrows():
+    for (_, row), loc in zip(orders_df.iterrows(), order_locs):
         orders.append(
             Order(
                 row['order'],
                 rest_map[row['restaurant']],
                 START_TIME + timedelta(minutes=int(row['placement_time'])),
                 START_TIME + timedelta(minutes=int(row['ready_time'])),
-                xy_to_latlon(row['x'], row['y'])
+                loc
             )
         )
 
     couriers = []
-    for _, row in cour_df.iterrows():
+    for (_, row), loc in zip(cour_df.iterrows(), cour_locs):
         couriers.append(
             Courier(
                 row['courier'],
                 START_TIME + timedelta(minutes=int(row['on_time'])),
                 START_TIME + timedelta(minutes=int(row['off_time'])),
-                xy_to_latlon(row['x'], row['y'])
+                loc
             )
         )
 
-    params = params_df.iloc[0].to_dict()
     return orders, couriers, restaurants, params
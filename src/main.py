@@ -4,17 +4,29 @@
 # - folium y polyline para la generación de mapas y decodificación de rutas.
 # - restaurants y couriers para manejar listas de restaurantes y repartidores.
 
+import heapq
 import folium
 import polyline
 import os
 import pandas as pd
 from datetime import datetime
-from src.bundling import compute_target_bundle_size, generate_bundles_for_restaurant
-from src.asignaciontentativa import assign_bundles_to_couriers, assign_order_to_nearest_courier
-from src.config import PAY_PER_ORDER, MIN_PAY_PER_HOUR, ASSIGNMENT_HORIZON, OPTIMIZATION_FREQUENCY
+from src.bundling import compute_target_bundle_size, generate_all_bundles, clear_bundle_cache, bundle_cache_info
+from src.asignaciontentativa import assign_bundles_to_couriers, assign_orders_fcfs
+from src.assignment_solvers import clear_solver_state, solver_info
+from src.config import PAY_PER_ORDER, MIN_PAY_PER_HOUR, ASSIGNMENT_HORIZON_US, OPTIMIZATION_FREQUENCY_US
+from src.getrouteOSMR import build_travel_matrix, set_epoch_matrix, dump_routing_stats, location_xy
+from src.spatial_index import CourierGrid, suggest_cell_size
+from src.event_engine import simulate_events
+from src.sim_index import PendingOrders, ShiftSchedule
+from src.simtime import SimClock
+from src.state_store import ASSIGNED, READY, CourierStore, OrderStore
+from src.results_sink import ResultsSink
 from collections import deque
 
 class Order:
+    __slots__ = ('restaurant', 'placement_time', 'ready_time', 'dropoff_loc', 'status',
+                 'pickup_time', 'delivery_time', 'id', 'row')
+
     def __init__(self, order_id, restaurant, placement_time, ready_time, dropoff_loc):
         self.restaurant = restaurant 
         self.placement_time = placement_time
@@ -25,6 +37,7 @@ class Order:
         self.pickup_time = None
         self.delivery_time = None
         self.id = order_id
+        self.row = None  # fila en OrderStore
 
     def get_click_to_door(self):
         #calcula el click to door en minutos, que es la diferencia entre delivery_time y placement_time
@@ -39,6 +52,9 @@ class Order:
         return None
 
 class Courier:
+    __slots__ = ('id', 'on_time', 'off_time', 'location', 'current_route', 'route_history',
+                 'earnings', 'orders_delivered', 'total_distance', 'shift_started', 'row')
+
     def __init__(self, courier_id, on_time, off_time, location):
         self.id = courier_id
         self.on_time = on_time
@@ -51,6 +67,7 @@ class Courier:
         self.orders_delivered = 0
         self.total_distance = 0.0
         self.shift_started = False  # Para controlar el cálculo del tiempo de turno
+        self.row = None  # fila en CourierStore
 
     def shift_duration_hours(self):
         #aqui se calcula la duracion del turno del repartidor en HORAS
@@ -75,126 +92,246 @@ class Courier:
 def run_simulation(orders, couriers, restaurants, simulation_end, start_time=None, results_path="results/simulation_results.csv", courier_results_path=None):
     if start_time is None:
         start_time = datetime(2025, 1, 1, 8, 0)
-    current_time = start_time  # punto de inicio de la simulación
+    # Dentro de la simulación el tiempo son microsegundos desde start_time
+    # (src/simtime.py); las fechas se restauran antes de escribir resultados.
+    clock = SimClock(start_time)
+    clock.convert(orders, couriers)
+    end_time = clock.sim(simulation_end)
+    try:
+        # columnas de órdenes y repartidores para KPIs y resultados (src/state_store.py)
+        order_store = OrderStore(orders)
+        courier_store = CourierStore(couriers)
+        # órdenes entregadas y resúmenes de repartidores se escriben conforme ocurren
+        sink = ResultsSink(results_path, courier_results_path, order_store, courier_store, clock)
+    except BaseException:
+        clock.restore(orders, couriers)
+        raise
+    current_time = 0  # punto de inicio de la simulación
     order_queue = deque(sorted(orders, key=lambda o: o.placement_time)) #se ordenan las ordenes por tiempo de colocación
     active_couriers = [] #se inicializa una lista que contendrá los repartidores activos
+    shifts = ShiftSchedule(couriers) # repartidores por on_time con cursor de activación
+    shift_ends = ShiftSchedule(couriers, 'off_time') # y por off_time, para el fin de turno
+    off_shift = set() # repartidores cuyo turno terminó
+    free_couriers = set() # repartidores activos sin ruta
+    pending = PendingOrders(restaurants) # órdenes 'ready' por restaurante, por ready_time
+    running = [] # heap de (completion_time, rango, repartidor) de las rutas en curso
     
     use_fcfs = os.environ.get('FCFS_POLICY') == '1'
-
-    delivered_orders = []
+    use_prefetch = os.environ.get('OSRM_EPOCH_PREFETCH', '1') == '1'
+    # SIM_ENGINE=events: motor de eventos discretos en lugar del paso fijo
+    use_events = os.environ.get('SIM_ENGINE', 'loop') == 'events'
+
+    # los bundles y precios guardados de otra simulación no sirven aquí
+    clear_bundle_cache()
+    clear_solver_state()
+
+    # FCFS: índice espacial de repartidores libres, actualizado cuando un
+    # repartidor se activa, termina una ruta, recibe una orden o sale de turno.
+    # El rango es su posición en active_couriers (desempate como el escaneo lineal).
+    free_index = None
+    courier_rank = {}
+    if use_fcfs:
+        free_index = CourierGrid(suggest_cell_size(
+            [location_xy(c.location) for c in couriers]
+            + [location_xy(r.location) for r in restaurants],
+            len(couriers),
+        ))
+
+    def mark_free(c, t):
+        if c.current_route is None and c.off_time > t:
+            free_couriers.add(c)
+            if free_index is not None:
+                free_index.insert(c, *location_xy(c.location), courier_rank[c])
 
     visualized_deliveries_count = 0
-
-    while current_time < simulation_end:
-        print(f"\n--- Simulation time: {current_time} ---")
-
-        for c in couriers:  #loop para revisar si un repartidor está disponible
-            if c.on_time <= current_time and c not in active_couriers:
-                active_couriers.append(c)
-                c.shift_started = True
-        
-        while order_queue and order_queue[0].placement_time <= current_time: #mientras aun haya ordenes en la cola y la orden en la posicion 0 sea menor o igual al tiempo actual
-            new_order = order_queue.popleft() #se saca la orden de la cola
-            new_order.status = 'ready' #se cambia el estado de la orden a lista
-            new_order.restaurant.orders.append(new_order) #se agrega la orden a la lista de ordenes del restaurante
-         
-        if (current_time.minute % 5) == 0: #cada que el tiempo actual sea multiplo de 5 minutos
-            print(f"[{current_time}] Running assignment logic...")
-            available_couriers = [c for c in active_couriers if not c.current_route and c.off_time > current_time] # se filtra la lista de repartidores activos para obtener los que no tienen rutas asignadas y que su tiempo de salida sea mayor al tiempo actual
-            
-            orders_ready = [o for rest in restaurants for o in rest.orders if o.status == "ready" and o.ready_time <= current_time + ASSIGNMENT_HORIZON] #se filtran las ordenes que esten listas segun el horizonte de asignación
-
-            if use_fcfs:
-                # Lógica FCFS: Asignar órdenes una por una al repartidor más cercano
-                for order in orders_ready:
-                    if order.status == 'ready':
-                        assign_order_to_nearest_courier(order, available_couriers, current_time)
-            else:
-                # Lógica de Rolling Horizon (la que ya existía)
-                couriers_available_hor = [c for c in available_couriers if c.off_time >= current_time + ASSIGNMENT_HORIZON] #se filtran los repartidores disponibles segun el horizonte de asignación
-                
-                target_bundle_size = compute_target_bundle_size(
-                    current_time,
-                    orders_ready,
-                    couriers_available_hor,
+    routes_to_draw = [] # los mapas se guardan al final, con las fechas ya restauradas
+
+    # ----------------------
+    # Manejadores compartidos por el ciclo de paso fijo y el motor de eventos
+    # ----------------------
+
+    def activate(c, t):
+        courier_rank[c] = len(active_couriers)
+        active_couriers.append(c)
+        c.shift_started = True
+        mark_free(c, t)
+
+    def deactivate(c, t):
+        free_couriers.discard(c)
+        if free_index is not None and c in free_index:
+            free_index.remove(c)
+        off_shift.add(c)
+        if c.current_route is None: # con ruta en curso, su resumen se escribe al terminarla
+            sink.retire(c)
+
+    def place(new_order, t):
+        new_order.status = 'ready' #se cambia el estado de la orden a lista
+        pending.add(new_order) #se agrega la orden a las pendientes del restaurante
+        order_store.set_status([new_order], READY)
+
+    def optimize(current_time):
+        """Época de optimización; retorna (repartidores que recibieron ruta, quedan órdenes esperando)."""
+        now = clock.wall(current_time)
+        if (now.minute % 5) != 0: #solo cada que el tiempo actual sea multiplo de 5 minutos
+            return [], len(pending) > 0
+        print(f"[{now}] Running assignment logic...")
+        # los repartidores que ya salieron de turno no vuelven a estar libres
+        for c in [c for c in free_couriers if c.off_time <= current_time]:
+            free_couriers.discard(c)
+        available_couriers = sorted(free_couriers, key=courier_rank.__getitem__) # repartidores activos sin ruta, en orden de activación
+
+        orders_ready = pending.ready_by(current_time + ASSIGNMENT_HORIZON_US) #se filtran las ordenes que esten listas segun el horizonte de asignación
+
+        if use_fcfs:
+            # Lógica FCFS: Asignar órdenes una por una al repartidor más cercano
+            for c in free_index:
+                if c.off_time <= current_time:
+                    free_index.remove(c)
+            candidates = list(free_index)
+            assign_orders_fcfs(orders_ready, free_index, current_time)
+        else:
+            # Lógica de Rolling Horizon (la que ya existía)
+            candidates = available_couriers
+            couriers_available_hor = [c for c in available_couriers if c.off_time >= current_time + ASSIGNMENT_HORIZON_US] #se filtran los repartidores disponibles segun el horizonte de asignación
+
+            target_bundle_size = compute_target_bundle_size(
+                current_time,
+                orders_ready,
+                couriers_available_hor,
+            )
+
+            # Prefetch de la matriz de tiempos de la época: todas las
+            # evaluaciones de bundling y scoring se leen de ella.
+            if use_prefetch and orders_ready:
+                epoch_locations = (
+                    [c.location for c in available_couriers]
+                    + [o.restaurant.location for o in orders_ready]
+                    + [o.dropoff_loc for o in orders_ready]
                 )
-
-                all_bundles = []
-                for rest in restaurants:
-                    rst_bundles = generate_bundles_for_restaurant(
-                        rest,
-                        current_time,
-                        target_bundle_size,
-                        len(couriers_available_hor),
-                    )
-                    if rst_bundles:
-                        all_bundles.extend(rst_bundles)
-
-                assign_bundles_to_couriers(available_couriers, all_bundles, current_time)
-            print(f"[{current_time}] Assignment logic finished.")
-
-        # actualizar progreso de rutas
-        for c in active_couriers:
-            if c.current_route and current_time >= c.current_route['completion_time']:
-                if c.current_route['commitment_type'] == 'final':
-                    for o in c.current_route['orders']:
-                        o.status = 'delivered'
-                        o.pickup_time = c.current_route['start_time']
-                        o.delivery_time = c.current_route['completion_time']
-                        c.orders_delivered += 1
-                        delivered_orders.append(o)
-                        print(f"Order {o.id} delivered.")
-                # actualizar ubicación al último punto de la ruta
-                if c.current_route['route']['legs']:
-                    last = c.current_route['route']['legs'][-1]['steps'][-1]['maneuver']['location']
-                    from src.getrouteOSMR import as_latlon
-                    c.location = as_latlon(last)
-                    c.total_distance += c.current_route['route']['distance'] / 1000 # convert to km
-                # almacenar la ruta completada antes de limpiarla y guardar mapa
-                c.route_history.append(c.current_route)
-                if visualized_deliveries_count < 10 and c.current_route['commitment_type'] == 'final':
-                    visualized_deliveries_count += 1
-                    filename = f"delivery_{visualized_deliveries_count}.html"
-                    save_route_map(c.current_route, filename)
-                c.current_route = None
-
-        current_time += OPTIMIZATION_FREQUENCY
+                set_epoch_matrix(build_travel_matrix(epoch_locations))
+
+            # Restaurantes independientes: en paralelo con BUNDLING_WORKERS > 1
+            all_bundles = generate_all_bundles(
+                pending.restaurants(),
+                current_time,
+                target_bundle_size,
+                len(couriers_available_hor),
+            )
+
+            assign_bundles_to_couriers(available_couriers, all_bundles, current_time)
+            set_epoch_matrix(None)
+        print(f"[{now}] Assignment logic finished.")
+        busy = [c for c in candidates if c.current_route is not None]
+        for c in busy:
+            free_couriers.discard(c)
+            if c.current_route['commitment_type'] == 'final':
+                # con compromiso final las órdenes salen de las pendientes (como
+                # en FCFS); si no, se volverían a agrupar y se entregarían dos veces
+                for o in c.current_route['orders']:
+                    o.status = 'assigned'
+                order_store.set_status(c.current_route['orders'], ASSIGNED)
+        pending.prune()
+        return busy, len(pending) > 0
+
+    def complete(c, current_time):
+        nonlocal visualized_deliveries_count
+        if c.current_route['commitment_type'] == 'final':
+            for o in c.current_route['orders']:
+                o.status = 'delivered'
+                o.pickup_time = c.current_route['start_time']
+                o.delivery_time = c.current_route['completion_time']
+                c.orders_delivered += 1
+                print(f"Order {o.id} delivered.")
+            order_store.deliver(c.current_route['orders'], c,
+                                c.current_route['start_time'], c.current_route['completion_time'])
+            sink.deliver(c.current_route['orders'])
+        # actualizar ubicación al último punto de la ruta
+        c.location = c.current_route['end_location']
+        c.total_distance += c.current_route['route']['distance'] / 1000 # convert to km
+        courier_store.complete_route(
+            c,
+            len(c.current_route['orders']) if c.current_route['commitment_type'] == 'final' else 0,
+            c.current_route['route']['distance'] / 1000,
+        )
+        # almacenar la ruta completada antes de limpiarla y guardar mapa
+        c.route_history.append(c.current_route)
+        # (las rutas planas no tienen geometría que dibujar)
+        if (visualized_deliveries_count < 10 and c.current_route['commitment_type'] == 'final'
+                and c.current_route['route'].get('geometry')):
+            visualized_deliveries_count += 1
+            routes_to_draw.append(c.current_route)
+        c.current_route = None
+        mark_free(c, current_time)
+        if c in off_shift:
+            sink.retire(c)
+
+    try:
+        if use_events:
+            # cada evento en su instante; SIM_EVENT_TIMES=tick los mueve a la
+            # malla del paso fijo y reproduce sus KPIs (ver src/event_engine.py)
+            simulate_events(
+                couriers, orders, current_time, end_time, OPTIMIZATION_FREQUENCY_US,
+                on_shift=activate, off_shift=deactivate, placed=place,
+                epoch=optimize, completed=complete,
+                exact=os.environ.get('SIM_EVENT_TIMES', 'exact') != 'tick',
+            )
+        else:
+            while current_time < end_time:
+                print(f"\n--- Simulation time: {clock.wall(current_time)} ---")
+
+                for c in shifts.due(current_time):  #repartidores cuyo turno ya empezó
+                    activate(c, current_time)
+                for c in shift_ends.due(current_time):  #repartidores cuyo turno ya terminó
+                    deactivate(c, current_time)
+
+                while order_queue and order_queue[0].placement_time <= current_time: #mientras aun haya ordenes en la cola y la orden en la posicion 0 sea menor o igual al tiempo actual
+                    place(order_queue.popleft(), current_time) #se saca la orden de la cola
+
+                busy, _ = optimize(current_time)
+                for c in busy:
+                    heapq.heappush(running, (c.current_route['completion_time'], courier_rank[c], c))
+
+                # actualizar progreso de rutas (en orden de activación, como el escaneo)
+                done = []
+                while running and running[0][0] <= current_time:
+                    done.append(heapq.heappop(running))
+                for _, _, c in sorted(done, key=lambda entry: entry[1]):
+                    complete(c, current_time)
+
+                current_time += OPTIMIZATION_FREQUENCY_US
+
+        # Resultados pendientes: órdenes no entregadas y repartidores aún en
+        # turno.  Se cierra antes de dibujar mapas para que un error ahí no
+        # deje el Parquet truncado.
+        sink.close()
+    except BaseException:
+        # lo ya escrito queda en disco aunque la corrida falle
+        sink.close(finished=False)
+        raise
+    finally:
+        # de vuelta a fechas, también si la corrida falla o se interrumpe
+        clock.restore(orders, couriers)
+
+    for i, route in enumerate(routes_to_draw, start=1):
+        save_route_map(route, f"delivery_{i}.html")
 
     # calcular compensación final al terminar la simulación
-    for c in couriers:
-        c.final_compensation()
-
-    # Guardar resumen de repartidores
-    courier_summary_df = pd.DataFrame.from_records([
-        {
-            'courier_id': c.id,
-            'orders_delivered': c.orders_delivered,
-            'total_distance_km': c.total_distance,
-            'shift_duration_hours': c.shift_duration_hours(),
-        } for c in couriers
-    ])
-    if courier_results_path:
-        courier_summary_df.to_csv(courier_results_path, index=False)
+    for c, earnings in zip(couriers, courier_store.final_compensation()):
+        c.earnings = float(earnings)
 
     # imprimir métricas simples
     for c in couriers:
         print(f"Courier {c.id}: orders={c.orders_delivered}, earnings=${c.earnings:.2f}, distance={c.total_distance:.2f}km")
 
-    # Guardar resultados detallados
-    all_orders_df = pd.DataFrame.from_records([
-        {
-            'order_id': o.id,
-            'status': o.status,
-            'placement_time': o.placement_time,
-            'ready_time': o.ready_time,
-            'pickup_time': o.pickup_time,
-            'delivery_time': o.delivery_time,
-            'click_to_door': o.get_click_to_door(),
-            'ready_to_pickup': o.get_ready_to_pickup(),
-            'bundle_size': len(c.current_route['orders']) if c.current_route else 1
-        } for o in orders
-    ])
-    all_orders_df.to_csv(results_path, index=False)
+    # métricas de ruteo (caches, llamadas HTTP y latencias)
+    dump_routing_stats()
+    if not use_fcfs:
+        print("Bundle cache: " + " ".join(f"{k}={v}" for k, v in bundle_cache_info().items()))
+        print("Assignment solvers: " + " ".join(f"{k}={v}" for k, v in solver_info().items()))
+    print("Orders: " + " ".join(
+        f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in order_store.kpis().items()
+    ))
+    return order_store, courier_store
 
 # ======================
 # Visualización de la ruta
@@ -0,0 +1,185 @@
+"""Local HTTP stand-in for the OSRM ``/route`` and ``/table`` services.
+
+Answers with great-circle distances at a constant speed, so it needs no map
+data, and can inject latency, server errors and HTTP 429 rate limiting.  It
+is meant for reproducible client-side benchmarks and tests, e.g.::
+
+    python -m src.osrm_standin --port 5000 --latency-ms 5 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import polyline
+
+from src.getrouteOSMR import haversine_distance
+
+
+class OSRMStandin:
+    """Threaded stand-in server; use as a context manager or start()/stop().
+
+    Parameters:
+      - meters_per_minute: constant travel speed used for durations.
+      - latency_ms / jitter_ms: delay added to every response (uniform jitter).
+      - error_rate: probability of answering HTTP 500.
+      - rate_limit_rate: probability of answering HTTP 429.
+      - seed: seed for the injected faults, for reproducible runs.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, meters_per_minute=320.0,
+                 latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.meters_per_minute = float(meters_per_minute)
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"route": 0, "table": 0, "errors": 0, "rate_limited": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+
+    def _draw_fault(self):
+        """Return the injected delay (seconds) and status for one request."""
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(0.0, self.jitter_ms)
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return delay / 1000.0, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay / 1000.0, 500
+        return delay / 1000.0, 200
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def route_response(self, points, query):
+        legs = []
+        total = 0.0
+        for a, b in zip(points[:-1], points[1:]):
+            dist = haversine_distance(a, b)
+            total += dist
+            step = {"maneuver": {"location": [b[1], b[0]]}}
+            legs.append({"distance": dist, "duration": self._duration(dist),
+                         "steps": [step] if query.get("steps") == ["true"] else []})
+        route = {"distance": total, "duration": self._duration(total), "legs": legs}
+        if query.get("overview", ["simplified"]) != ["false"]:
+            route["geometry"] = polyline.encode(points)
+        return {"code": "Ok", "routes": [route],
+                "waypoints": [{"location": [lon, lat]} for lat, lon in points]}
+
+    def table_response(self, points, query):
+        sources = _index_list(query, "sources", len(points))
+        destinations = _index_list(query, "destinations", len(points))
+        distances = [[haversine_distance(points[i], points[j]) for j in destinations] for i in sources]
+        return {"code": "Ok",
+                "durations": [[self._duration(d) for d in row] for row in distances],
+                "distances": distances}
+
+    def _duration(self, meters):
+        return meters / self.meters_per_minute * 60.0
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send headers and body in one segment; otherwise Nagle plus
+            # delayed ACKs add ~40 ms to every keep-alive request.
+            disable_nagle_algorithm = True
+            wbufsize = -1
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                parts = url.path.strip("/").split("/")
+                delay, status = standin._draw_fault()
+                if delay:
+                    time.sleep(delay)
+                if status != 200:
+                    standin._count("rate_limited" if status == 429 else "errors")
+                    code = "TooManyRequests" if status == 429 else "InternalError"
+                    return self._reply(status, {"code": code, "message": "injected"})
+                if len(parts) != 4 or parts[2] != "driving" or parts[0] not in ("route", "table"):
+                    return self._reply(400, {"code": "InvalidUrl", "message": url.path})
+                try:
+                    points = [
+                        (float(lat), float(lon))
+                        for lon, lat in (c.split(",") for c in parts[3].split(";"))
+                    ]
+                except ValueError:
+                    return self._reply(400, {"code": "InvalidQuery", "message": parts[3]})
+                query = parse_qs(url.query)
+                standin._count(parts[0])
+                if parts[0] == "route":
+                    payload = standin.route_response(points, query)
+                else:
+                    payload = standin.table_response(points, query)
+                self._reply(200, payload)
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _index_list(query, name, n):
+    if name not in query or query[name] == ["all"]:
+        return list(range(n))
+    return [int(k) for k in query[name][0].split(";")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OSRM stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--meters-per-minute", type=float, default=320.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = OSRMStandin(args.host, args.port, args.meters_per_minute, args.latency_ms,
+                         args.jitter_ms, args.error_rate, args.rate_limit_rate, args.seed)
+    print(f"OSRM stand-in listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+from src.route_summary import RouteSummary
+from src.travel_matrix import TravelMatrix
+
+# ======================
+# Tiempos de viaje planos (instancias MDRPLib)
+# ======================
+
+
+class PlanarNetwork:
+    """Travel times between planar locations of an MDRPLib instance.
+
+    Locations are identified by the integer position of their (x, y)
+    coordinates, in meters.  Travel times follow ``traveltime()`` from the
+    official evaluator (``compute_performance_summary.py``): the straight line
+    distance divided by ``meters_per_minute`` and rounded up to whole minutes.
+    The full minute matrix is precomputed as ``int16`` so a 4k-location
+    instance needs ~30 MB; distances are only needed for committed routes and
+    are computed on demand from the coordinates.
+
+    Exposes the same query interface as :class:`TravelMatrix`, so it can be
+    installed as the routing backend with ``set_planar_network``.
+    """
+
+    def __init__(self, xy, meters_per_minute):
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.meters_per_minute = float(meters_per_minute)
+        self._xs = self._ys = None
+        n = len(self.xy)
+        self.minutes = np.empty((n, n), dtype=np.int16)
+        # Fill by row blocks to keep the float temporaries small.
+        for start in range(0, n, 512):
+            rows = self.xy[start:start + 512]
+            dist = np.sqrt(
+                (self.xy[None, :, 0] - rows[:, None, 0]) ** 2
+                + (self.xy[None, :, 1] - rows[:, None, 1]) ** 2
+            )
+            self.minutes[start:start + 512] = np.ceil(dist / self.meters_per_minute)
+
+    def __len__(self):
+        return len(self.xy)
+
+    def covers(self, points):
+        n = len(self.xy)
+        return all(isinstance(p, (int, np.integer)) and 0 <= p < n for p in points)
+
+    def travel_time(self, origin, destination):
+        """Travel time in minutes between two location ids."""
+        return int(self.minutes[origin, destination])
+
+    def distance(self, origin, destination):
+        xs, ys = self._coords()
+        return math.sqrt((xs[destination] - xs[origin]) ** 2 + (ys[destination] - ys[origin]) ** 2)
+
+    def _coords(self):
+        # Plain lists: scalar indexing into them is much cheaper than into
+        # the NumPy array on the per-leg hot path.
+        if self._xs is None:
+            self._xs = self.xy[:, 0].tolist()
+            self._ys = self.xy[:, 1].tolist()
+        return self._xs, self._ys
+
+    def route_summary(self, start_coords, waypoints):
+        """Return a :class:`RouteSummary` (seconds, meters) for a route."""
+        xs, ys = self._coords()
+        minutes = self.minutes.item
+        duration = 0.0
+        distance = 0.0
+        a = start_coords
+        try:
+            for b in waypoints:
+                duration += minutes(a, b) * 60.0
+                distance += math.sqrt((xs[b] - xs[a]) ** 2 + (ys[b] - ys[a]) ** 2)
+                a = b
+        except (IndexError, TypeError):
+            # not a location id of this network
+            return None
+        return RouteSummary(duration, distance, start_coords, waypoints)
+
+    def submatrix(self, points):
+        """Return a :class:`TravelMatrix` over ``points`` (in that order)."""
+        idx = np.asarray(points, dtype=np.intp)
+        sub = self.xy[idx]
+        distances = np.sqrt(
+            (sub[:, None, 0] - sub[None, :, 0]) ** 2 + (sub[:, None, 1] - sub[None, :, 1]) ** 2
+        )
+        durations = self.minutes[np.ix_(idx, idx)].astype(float) * 60.0
+        return TravelMatrix(points, durations, distances)
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+
+from src.state_store import DELIVERED
+
+# ======================
+# Escritura incremental de resultados
+# ======================
+#
+# Las órdenes entregadas se escriben mientras la simulación avanza y el
+# resumen de cada repartidor cuando termina su turno (sin ruta pendiente),
+# en lotes de RESULTS_BATCH_SIZE filas.  Cada lote se agrega al CSV o es un
+# row group del Parquet (según la extensión del archivo), así la memoria no
+# crece con el día simulado y lo ya escrito sobrevive si la corrida falla.
+# Al cerrar se escriben las órdenes no entregadas y los repartidores que
+# seguían en turno.
+
+
+def _batch_size():
+    return int(os.environ.get('RESULTS_BATCH_SIZE', '1000'))
+
+
+class _TableWriter:
+    """Appends DataFrames to ``path`` as CSV or, for ``.parquet``, row groups."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        if self.parquet:
+            # pyarrow es opcional: sólo hace falta para resultados en Parquet
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError(f"Writing {path} requires pyarrow (pip install pyarrow); "
+                                  "use a .csv path otherwise") from e
+        self._writer = None
+        self.started = False
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self.started else 'w', header=not self.started, index=False)
+        self.started = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ResultsSink:
+    """Streams per-order results and courier summaries of one run.
+
+    Rows come from the run's ``OrderStore`` and ``CourierStore``: the sink
+    only keeps the row numbers waiting for the next batch.
+    """
+
+    def __init__(self, results_path, courier_results_path, order_store, courier_store, clock,
+                 batch_size=None):
+        self.order_store = order_store
+        self.courier_store = courier_store
+        self.clock = clock
+        self.batch_size = batch_size or _batch_size()
+        self._orders = _TableWriter(results_path) if results_path else None
+        self._couriers = _TableWriter(courier_results_path) if courier_results_path else None
+        self._order_rows = []
+        self._courier_rows = []
+        self._retired = set()
+        self.closed = False
+
+    def deliver(self, orders):
+        """Orders that were just delivered."""
+        self._order_rows += [o.row for o in orders]
+        if len(self._order_rows) >= self.batch_size:
+            self.flush_orders()
+
+    def retire(self, courier):
+        """Courier whose shift ended and has no route left: its summary is final."""
+        if courier.row in self._retired:
+            return
+        self._retired.add(courier.row)
+        self._courier_rows.append(courier.row)
+        if len(self._courier_rows) >= self.batch_size:
+            self.flush_couriers()
+
+    def flush_orders(self):
+        if self._order_rows and self._orders is not None:
+            self._orders.write(self.order_store.frame(self.clock, self._order_rows, self.courier_store.ids))
+        self._order_rows = []
+
+    def flush_couriers(self):
+        if self._courier_rows and self._couriers is not None:
+            self._couriers.write(self.courier_store.frame(self._courier_rows))
+        self._courier_rows = []
+
+    def close(self, finished=True):
+        """Write what is pending and close the files.
+
+        With ``finished`` the orders that were not delivered and the
+        couriers still on shift are written too; otherwise (the run failed)
+        only the rows already collected.  Only the first call does anything;
+        the files are closed even if writing the last rows fails.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if finished:
+                self._order_rows += np.flatnonzero(self.order_store.status != DELIVERED).tolist()
+                on_shift = np.ones(len(self.courier_store), dtype=bool)
+                on_shift[list(self._retired)] = False
+                self._courier_rows += np.flatnonzero(on_shift).tolist()
+                self._retired.update(self._courier_rows)
+            self.flush_orders()
+            self.flush_couriers()
+            # sin filas el archivo queda sólo con encabezados
+            if self._orders is not None and not self._orders.started:
+                self._orders.write(self.order_store.frame(self.clock, [], self.courier_store.ids))
+            if self._couriers is not None and not self._couriers.started:
+                self._couriers.write(self.courier_store.frame([]))
+        finally:
+            for writer in (self._orders, self._couriers):
+                if writer is not None:
+                    writer.close()
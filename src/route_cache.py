@@ -0,0 +1,288 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ======================
+# Cache persistente de rutas
+# ======================
+
+# Decimal places kept when normalizing coordinates into a cache key
+# (6 decimals ~ 0.1 m, well below OSRM snapping tolerance).
+KEY_PRECISION = 6
+
+# Keys per statement in batched lookups (SQLite caps bound parameters at 999
+# on older builds).
+SQL_BATCH = 900
+
+
+def route_key(points):
+    """Return a normalized string key for a sequence of (lat, lon) points."""
+    return ";".join(
+        f"{float(lat):.{KEY_PRECISION}f},{float(lon):.{KEY_PRECISION}f}"
+        for lat, lon in points
+    )
+
+
+class RouteStore:
+    """SQLite-backed key/value store for routing responses.
+
+    The store can be shared by several runs and by concurrent worker
+    processes: the database runs in WAL mode so readers never block writers
+    and every writer waits for the lock instead of failing.  When the number
+    of entries exceeds ``max_entries`` the least recently used rows are
+    evicted.  With ``read_only=True`` the file is opened in SQLite read-only
+    mode and nothing is ever written (not even access times).
+    """
+
+    def __init__(self, path, max_entries=200000, read_only=False, timeout=30.0):
+        self.path = path
+        self.max_entries = int(max_entries) if max_entries else 0
+        self.read_only = read_only
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        # sqlite connections can be used neither from another thread nor
+        # across a fork, so each thread of each process opens its own.
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        if self.read_only:
+            uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout)
+        else:
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS routes_last_used ON routes(last_used)")
+            conn.commit()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return the stored value for ``key`` or ``None``."""
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM routes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if not self.read_only:
+            conn.execute("UPDATE routes SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        """Return ``{key: value}`` for the ``keys`` found, in one transaction."""
+        keys = list(keys)
+        conn = self._connect()
+        found = {}
+        for i in range(0, len(keys), SQL_BATCH):
+            chunk = keys[i:i + SQL_BATCH]
+            rows = conn.execute(
+                f"SELECT key, value FROM routes WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        if found and not self.read_only:
+            now = time.time()
+            conn.executemany("UPDATE routes SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+        return found
+
+    def put(self, key, value):
+        """Store ``value`` (any JSON-serializable object) under ``key``."""
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        """Store every ``(key, value)`` of ``items`` in one transaction."""
+        if self.read_only:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now) for key, value in items]
+        if not rows:
+            return
+        conn = self._connect()
+        conn.executemany("INSERT OR REPLACE INTO routes (key, value, last_used) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        before = self._writes
+        self._writes += len(rows)
+        # Checking the size on every insert would cost a table scan, so only
+        # do it every 100 writes.
+        if self.max_entries and self._writes // 100 != before // 100:
+            self.evict()
+
+    def evict(self):
+        """Trim the store to 90% of ``max_entries`` dropping the oldest rows."""
+        if self.read_only or not self.max_entries:
+            return 0
+        conn = self._connect()
+        (count,) = conn.execute("SELECT COUNT(*) FROM routes").fetchone()
+        if count <= self.max_entries:
+            return 0
+        excess = count - int(self.max_entries * 0.9)
+        conn.execute(
+            "DELETE FROM routes WHERE key IN ("
+            " SELECT key FROM routes ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        conn.commit()
+        return excess
+
+    def __len__(self):
+        conn = self._connect()
+        (count,) = conn.execute("SELECT COUNT(*) FROM routes").fetchone()
+        return count
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+
+# ======================
+# Cache LRU en memoria
+# ======================
+
+
+class LRUCache:
+    """Bounded in-memory mapping that drops the least recently used entry.
+
+    Supports the subset of the dict interface used by the routing code
+    (``get``, ``in``, ``[]``, ``len``, ``clear``).  ``capacity <= 0`` means
+    unbounded.  Every eviction is reported to ``on_evict`` if given.
+    """
+
+    def __init__(self, capacity, on_evict=None):
+        self.capacity = int(capacity)
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if self.capacity > 0 and len(data) > self.capacity:
+            data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+# ======================
+# Instrumentación
+# ======================
+
+# Upper bounds (milliseconds) of the latency histogram buckets.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class RoutingStats:
+    """Thread-safe counters and per-call latency histograms for routing."""
+
+    COUNTERS = (
+        "route_hits", "route_misses", "route_evictions",
+        "leg_hits", "leg_misses", "leg_evictions",
+        "store_hits", "http_requests", "http_errors", "fallbacks",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(self.COUNTERS, 0)
+            self.latency = {}
+
+    def incr(self, name, amount=1):
+        # Worker threads report here too
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_latency(self, kind, seconds):
+        """Add one call of type ``kind`` (e.g. ``'route'``) that took ``seconds``."""
+        ms = seconds * 1000.0
+        with self._lock:
+            hist = self.latency.setdefault(
+                kind, {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                       "buckets": [0] * len(LATENCY_BUCKETS_MS)}
+            )
+            hist["count"] += 1
+            hist["total_ms"] += ms
+            hist["max_ms"] = max(hist["max_ms"], ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= bound:
+                    hist["buckets"][i] += 1
+                    break
+
+    def snapshot(self):
+        """Return a deep copy of counters and histograms."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "latency": {
+                    kind: dict(hist, buckets=list(hist["buckets"]))
+                    for kind, hist in self.latency.items()
+                },
+            }
+
+    def report(self):
+        """Return a human readable summary."""
+        snap = self.snapshot()
+        c = snap["counters"]
+        lines = ["Routing stats:"]
+        for prefix in ("route", "leg"):
+            lookups = c[f"{prefix}_hits"] + c[f"{prefix}_misses"]
+            rate = c[f"{prefix}_hits"] / lookups if lookups else 0.0
+            lines.append(
+                f"  {prefix} cache: hits={c[prefix + '_hits']} misses={c[prefix + '_misses']} "
+                f"evictions={c[prefix + '_evictions']} hit_rate={rate:.3f}"
+            )
+        lines.append(
+            f"  store_hits={c['store_hits']} http_requests={c['http_requests']} "
+            f"http_errors={c['http_errors']} fallbacks={c['fallbacks']}"
+        )
+        for kind, hist in sorted(snap["latency"].items()):
+            mean = hist["total_ms"] / hist["count"] if hist["count"] else 0.0
+            buckets = " ".join(
+                f"<={bound:g}ms:{n}" for bound, n in zip(LATENCY_BUCKETS_MS, hist["buckets"]) if n
+            )
+            lines.append(
+                f"  {kind} latency: calls={hist['count']} mean={mean:.1f}ms "
+                f"max={hist['max_ms']:.1f}ms [{buckets}]"
+            )
+        return "\n".join(lines)
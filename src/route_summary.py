@@ -0,0 +1,55 @@
+# ======================
+# Resumen compacto de ruta
+# ======================
+
+
+class RouteSummary:
+    """Duration (seconds) and distance (meters) of a route, nothing else.
+
+    This is what bundling, scoring and commitment work with.  Geometry and
+    steps are only needed for routes that end up drawn by ``save_route_map``,
+    so they are fetched (or encoded, for the Euclidean backend) the first
+    time ``geometry`` or ``legs`` is read and kept afterwards.
+
+    Supports dict-style access (``route['duration']``) so it can stand in for
+    the OSRM route dicts used elsewhere.
+    """
+
+    __slots__ = ("duration", "distance", "start", "waypoints", "_details")
+
+    def __init__(self, duration, distance, start=None, waypoints=None):
+        self.duration = duration
+        self.distance = distance
+        self.start = start
+        self.waypoints = waypoints
+        self._details = None
+
+    def details(self):
+        """Return the full route dict, fetching it on first use."""
+        if self._details is None and self.start is not None:
+            from src.getrouteOSMR import get_route_details
+            self._details = get_route_details(self.start, list(self.waypoints)) or {}
+        return self._details or {}
+
+    @property
+    def geometry(self):
+        return self.details().get("geometry")
+
+    @property
+    def legs(self):
+        return self.details().get("legs", [])
+
+    def __getitem__(self, key):
+        if key in ("duration", "distance", "geometry", "legs"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"RouteSummary(duration={self.duration!r}, distance={self.distance!r})"
@@ -0,0 +1,92 @@
+import bisect
+import itertools
+
+# ======================
+# Índices del estado de la simulación
+# ======================
+#
+# Se mantienen de forma incremental para que el costo de cada paso dependa
+# sólo del estado vivo (repartidores por activar, órdenes pendientes) y no de
+# todo lo que ha pasado en el día.
+
+
+class ShiftSchedule:
+    """Couriers sorted by ``on_time`` (or ``field``) with a cursor.
+
+    ``due(t)`` returns the couriers whose shift started (ended, with
+    ``field='off_time'``) since the last call, in their original list order
+    (the order the linear scan activated them).
+    """
+
+    def __init__(self, couriers, field='on_time'):
+        self._couriers = list(couriers)
+        self._times = [getattr(c, field) for c in self._couriers]
+        self._by_time = sorted(range(len(self._couriers)), key=self._times.__getitem__)
+        self._cursor = 0
+
+    def due(self, t):
+        start = self._cursor
+        while self._cursor < len(self._by_time) and self._times[self._by_time[self._cursor]] <= t:
+            self._cursor += 1
+        return [self._couriers[i] for i in sorted(self._by_time[start:self._cursor])]
+
+
+class PendingOrders:
+    """Pending ('ready') orders of each restaurant, sorted by ``ready_time``.
+
+    ``restaurant.orders`` holds the restaurant's pending orders ordered by
+    (ready_time, arrival); orders that changed status are dropped by
+    ``prune``, so delivered orders are never scanned again.  Restaurants
+    without pending orders are not visited.
+    """
+
+    def __init__(self, restaurants):
+        self._rank = {r: i for i, r in enumerate(restaurants)}
+        self._keys = {}  # restaurante -> [(ready_time, llegada)] alineado con restaurant.orders
+        self._arrival = {}
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return sum(len(keys) for keys in self._keys.values())
+
+    def add(self, order):
+        rest = order.restaurant
+        self._arrival[order] = next(self._seq)
+        key = (order.ready_time, self._arrival[order])
+        keys = self._keys.setdefault(rest, [])
+        pos = bisect.bisect(keys, key)
+        keys.insert(pos, key)
+        rest.orders.insert(pos, order)
+
+    def prune(self):
+        """Drop the orders that are no longer 'ready'."""
+        for rest in list(self._keys):
+            keep = [i for i, o in enumerate(rest.orders) if o.status == 'ready']
+            if len(keep) == len(rest.orders):
+                continue
+            for o in rest.orders:
+                if o.status != 'ready':
+                    self._arrival.pop(o, None)
+            rest.orders[:] = [rest.orders[i] for i in keep]
+            if keep:
+                self._keys[rest] = [self._keys[rest][i] for i in keep]
+            else:
+                del self._keys[rest]
+
+    def restaurants(self):
+        """Restaurants with pending orders, in their original order."""
+        return sorted(self._keys, key=self._rank.__getitem__)
+
+    def ready_by(self, limit):
+        """Pending orders with ``ready_time <= limit``.
+
+        Restaurant by restaurant and, within each, in arrival order (the
+        order they were appended in), as a scan of ``restaurant.orders``
+        used to return them.
+        """
+        ready = []
+        for rest in self.restaurants():
+            keys = self._keys[rest]
+            n = bisect.bisect_right(keys, (limit, float('inf')))
+            ready += sorted(rest.orders[:n], key=self._arrival.__getitem__)
+        return ready
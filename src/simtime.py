@@ -0,0 +1,106 @@
+import math
+from datetime import timedelta
+
+import numpy as np
+
+# ======================
+# Tiempo de simulación
+# ======================
+#
+# Dentro de la simulación los instantes son enteros: microsegundos desde
+# start_time.  datetime sólo se usa en las fronteras: al recibir las órdenes
+# y repartidores de los loaders y al escribir resultados (SimClock).
+#
+# Se usan microsegundos enteros y no segundos flotantes porque es la
+# resolución de timedelta: las conversiones de abajo redondean igual que
+# timedelta(minutes=...) / timedelta(seconds=...), así que cada comparación
+# y cada KPI da lo mismo que con aritmética de datetime.
+
+US_PER_SECOND = 1_000_000
+US_PER_MINUTE = 60 * US_PER_SECOND
+
+
+def duration_us(delta):
+    """Microseconds of a ``timedelta``."""
+    return delta // timedelta(microseconds=1)
+
+
+def _to_us(value, unit):
+    value = float(value)
+    whole = math.trunc(value)
+    return whole * unit + round((value - whole) * unit)
+
+
+def seconds_to_us(seconds):
+    """Microseconds of ``timedelta(seconds=s)``, rounded as ``timedelta`` does."""
+    return _to_us(seconds, US_PER_SECOND)
+
+
+def minutes_to_us(minutes):
+    """Microseconds of ``timedelta(minutes=m)``.
+
+    Integer part exact, fractional part rounded half to even.  Accepts a
+    scalar (returns ``int``) or an array (returns ``int64``), so the batched
+    score compares the same instants as ``calculate_bundle_score``.
+    """
+    if np.ndim(minutes) == 0:
+        return _to_us(minutes, US_PER_MINUTE)
+    minutes = np.asarray(minutes, dtype=float)
+    whole = np.trunc(minutes)
+    return (whole * US_PER_MINUTE + np.rint((minutes - whole) * US_PER_MINUTE)).astype(np.int64)
+
+
+def us_to_minutes(us):
+    """Minutes of a duration in microseconds (as ``timedelta.total_seconds() / 60``)."""
+    return us / US_PER_SECOND / 60.0
+
+
+class SimClock:
+    """Conversion between ``datetime`` and simulation time.
+
+    ``sim(dt)`` gives the microseconds from ``origin`` and ``wall(t)`` the
+    ``datetime`` back; both are exact.  ``convert`` and ``restore`` apply
+    them to the times of orders, couriers and their routes in place.
+    """
+
+    ORDER_TIMES = ('placement_time', 'ready_time', 'pickup_time', 'delivery_time')
+    COURIER_TIMES = ('on_time', 'off_time')
+    ROUTE_TIMES = ('start_time', 'completion_time')
+
+    def __init__(self, origin):
+        self.origin = origin
+
+    def sim(self, dt):
+        return duration_us(dt - self.origin)
+
+    def wall(self, t):
+        return self.origin + timedelta(microseconds=int(t))
+
+    def wall_array(self, values, missing):
+        """``datetime64[us]`` array of ``values`` (NaT where ``missing``)."""
+        values = np.asarray(values, dtype=np.int64)
+        out = np.datetime64(self.origin, 'us') + values.astype('timedelta64[us]')
+        out[values == missing] = np.datetime64('NaT')
+        return out
+
+    def _apply(self, convert, orders, couriers):
+        for o in orders:
+            for name in self.ORDER_TIMES:
+                value = getattr(o, name)
+                if value is not None:
+                    setattr(o, name, convert(value))
+        for c in couriers:
+            for name in self.COURIER_TIMES:
+                setattr(c, name, convert(getattr(c, name)))
+            routes = c.route_history + ([c.current_route] if c.current_route else [])
+            for route in routes:
+                for name in self.ROUTE_TIMES:
+                    route[name] = convert(route[name])
+
+    def convert(self, orders=(), couriers=()):
+        """``datetime`` -> simulation time on orders and couriers."""
+        self._apply(self.sim, orders, couriers)
+
+    def restore(self, orders=(), couriers=()):
+        """Simulation time -> ``datetime`` on orders and couriers."""
+        self._apply(self.wall, orders, couriers)
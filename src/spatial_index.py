@@ -0,0 +1,108 @@
+import math
+
+# ======================
+# Índice espacial de repartidores libres
+# ======================
+
+
+def suggest_cell_size(points, expected_items):
+    """Cell size giving ~1 item per cell for ``expected_items`` spread over ``points``."""
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    if not xs:
+        return 1.0
+    extent = max(max(xs) - min(xs), max(ys) - min(ys))
+    if extent <= 0:
+        return 1.0
+    return extent / max(1.0, math.sqrt(expected_items))
+
+
+class CourierGrid:
+    """Uniform grid over the positions of free couriers.
+
+    Items are inserted with their (x, y) position and a ``rank``; ``nearest``
+    returns the item with the smallest straight-line distance, breaking ties
+    by the lowest rank, which reproduces a linear scan over the items in rank
+    order that keeps the first strict minimum.  Insertions and removals are
+    O(1) and a nearest query only visits the cells around the query point,
+    so couriers can be added and dropped as they become free or busy.
+
+    A grid is used instead of a KD-tree because the set changes after every
+    assignment and the tree would have to be rebuilt.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._where = {}
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, item, x, y, rank):
+        if item in self._where:
+            self.remove(item)
+        cell = self._cell(x, y)
+        self._cells.setdefault(cell, {})[item] = (x, y, rank)
+        self._where[item] = cell
+
+    def remove(self, item):
+        cell = self._where.pop(item, None)
+        if cell is None:
+            return False
+        bucket = self._cells[cell]
+        del bucket[item]
+        if not bucket:
+            del self._cells[cell]
+        return True
+
+    def __contains__(self, item):
+        return item in self._where
+
+    def __len__(self):
+        return len(self._where)
+
+    def __iter__(self):
+        return iter(list(self._where))
+
+    def nearest(self, x, y):
+        """Return the nearest item to (x, y), or ``None`` if the grid is empty."""
+        if not self._where:
+            return None
+        ci, cj = self._cell(x, y)
+        cells = self._cells
+        best = None
+        best_key = (float('inf'), float('inf'))
+
+        def scan(bucket):
+            nonlocal best, best_key
+            for item, (ix, iy, rank) in bucket.items():
+                key = (math.sqrt((ix - x) ** 2 + (iy - y) ** 2), rank)
+                if key < best_key:
+                    best, best_key = item, key
+
+        r = 0
+        while True:
+            # Every cell of ring r is farther than (r - 1) * cell_size, so once
+            # that bound passes the best distance no cell left can win or tie.
+            if best is not None and (r - 1) * self.cell_size > best_key[0]:
+                return best
+            if 8 * r > len(cells):
+                # The ring has more cells than the grid has occupied ones:
+                # finish with a scan over the occupied cells not yet visited.
+                for (i, j), bucket in cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= r:
+                        scan(bucket)
+                return best
+            if r == 0:
+                ring = [(ci, cj)]
+            else:
+                ring = [(ci + d, cj - r) for d in range(-r, r + 1)]
+                ring += [(ci + d, cj + r) for d in range(-r, r + 1)]
+                ring += [(ci - r, cj + d) for d in range(-r + 1, r)]
+                ring += [(ci + r, cj + d) for d in range(-r + 1, r)]
+            for cell in ring:
+                bucket = cells.get(cell)
+                if bucket:
+                    scan(bucket)
+            r += 1
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+from src.config import MIN_PAY_PER_HOUR, PAY_PER_ORDER
+from src.simtime import US_PER_SECOND, us_to_minutes
+
+# ======================
+# Estado de la simulación en columnas
+# ======================
+#
+# Una fila por orden y por repartidor, con arreglos de NumPy para tiempos
+# (microsegundos de simulación, ver src/simtime.py), estados, repartidor
+# asignado y tamaño de bundle.  Los ids se internan a enteros densos: la
+# fila de cada objeto queda en ``obj.row``.
+#
+# La simulación sigue trabajando con los objetos Order/Courier (con
+# __slots__, ligeros); los manejadores de run_simulation escriben aquí cada
+# transición y los KPIs, la compensación y los resultados se calculan con
+# máscaras sobre las columnas en lugar de recorrer listas de objetos.
+
+NO_TIME = np.iinfo(np.int64).min
+
+STATUSES = ('pending', 'ready', 'assigned', 'delivered')
+PENDING, READY, ASSIGNED, DELIVERED = range(len(STATUSES))
+STATUS_CODE = {name: code for code, name in enumerate(STATUSES)}
+
+
+def intern_ids(values):
+    """Dense integer codes for ``values`` (in first-seen order) and the uniques."""
+    index = {}
+    codes = np.array([index.setdefault(v, len(index)) for v in values], dtype=np.int64)
+    return codes, list(index)
+
+
+def _id_array(ids):
+    out = np.empty(len(ids), dtype=object)
+    out[:] = ids
+    return out
+
+
+def _minutes(later, earlier, mask):
+    """``(later - earlier)`` in minutes where ``mask``, NaN elsewhere."""
+    out = np.full(len(later), np.nan)
+    out[mask] = us_to_minutes(later[mask] - earlier[mask])
+    return out
+
+
+class OrderStore:
+    """Columns of every order of a run.
+
+    ``placement``, ``ready``, ``pickup`` and ``delivery`` are simulation
+    times (``NO_TIME`` while unknown), ``status`` holds codes of
+    ``STATUSES``, ``courier`` the courier row that delivered the order (-1)
+    and ``bundle_size`` the size of that route (0).  Built once the orders
+    are in simulation time (``SimClock.convert``).
+    """
+
+    def __init__(self, orders):
+        orders = list(orders)
+        self.ids = _id_array([o.id for o in orders])
+        for row, o in enumerate(orders):
+            o.row = row
+        self.restaurant, self.restaurant_ids = intern_ids(o.restaurant.id for o in orders)
+        self.placement = np.array([o.placement_time for o in orders], dtype=np.int64)
+        self.ready = np.array([o.ready_time for o in orders], dtype=np.int64)
+        self.pickup = np.full(len(orders), NO_TIME, dtype=np.int64)
+        self.delivery = np.full(len(orders), NO_TIME, dtype=np.int64)
+        self.status = np.array([STATUS_CODE[o.status] for o in orders], dtype=np.int8)
+        self.courier = np.full(len(orders), -1, dtype=np.int64)
+        self.bundle_size = np.zeros(len(orders), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def set_status(self, orders, status):
+        self.status[[o.row for o in orders]] = status
+
+    def deliver(self, orders, courier, pickup_time, delivery_time):
+        rows = [o.row for o in orders]
+        self.status[rows] = DELIVERED
+        self.pickup[rows] = pickup_time
+        self.delivery[rows] = delivery_time
+        self.courier[rows] = courier.row
+        self.bundle_size[rows] = len(orders)
+
+    def click_to_door(self):
+        """Minutes from placement to delivery (NaN if not delivered)."""
+        return _minutes(self.delivery, self.placement, self.delivery != NO_TIME)
+
+    def ready_to_pickup(self):
+        """Minutes from ready to pickup (NaN if not picked up)."""
+        return _minutes(self.pickup, self.ready, self.pickup != NO_TIME)
+
+    def kpis(self):
+        delivered = self.status == DELIVERED
+        c2d = self.click_to_door()[delivered]
+        r2p = self.ready_to_pickup()[delivered]
+        return {
+            'orders': len(self),
+            'delivered': int(delivered.sum()),
+            'click_to_door_mean': float(c2d.mean()) if c2d.size else float('nan'),
+            'click_to_door_p90': float(np.percentile(c2d, 90)) if c2d.size else float('nan'),
+            'ready_to_pickup_mean': float(r2p.mean()) if r2p.size else float('nan'),
+        }
+
+    def frame(self, clock, rows=None, courier_ids=()):
+        """Per-order results of ``rows`` (all by default) as a DataFrame, times as dates.
+
+        ``courier_ids`` maps courier rows to ids; ``bundle_size`` and
+        ``courier_id`` are empty for orders that were not delivered.
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.intp)
+        delivered = self.courier[rows] >= 0
+        bundle_size = pd.array(self.bundle_size[rows], dtype='Int64')
+        bundle_size[~delivered] = pd.NA
+        # la fila -1 (sin repartidor) cae en el None del final
+        couriers = np.append(_id_array(courier_ids), None)
+        pickup, delivery = self.pickup[rows], self.delivery[rows]
+        return pd.DataFrame({
+            'order_id': self.ids[rows],
+            'status': np.array(STATUSES, dtype=object)[self.status[rows]],
+            'placement_time': clock.wall_array(self.placement[rows], NO_TIME),
+            'ready_time': clock.wall_array(self.ready[rows], NO_TIME),
+            'pickup_time': clock.wall_array(pickup, NO_TIME),
+            'delivery_time': clock.wall_array(delivery, NO_TIME),
+            'click_to_door': _minutes(delivery, self.placement[rows], delivery != NO_TIME),
+            'ready_to_pickup': _minutes(pickup, self.ready[rows], pickup != NO_TIME),
+            'bundle_size': bundle_size,
+            'courier_id': couriers[np.where(delivered, self.courier[rows], -1)],
+        })
+
+
+class CourierStore:
+    """Columns of every courier of a run: shift, deliveries, distance, pay."""
+
+    def __init__(self, couriers):
+        couriers = list(couriers)
+        self.ids = _id_array([c.id for c in couriers])
+        for row, c in enumerate(couriers):
+            c.row = row
+        self.on = np.array([c.on_time for c in couriers], dtype=np.int64)
+        self.off = np.array([c.off_time for c in couriers], dtype=np.int64)
+        self.orders_delivered = np.zeros(len(couriers), dtype=np.int64)
+        self.total_distance = np.zeros(len(couriers))
+        self.earnings = np.zeros(len(couriers))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def complete_route(self, courier, delivered, distance_km):
+        self.orders_delivered[courier.row] += delivered
+        self.total_distance[courier.row] += distance_km
+
+    def shift_duration_hours(self):
+        hours = (self.off - self.on) / US_PER_SECOND / 3600.0
+        return np.where(hours > 0, hours, 0)
+
+    def final_compensation(self):
+        """Pago por órdenes o mínimo por hora, el mayor (``Courier.final_compensation``)."""
+        pay_by_orders = self.orders_delivered * PAY_PER_ORDER
+        pay_by_minimum = self.shift_duration_hours() * MIN_PAY_PER_HOUR
+        self.earnings = np.where(pay_by_orders < pay_by_minimum, pay_by_minimum, pay_by_orders)
+        return self.earnings
+
+    def frame(self, rows=None):
+        """Summary of the couriers in ``rows`` (all by default)."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.intp)
+        return pd.DataFrame({
+            'courier_id': self.ids[rows],
+            'orders_delivered': self.orders_delivered[rows],
+            'total_distance_km': self.total_distance[rows],
+            'shift_duration_hours': self.shift_duration_hours()[rows],
+        })
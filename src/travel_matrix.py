@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+from src.route_summary import RouteSummary
+
+# ======================
+# Matriz de tiempos de viaje
+# ======================
+
+
+class TravelMatrix:
+    """Pairwise duration (seconds) and distance (meters) between locations.
+
+    ``points`` is the list of locations in matrix order; every location is
+    used as-is as a dictionary key, so callers must pass the same tuples they
+    later query with.  Route figures for any waypoint sequence are obtained
+    by gathering the consecutive legs from the matrix and summing them, which
+    is exactly how OSRM composes a multi-stop route from its legs.
+    """
+
+    def __init__(self, points, durations, distances):
+        self.points = list(points)
+        self.index = {p: i for i, p in enumerate(self.points)}
+        self.durations = np.asarray(durations, dtype=float)
+        self.distances = np.asarray(distances, dtype=float)
+
+    def __len__(self):
+        return len(self.points)
+
+    def covers(self, points):
+        return all(p in self.index for p in points)
+
+    def indices(self, points):
+        return np.fromiter((self.index[p] for p in points), dtype=np.intp)
+
+    def route_summary(self, start_coords, waypoints):
+        """Return a :class:`RouteSummary` for start -> waypoints.
+
+        Returns ``None`` if a location is not in the matrix or a leg is
+        unreachable.
+        """
+        index = self.index
+        try:
+            idx = [index[start_coords]] + [index[p] for p in waypoints]
+        except KeyError:
+            return None
+        # Routes are a handful of legs long: scalar item() lookups beat the
+        # fixed overhead of a fancy-indexed gather here.
+        item_duration = self.durations.item
+        item_distance = self.distances.item
+        duration = 0.0
+        distance = 0.0
+        for i, j in zip(idx[:-1], idx[1:]):
+            duration += item_duration(i, j)
+            distance += item_distance(i, j)
+        if not math.isfinite(duration):
+            return None
+        return RouteSummary(duration, distance, start_coords, waypoints)
+
+    def submatrix(self, points):
+        """Return a new matrix restricted to ``points`` (in that order)."""
+        idx = self.indices(points)
+        return TravelMatrix(
+            points,
+            self.durations[np.ix_(idx, idx)],
+            self.distances[np.ix_(idx, idx)],
+        )
@@ -0,0 +1,164 @@
+import numpy as np
+
+
+def _random_durations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 5000, size=(n + 1, 2))
+    return (np.sqrt(((xy[:, None, :] - xy[None, :, :]) ** 2).sum(-1)) / 320.0 * 60.0).tolist()
+
+
+def test_bundle_route_delta_matches_full_recompute():
+    from src.bundle_engine import BundleRoute
+
+    D = _random_durations(8)
+    bundle = BundleRoute([3, 1, 5], D)
+    for pos in range(4):
+        full = BundleRoute(bundle.stops[:pos] + [7] + bundle.stops[pos:], D)
+        assert abs(bundle.travel_with(D, 7, pos) - full.travel) < 1e-9
+    bundle.insert(D, 7, 2)
+    assert bundle.remove(D, 1) == 1
+    assert abs(bundle.travel - BundleRoute([3, 7, 5], D).travel) < 1e-9
+
+
+def test_insertion_and_reinsert_keep_every_order_once():
+    from src.bundle_engine import parallel_insertion, remove_reinsert
+
+    n = 25
+    D = _random_durations(n, seed=4)
+    bundles, n_empty = parallel_insertion(D, n, 3, 6, 4.0, 1.5)
+    bundles = remove_reinsert(D, bundles, 4.0, 1.5, n_empty)
+    stops = sorted(s for b in bundles for s in b.stops)
+    assert stops == list(range(1, n + 1))
+    for b in bundles:
+        travel = 0.0
+        prev = 0
+        for s in b.stops:
+            travel += D[prev][s]
+            prev = s
+        assert abs(b.travel - travel) < 1e-6
+
+
+def test_insertion_cost_tensor_matches_scalar_and_search_converges():
+    from src.bundle_engine import BundleRoute, insertion_costs, parallel_insertion, remove_reinsert
+
+    n = 30
+    D = _random_durations(n, seed=7)
+    bundles, _ = parallel_insertion(D, n - 1, 2, 8, 4.0, 1.5)
+    width = max(len(b) for b in bundles) + 2
+    stops = np.zeros((len(bundles), width), dtype=np.intp)
+    for i, b in enumerate(bundles):
+        stops[i, :len(b)] = b.stops
+    lengths = np.array([len(b) for b in bundles])
+    travels = np.array([b.travel for b in bundles])
+    cost = insertion_costs(np.asarray(D), n, stops, lengths, travels, 4.0, 1.5)
+    for i, b in enumerate(bundles):
+        for pos in range(width):
+            if pos <= len(b):
+                expected = b.travel_with(D, n, pos) / 60.0 + 1.5 * (4.0 + 4.0 * (len(b) + 1))
+                assert cost[i, pos] == expected
+            else:
+                assert cost[i, pos] == np.inf
+
+    bundles, n_empty = parallel_insertion(D, n, 2, 8, 4.0, 1.5)
+    bundles = remove_reinsert(D, bundles, 4.0, 1.5, n_empty)
+    # local optimum: no order has a strictly cheaper place than its own
+    for b in bundles:
+        for node in list(b.stops):
+            pos = b.remove(D, node)
+            here = b.travel_with(D, node, pos) / 60.0 + 1.5 * (4.0 + 4.0 * (len(b) + 1))
+            best = min(
+                o.travel_with(D, node, p) / 60.0 + 1.5 * (4.0 + 4.0 * (len(o) + 1))
+                for o in bundles for p in range(len(o) + 1)
+            )
+            b.insert(D, node, pos)
+            assert not best < here
+
+
+def test_parallel_bundling_matches_sequential(monkeypatch):
+    import src.bundling as bundling
+    from src.main import Order, Restaurant
+    from src.simtime import minutes_to_us
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    monkeypatch.setenv('BUNDLE_CACHE', '0')
+    rng = np.random.default_rng(11)
+    t0 = 0
+    restaurants = []
+    for r in range(6):
+        rest = Restaurant(r, (24.10 + rng.uniform(0, 0.08), -110.36 + rng.uniform(0, 0.09)))
+        for k in range(int(rng.integers(1, 9))):
+            o = Order(f'{r}-{k}', rest, t0, t0 + minutes_to_us(int(rng.integers(0, 10))),
+                      (24.10 + rng.uniform(0, 0.08), -110.36 + rng.uniform(0, 0.09)))
+            o.status = 'ready'
+            rest.orders.append(o)
+        restaurants.append(rest)
+
+    def ids(bundles):
+        return [[o.id for o in b] for b in bundles]
+
+    monkeypatch.setenv('BUNDLING_WORKERS', '1')
+    sequential = bundling.generate_all_bundles(restaurants, t0, 2, 3)
+    assert ids(sequential) == ids(
+        b for rest in restaurants for b in bundling.generate_bundles_for_restaurant(rest, t0, 2, 3)
+    )
+    monkeypatch.setenv('BUNDLING_WORKERS', '2')
+    try:
+        parallel = bundling.generate_all_bundles(restaurants, t0, 2, 3)
+    finally:
+        if bundling._bundling_pool is not None:
+            bundling._bundling_pool.shutdown()
+            bundling._bundling_pool = None
+    assert ids(parallel) == ids(sequential)
+
+
+def test_bundle_cache_reuses_and_repairs(monkeypatch):
+    import src.bundling as bundling
+    from src.main import Order, Restaurant
+    from src.simtime import minutes_to_us
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    monkeypatch.setenv('BUNDLE_CACHE', '1')
+    bundling.clear_bundle_cache()
+    rng = np.random.default_rng(5)
+    t0 = 0
+    rest = Restaurant(0, (24.14, -110.31))
+
+    def add_order(k):
+        o = Order(k, rest, t0, t0 + minutes_to_us(k),
+                  (24.10 + rng.uniform(0, 0.08), -110.36 + rng.uniform(0, 0.09)))
+        o.status = 'ready'
+        rest.orders.append(o)
+        return o
+
+    for k in range(8):
+        add_order(k)
+    first = bundling.generate_all_bundles([rest], t0, 2, 2)
+    again = bundling.generate_all_bundles([rest], t0, 2, 2)
+    assert [[o.id for o in b] for b in again] == [[o.id for o in b] for b in first]
+    assert bundling.bundle_cache_info() == {'reused': 1, 'repaired': 0, 'rebuilt': 1}
+
+    first[0][0].status = 'assigned'
+    add_order(8)
+    repaired = bundling.generate_all_bundles([rest], t0, 2, 2)
+    ids = sorted(o.id for b in repaired for o in b)
+    assert ids == sorted(o.id for o in rest.orders if o.status == 'ready')
+    assert bundling.bundle_cache_info()['repaired'] == 1
+
+    # con más repartidores que órdenes, su número no impide reutilizar
+    wide = bundling.generate_all_bundles([rest], t0, 2, 20)
+    for couriers in (30, 50):
+        again = bundling.generate_all_bundles([rest], t0, 2, couriers)
+        assert [[o.id for o in b] for b in again] == [[o.id for o in b] for b in wide]
+    assert bundling.bundle_cache_info()['reused'] == 3
+    bundling.clear_bundle_cache()
+
+
+def test_sparse_seeding_does_not_depend_on_fleet_size():
+    from src.bundle_engine import solve_bundles
+
+    n = 12
+    D = np.asarray(_random_durations(n, seed=9))
+    few = solve_bundles((D, n, 2, 20, 4.0, 1.5, ()))
+    many = solve_bundles((D, n, 2, 100000, 4.0, 1.5, ()))
+    assert few == many
+    assert sorted(s for b in many for s in b) == list(range(1, n + 1))
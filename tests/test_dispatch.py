@@ -0,0 +1,294 @@
+import random
+from datetime import datetime, timedelta
+
+
+def test_courier_grid_matches_linear_scan_fcfs(monkeypatch):
+    import src.getrouteOSMR as routing
+    from src.asignaciontentativa import assign_order_to_nearest_courier, assign_orders_fcfs
+    from src.main import Courier, Order, Restaurant
+    from src.simtime import SimClock
+    from src.spatial_index import CourierGrid, suggest_cell_size
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    routing._osrm_cache.clear()
+    routing.clear_leg_cache()
+
+    def scenario(seed):
+        # integer grid in lat/lon units so that distance ties are frequent
+        rng = random.Random(seed)
+        t0 = datetime(2025, 1, 1, 8, 0)
+        point = lambda: (24.1 + rng.randint(0, 20) * 0.004, -110.35 + rng.randint(0, 20) * 0.004)
+        rests = [Restaurant(i, point()) for i in range(8)]
+        couriers = [Courier(i, t0, t0 + timedelta(hours=4), point()) for i in range(40)]
+        orders = [Order(i, rng.choice(rests), t0, t0, point()) for i in range(60)]
+        for o in orders:
+            o.status = 'ready'
+        clock = SimClock(t0)
+        clock.convert(orders, couriers)
+        return clock.sim(t0), rests, couriers, orders
+
+    t0, _, couriers, orders = scenario(3)
+    for o in orders:
+        if o.status == 'ready':
+            assign_order_to_nearest_courier(o, couriers, t0)
+    expected = {o.id: next(c.id for c in couriers if c.current_route and c.current_route['orders'][0] is o)
+                for o in orders if o.status == 'assigned'}
+
+    t0, rests, couriers, orders = scenario(3)
+    grid = CourierGrid(suggest_cell_size([c.location for c in couriers] + [r.location for r in rests],
+                                         len(couriers)))
+    for rank, c in enumerate(couriers):
+        grid.insert(c, *c.location, rank)
+    assign_orders_fcfs(orders, grid, t0)
+    got = {o.id: next(c.id for c in couriers if c.current_route and c.current_route['orders'][0] is o)
+           for o in orders if o.status == 'assigned'}
+
+    assert len(expected) == 40
+    assert got == expected
+    assert len(grid) == 0
+
+
+def test_epoch_context_matches_scalar_helpers(monkeypatch):
+    import src.getrouteOSMR as routing
+    from src.asignaciontentativa import classify_bundle, earliest_possible_dropoff
+    from src.bundling import calculate_bundle_score
+    from src.epoch_context import EpochContext, score_bundles
+    from src.main import Courier, Order, Restaurant
+    from src.simtime import SimClock
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    routing._osrm_cache.clear()
+    routing.clear_leg_cache()
+    rng = random.Random(21)
+    t0 = datetime(2025, 1, 1, 12, 0)
+    point = lambda: (24.10 + rng.uniform(0, 0.09), -110.36 + rng.uniform(0, 0.1))
+    rests = [Restaurant(i, point()) for i in range(5)]
+    couriers = [Courier(i, t0, t0 + timedelta(hours=3), point()) for i in range(12)]
+    bundles = []
+    for k in range(20):
+        rest = rng.choice(rests)
+        bundle = []
+        for i in range(rng.randint(1, 3)):
+            placed = t0 - timedelta(seconds=rng.uniform(0, 2400))
+            ready = placed + timedelta(seconds=rng.uniform(0, 2400))
+            bundle.append(Order(f'{k}-{i}', rest, placed, ready, point()))
+        bundles.append(bundle)
+    clock = SimClock(t0)
+    clock.convert([o for b in bundles for o in b], couriers)
+    now = clock.sim(t0)
+
+    scores = score_bundles(couriers, bundles, now)
+    expected = [[calculate_bundle_score(b, c, now) for b in bundles] for c in couriers]
+    assert scores.tolist() == expected
+
+    context = EpochContext(couriers, bundles, now)
+    groups = [classify_bundle(b, couriers, now) for b in bundles]
+    assert context.groups().tolist() == groups
+    assert len(set(groups)) > 1
+    c, b = couriers[3], bundles[5]
+    dropoff = now + int(context.earliest_dropoff[3, 5])
+    assert dropoff == earliest_possible_dropoff(b, c, now)
+    waypoints = [o.restaurant.location for o in b] + [o.dropoff_loc for o in b]
+    route = context.route(c.location, waypoints)
+    assert route.duration == routing.get_route_summary(c.location, waypoints).duration
+
+
+def test_sparse_assignment_matches_dense_optimum():
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+
+    from src.assignment_solvers import INFEASIBLE_COST, solve_sparse
+
+    rng = np.random.default_rng(3)
+    for n_rows, n_cols in [(6, 6), (4, 9), (9, 4), (1, 5)]:
+        cost = rng.uniform(-80, 20, size=(n_rows, n_cols))
+        cost[rng.uniform(size=cost.shape) < 0.3] = INFEASIBLE_COST
+        rows, cols = np.nonzero(cost < INFEASIBLE_COST)
+        r, c = solve_sparse(rows, cols, cost[rows, cols], n_rows, n_cols)
+        assert len(set(r.tolist())) == len(r) and len(set(c.tolist())) == len(c)
+        assert (cost[r, c] < INFEASIBLE_COST).all()
+
+        dr, dc = linear_sum_assignment(cost)
+        feasible = cost[dr, dc] < INFEASIBLE_COST
+        assert len(r) == feasible.sum()
+        assert abs(cost[r, c].sum() - cost[dr, dc][feasible].sum()) < 1e-9
+
+
+def test_candidate_pairs_keep_k_nearest(monkeypatch):
+    import numpy as np
+
+    import src.getrouteOSMR as routing
+    from src.epoch_context import EpochContext
+    from src.main import Courier, Order, Restaurant
+    from src.simtime import SimClock
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    routing._osrm_cache.clear()
+    routing.clear_leg_cache()
+    rng = random.Random(8)
+    t0 = datetime(2025, 1, 1, 12, 0)
+    point = lambda: (24.10 + rng.uniform(0, 0.09), -110.36 + rng.uniform(0, 0.1))
+    rests = [Restaurant(i, point()) for i in range(4)]
+    couriers = [Courier(i, t0, t0 + timedelta(hours=3), point()) for i in range(10)]
+    bundles = [[Order(k, rng.choice(rests), t0, t0 + timedelta(minutes=5), point())] for k in range(7)]
+    clock = SimClock(t0)
+    clock.convert([b[0] for b in bundles], couriers)
+
+    context = EpochContext(couriers, bundles, clock.sim(t0))
+    r, c = context.candidate_pairs(couriers, bundles, 3)
+    assert np.bincount(c, minlength=len(bundles)).max() <= 3
+    for j in range(len(bundles)):
+        chosen = context.inbound[r[c == j], j]
+        assert chosen.max() <= np.sort(context.inbound[:, j])[2]
+    scores = context.pair_scores(couriers, bundles, r, c)
+    assert scores.tolist() == context.scores()[r, c].tolist()
+
+
+def test_pruned_context_routes_only_kept_pairs(monkeypatch):
+    import random
+    from datetime import datetime, timedelta
+
+    import numpy as np
+
+    import src.epoch_context as epoch_context
+    import src.getrouteOSMR as routing
+    from src.epoch_context import EpochContext
+    from src.main import Courier, Order, Restaurant
+    from src.simtime import SimClock
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    routing._osrm_cache.clear()
+    routing.clear_leg_cache()
+    rng = random.Random(5)
+    t0 = datetime(2025, 1, 1, 12, 0)
+    point = lambda: (24.10 + rng.uniform(0, 0.09), -110.36 + rng.uniform(0, 0.1))
+    rests = [Restaurant(i, point()) for i in range(4)]
+    couriers = [Courier(i, t0, t0 + timedelta(hours=3), point()) for i in range(12)]
+    bundles = [[Order(k, rests[k % 4], t0, t0 + timedelta(minutes=5), point())] for k in range(6)]
+    clock = SimClock(t0)
+    clock.convert([b[0] for b in bundles], couriers)
+    now = clock.sim(t0)
+
+    routed = []
+    fetch = epoch_context.get_route_summaries
+    monkeypatch.setattr(epoch_context, 'get_route_summaries', lambda legs: routed.extend(legs) or fetch(legs))
+    context = EpochContext(couriers, bundles, now, k=2)
+    assert context.pruned
+    starts = {c.location for c in couriers}
+    inbound_legs = {(a, b[0]) for a, b in routed if a in starts}
+    kept_legs = {
+        (couriers[i].location, bundles[j][0].restaurant.location)
+        for i, j in zip(context.pair_rows, context.pair_cols)
+    }
+    assert inbound_legs == kept_legs
+    assert len(inbound_legs) < len(couriers) * len(rests)
+
+    full = EpochContext(couriers, bundles, now)
+    for j, b in enumerate(bundles):
+        kept = context.pair_rows[context.pair_cols == j]
+        # k = 2 más uno por cada otro bundle del mismo restaurante
+        assert len(kept) == 2 - 1 + sum(x[0].restaurant is b[0].restaurant for x in bundles)
+        others = np.setdiff1d(np.arange(len(couriers)), kept)
+        assert full.inbound[kept, j].max() <= full.inbound[others, j].min()
+    assert context.inbound.tolist() == full.inbound[context.pair_rows, context.pair_cols].tolist()
+    assert context.groups().tolist() == full.groups().tolist()
+
+    scores = context.scores()
+    pairs = (context.pair_rows, context.pair_cols)
+    assert scores[pairs].tolist() == full.scores()[pairs].tolist()
+    assert np.isneginf(scores).sum() == scores.size - len(context.pair_rows)
+    r, c = context.candidate_pairs(couriers, bundles)
+    assert context.pair_scores(couriers, bundles, r, c).tolist() == scores[r, c].tolist()
+
+
+def test_lexicographic_costs_serve_groups_in_order():
+    import itertools
+
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+
+    from src.assignment_solvers import lexicographic_costs
+
+    rng = np.random.default_rng(12)
+    for _ in range(20):
+        cost = rng.uniform(-60, 10, size=(4, 5))
+        feasible = rng.uniform(size=cost.shape) < 0.7
+        groups = rng.integers(1, 4, size=5)
+        weighted, unmatched = lexicographic_costs(cost, groups[None, :], feasible, 4)
+        r, c = linear_sum_assignment(weighted)
+
+        def rank(pairs):
+            pairs = [(i, j) for i, j in pairs if feasible[i, j]]
+            counts = [-sum(groups[j] == g for _, j in pairs) for g in (1, 2, 3)]
+            return counts + [sum(cost[i, j] for i, j in pairs)]
+
+        best = min(rank(zip(range(4), p)) for p in itertools.permutations(range(5), 4))
+        got = rank(zip(r, c))
+        assert got[:3] == best[:3] and abs(got[3] - best[3]) < 1e-6
+        assert unmatched > weighted[feasible].max()
+
+
+def test_approximate_solvers_against_exact(monkeypatch):
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+
+    import src.assignment_solvers as solvers
+
+    rng = np.random.default_rng(17)
+    for n_rows, n_cols in [(7, 7), (5, 12), (12, 5)]:
+        cost = rng.uniform(-60, 10, size=(n_rows, n_cols))
+        r, c = linear_sum_assignment(cost)
+        optimum = cost[r, c].sum()
+
+        ar, ac, prices = solvers.solve_auction(cost)
+        assert len(ar) == min(n_rows, n_cols) == len(set(ac.tolist()))
+        assert cost[ar, ac].sum() - optimum <= 1e-2 + 1e-9
+        wr, wc, _ = solvers.solve_auction(cost + 0.5, prices=prices)
+        assert cost[wr, wc].sum() - optimum <= 1e-2 + 1e-9
+
+        gr, gc = solvers.solve_greedy_regret(cost)
+        assert len(gr) == min(n_rows, n_cols) == len(set(gc.tolist()))
+        assert cost[gr, gc].sum() >= optimum - 1e-9
+        assert solvers.assignment_lower_bound(cost) <= optimum + 1e-9
+
+    # cada solve aproximado reporta una cota de su gap
+    monkeypatch.setenv('ASSIGNMENT_SOLVER', 'greedy')
+    solvers.clear_solver_state()
+    cost = rng.uniform(-60, 10, size=(40, 60))
+    r, c = solvers.solve_assignment(cost)
+    gap = cost[r, c].sum() - cost[linear_sum_assignment(cost)].sum()
+    assert solvers.solver_info()['max_gap_bound'] >= gap - 1e-9
+
+    solvers.clear_solver_state()
+    assert solvers.choose_solver(10, 10, budget=1.0) == 'exact'
+    assert solvers.choose_solver(10**5, 10**5, budget=1e-3) == 'greedy'
+    # el auction es experimental: auto nunca lo elige, ni aunque parezca barato
+    monkeypatch.setitem(solvers._solver_rates, 'auction', 1e-15)
+    assert solvers.choose_solver(3000, 3000, budget=0.05) == 'greedy'
+    solvers.clear_solver_state()
+    # linear_sum_assignment resuelve 2000x3000 en ~0.1 s: auto no debe degradarlo
+    assert solvers.choose_solver(2000, 3000, budget=0.5) == 'exact'
+    monkeypatch.setenv('ASSIGNMENT_SOLVER', 'auto')
+    cost = rng.uniform(-60, 10, size=(2000, 3000))
+    r, c = solvers.solve_assignment(cost)
+    assert cost[r, c].sum() == cost[linear_sum_assignment(cost)].sum()
+    assert solvers.solver_info()['exact'] == 1
+    # los solves chicos (puro costo fijo) no vuelven pesimista la estimación
+    solvers.clear_solver_state()
+    for _ in range(50):
+        solvers.solve_assignment(rng.uniform(-60, 10, size=(3, 4)))
+    assert solvers._solver_rates == solvers._DEFAULT_RATES
+    assert solvers.choose_solver(300, 300) == 'exact'
+    # y la recalibración no la aleja más de _RATE_CLAMP de la medida
+    monkeypatch.setenv('ASSIGNMENT_SOLVER', 'exact')
+    solvers._solver_rates['exact'] = 1.0
+    solvers.solve_assignment(rng.uniform(-60, 10, size=(500, 500)))
+    assert solvers._solver_rates['exact'] == solvers._DEFAULT_RATES['exact'] * solvers._RATE_CLAMP
+    monkeypatch.setenv('ASSIGNMENT_SOLVER', 'auction')
+    solvers.clear_solver_state()
+    cost = rng.uniform(-60, 10, size=(6, 9))
+    r, c = solvers.solve_assignment(cost, row_keys=list(range(6)), col_keys=list('abcdefghi'))
+    assert abs(cost[r, c].sum() - cost[linear_sum_assignment(cost)].sum()) <= 1e-2
+    assert sorted(solvers._auction_prices) == list('abcdefghi')
+    assert solvers.solver_info()['auction'] == 1
+    solvers.clear_solver_state()
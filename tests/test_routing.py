@@ -0,0 +1,330 @@
+import os
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_route_store_roundtrip_and_eviction(tmp_path):
+    from src.route_cache import RouteStore, route_key
+
+    path = str(tmp_path / 'routes.sqlite')
+    store = RouteStore(path, max_entries=10)
+    key = route_key([(24.1, -110.3), (24.2, -110.31)])
+    store.put(key, {'duration': 60.0, 'distance': 320.0})
+    assert store.get(key) == {'duration': 60.0, 'distance': 320.0}
+    assert store.get('missing') is None
+    store.put_many([('a', {'duration': 1.0}), ('b', {'duration': 2.0})])
+    assert store.get_many(['a', 'b', 'missing']) == {'a': {'duration': 1.0}, 'b': {'duration': 2.0}}
+
+    for i in range(30):
+        store.put(f'k{i}', {'duration': float(i)})
+    store.evict()
+    assert len(store) <= 10
+    store.close()
+
+    ro = RouteStore(path, read_only=True)
+    assert ro.get('k29') == {'duration': 29.0}
+    ro.put('new', {'duration': 1.0})
+    assert ro.get('new') is None
+    ro.close()
+
+
+def test_persistent_store_skips_http_on_second_run(tmp_path, monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+
+    calls = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'code': 'Ok', 'routes': [{'duration': 120.0, 'distance': 640.0,
+                                               'geometry': '', 'legs': []}]}
+
+    class FakeSession:
+        def get(self, url, params=None, timeout=None):
+            calls.append(url)
+            return FakeResponse()
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '0')
+    monkeypatch.setenv('OSRM_CACHE_PATH', str(tmp_path / 'routes.sqlite'))
+    monkeypatch.setattr(routing, '_get_session', lambda: FakeSession())
+    monkeypatch.setattr(routing, '_osrm_cache', {})
+
+    start, waypoints = (24.1, -110.3), [(24.11, -110.31)]
+    assert routing.get_route_details(start, waypoints)['duration'] == 120.0
+    assert len(calls) == 1
+
+    # A fresh process starts with an empty in-memory cache
+    monkeypatch.setattr(routing, '_osrm_cache', {})
+    assert routing.get_route_details(start, waypoints)['duration'] == 120.0
+    assert len(calls) == 1
+
+
+def test_persistent_store_covers_rolling_horizon_rerun(tmp_path, monkeypatch):
+    import random
+    from datetime import datetime, timedelta
+
+    try:
+        import src.getrouteOSMR as routing
+        from src.main import Courier, Order, Restaurant, run_simulation
+        from src.osrm_standin import OSRMStandin
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+
+    def instance():
+        rng = random.Random(3)
+        t0 = datetime(2025, 1, 1, 12, 0)
+        point = lambda: (24.10 + rng.uniform(0, 0.06), -110.36 + rng.uniform(0, 0.06))
+        restaurants = [Restaurant(i, point()) for i in range(4)]
+        couriers = [Courier(i, t0, t0 + timedelta(hours=2), point()) for i in range(5)]
+        orders = []
+        for k in range(25):
+            placed = t0 + timedelta(seconds=rng.uniform(0, 5400))
+            orders.append(Order(k, rng.choice(restaurants), placed, placed + timedelta(minutes=10), point()))
+        return orders, couriers, restaurants, t0
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('USE_EUCLIDEAN', '0')
+    monkeypatch.setenv('FCFS_POLICY', '0')
+    monkeypatch.setenv('OSRM_CACHE_PATH', str(tmp_path / 'routes.sqlite'))
+    results = []
+    with OSRMStandin() as server:
+        monkeypatch.setenv('OSRM_URL', server.url)
+        for run in range(2):
+            # cada corrida empieza con caches en memoria vacíos, como otro proceso
+            routing.clear_leg_cache()
+            routing._osrm_cache.clear()
+            before = dict(server.counts)
+            orders, couriers, restaurants, t0 = instance()
+            run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=3), start_time=t0,
+                           results_path=f'run{run}.csv')
+            results.append((tmp_path / f'run{run}.csv').read_text())
+            requests = {kind: server.counts[kind] - before[kind] for kind in ('route', 'table')}
+        # store_hits cuenta las celdas de /table leídas del store
+        points = [(24.20 + 0.01 * k, -110.20) for k in range(5)]
+        routing.get_table(points)
+        routing.reset_routing_stats()
+        routing.get_table(points)
+        assert routing.routing_stats()['counters']['store_hits'] == 25
+        routing.clear_leg_cache()
+        routing._osrm_cache.clear()
+
+    assert requests == {'route': 0, 'table': 0}
+    assert results[0] == results[1]
+
+
+def test_epoch_matrix_from_table_standin(monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+        from src.osrm_standin import OSRMStandin
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+
+    with OSRMStandin(meters_per_minute=600.0) as server:
+        monkeypatch.setenv('USE_EUCLIDEAN', '0')
+        monkeypatch.setenv('OSRM_URL', server.url)
+        monkeypatch.setenv('OSRM_TABLE_MAX_COORDS', '4')
+        points = [(24.10 + 0.01 * k, -110.30 - 0.01 * k) for k in range(5)]
+        matrix = routing.build_travel_matrix(points + points[:2])
+
+    assert matrix is not None and len(matrix) == 5
+    assert server.counts['route'] == 0
+    assert server.counts['table'] == 9  # 3 blocks of 2 -> 3 x 3 source/destination blocks
+
+    expected = sum(routing.haversine_distance(a, b) for a, b in zip(points[:-1], points[1:]))
+    routing.set_epoch_matrix(matrix)
+    try:
+        summary = routing.get_route_summary(points[0], points[1:])
+    finally:
+        routing.set_epoch_matrix(None)
+    assert summary['distance'] == pytest.approx(expected)
+    assert summary['duration'] == pytest.approx(expected / 600.0 * 60.0)
+
+
+def test_vectorized_haversine_matches_scalar(monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+
+    points = [(24.10 + 0.013 * k, -110.30 + 0.007 * (k % 3)) for k in range(6)]
+    matrix = routing.haversine_matrix(points)
+    for i, a in enumerate(points):
+        for j, b in enumerate(points):
+            assert matrix[i, j] == pytest.approx(routing.haversine_distance(a, b), abs=1e-6)
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    travel = routing.build_travel_matrix(points)
+    details = routing.get_route_details(points[0], points[1:])
+    summary = travel.route_summary(points[0], points[1:])
+    assert summary['distance'] == pytest.approx(details['distance'])
+    assert summary['duration'] == pytest.approx(details['duration'])
+
+
+def test_planar_network_matches_evaluator_traveltime():
+    try:
+        from src.grubhub_loader import load_instance
+        import src.getrouteOSMR as routing
+    except Exception as e:
+        pytest.skip(f"Cannot import grubhub_loader: {e}")
+    import numpy as np
+
+    inst = os.path.join(ROOT, 'mdrplib-master', 'public_instances', '0o50t75s1p100')
+    if not os.path.isdir(inst):
+        pytest.skip("Grubhub public_instances not present")
+
+    orders, couriers, restaurants, params = load_instance(inst, planar=True)
+    network = params['planar_network']
+    mpm = params['meters_per_minute']
+    o = orders[0]
+    rx, ry = network.xy[o.restaurant.location]
+    ox, oy = network.xy[o.dropoff_loc]
+    expected = np.ceil(np.sqrt((ox - rx) ** 2 + (oy - ry) ** 2) / mpm)
+    assert network.travel_time(o.restaurant.location, o.dropoff_loc) == expected
+
+    routing.set_planar_network(network)
+    try:
+        route = routing.get_route_details(couriers[0].location, [o.restaurant.location, o.dropoff_loc])
+        summary = routing.get_route_summary(couriers[0].location, [o.restaurant.location, o.dropoff_loc])
+    finally:
+        routing.set_planar_network(None)
+    minutes = (network.travel_time(couriers[0].location, o.restaurant.location)
+               + network.travel_time(o.restaurant.location, o.dropoff_loc))
+    assert route['duration'] == summary['duration'] == minutes * 60.0
+
+
+def test_leg_cache_composes_permutations(monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+    from itertools import permutations
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    restaurant = (24.14, -110.31)
+    routing.get_route_summary(restaurant, [(24.2, -110.2)])
+    # vaciar el cache de tramos no borra los contadores
+    before = routing.routing_stats()
+    routing.clear_leg_cache()
+    assert routing.routing_stats() == before
+    routing.reset_routing_stats()
+    dropoffs = [(24.10 + 0.01 * k, -110.30 - 0.005 * k) for k in range(4)]
+    for perm in permutations(dropoffs):
+        summary = routing.get_route_summary(restaurant, list(perm))
+        details = routing.get_route_details(restaurant, list(perm))
+        assert summary['duration'] == pytest.approx(details['duration'])
+
+    info = routing.leg_cache_info()
+    # 4 legs from the restaurant + 12 ordered pairs of drop-offs
+    assert info['misses'] == 16
+    assert info['hit_rate'] > 0.8
+
+
+def test_concurrent_leg_prefetch_coalesces_duplicates(monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+        from src.osrm_standin import OSRMStandin
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+    import time
+
+    with OSRMStandin(latency_ms=50) as server:
+        monkeypatch.setenv('USE_EUCLIDEAN', '0')
+        monkeypatch.delenv('OSRM_CACHE_PATH', raising=False)
+        monkeypatch.setenv('OSRM_URL', server.url)
+        monkeypatch.setattr(routing, '_osrm_cache', {})
+        routing.clear_leg_cache()
+        restaurant = (24.14, -110.31)
+        couriers = [(24.10 + 0.002 * k, -110.30) for k in range(16)]
+        queries = [(c, [restaurant]) for c in couriers] * 3
+
+        started = time.perf_counter()
+        summaries = routing.get_route_summaries(queries)
+        elapsed = time.perf_counter() - started
+
+    assert server.counts['route'] == 16  # one request per distinct leg
+    assert all(s is not None for s in summaries)
+    if routing._max_workers() >= 4:
+        assert elapsed < 16 * 0.05
+
+
+def test_route_summary_fetches_geometry_lazily(monkeypatch):
+    try:
+        import src.getrouteOSMR as routing
+    except Exception as e:
+        pytest.skip(f"Cannot import getrouteOSMR: {e}")
+
+    requested = []
+
+    class FakeResponse:
+        def __init__(self, params):
+            self.params = params
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            route = {'duration': 90.0, 'distance': 480.0}
+            if self.params['overview'] == 'full':
+                route.update(geometry='abc', legs=[{'steps': []}])
+            return {'code': 'Ok', 'routes': [route]}
+
+    class FakeSession:
+        def get(self, url, params=None, timeout=None):
+            requested.append(params['overview'])
+            return FakeResponse(params)
+
+    monkeypatch.setenv('USE_EUCLIDEAN', '0')
+    monkeypatch.delenv('OSRM_CACHE_PATH', raising=False)
+    monkeypatch.setattr(routing, '_get_session', lambda: FakeSession())
+    monkeypatch.setattr(routing, '_osrm_cache', {})
+    routing.clear_leg_cache()
+
+    route = routing.get_route_summary((24.1, -110.3), [(24.11, -110.31)])
+    assert route['duration'] == 90.0 and route.distance == 480.0
+    assert requested == ['false']
+    assert route['geometry'] == 'abc'
+    assert requested == ['false', 'full']
+    assert route.legs == [{'steps': []}]
+    assert requested == ['false', 'full']
+
+
+def test_lru_cache_and_routing_stats():
+    from src.route_cache import LRUCache, RoutingStats
+
+    stats = RoutingStats()
+    cache = LRUCache(2, on_evict=lambda: stats.incr('route_evictions'))
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache['c'] = 3
+    assert 'b' not in cache and 'a' in cache and len(cache) == 2
+
+    stats.record_latency('route', 0.003)
+    stats.record_latency('route', 0.250)
+    snap = stats.snapshot()
+    assert snap['counters']['route_evictions'] == 1
+    assert snap['latency']['route']['count'] == 2
+    assert sum(snap['latency']['route']['buckets']) == 2
+    assert 'route latency: calls=2' in stats.report()
+
+
+def test_bench_percentile_is_nearest_rank():
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location('bench_routing', os.path.join(ROOT, 'scripts', 'bench_routing.py'))
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+
+    values = list(range(1, 11))
+    assert bench.percentile(values, 50) == 5
+    assert bench.percentile(values, 90) == 9
+    assert bench.percentile(values, 100) == 10
+    assert bench.percentile(values, 1) == 1
+    assert bench.percentile(list(range(1, 101)), 99) == 99
+    assert bench.percentile([], 50) == 0.0
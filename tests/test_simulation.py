@@ -0,0 +1,260 @@
+import random
+from datetime import datetime, timedelta
+
+
+def _instance(seed=3):
+    from src.main import Courier, Order, Restaurant
+
+    rng = random.Random(seed)
+    t0 = datetime(2025, 1, 1, 12, 0)
+    point = lambda: (24.10 + rng.uniform(0, 0.06), -110.36 + rng.uniform(0, 0.06))
+    restaurants = [Restaurant(i, point()) for i in range(4)]
+    couriers = [
+        Courier(i, t0 + timedelta(minutes=rng.uniform(0, 40)), t0 + timedelta(minutes=rng.uniform(90, 180)), point())
+        for i in range(5)
+    ]
+    orders = []
+    for k in range(25):
+        placed = t0 + timedelta(seconds=rng.uniform(0, 5400))
+        ready = placed + timedelta(seconds=rng.uniform(300, 1200))
+        orders.append(Order(k, rng.choice(restaurants), placed, ready, point()))
+    return orders, couriers, restaurants, t0
+
+
+def _run(tmp_path, name, monkeypatch, **env):
+    from src.main import run_simulation
+
+    # save_route_map escribe en maps/ del directorio actual
+    monkeypatch.chdir(tmp_path)
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    orders, couriers, restaurants, t0 = _instance()
+    results = tmp_path / f'{name}.csv'
+    summary = tmp_path / f'{name}_couriers.csv'
+    run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+                   results_path=str(results), courier_results_path=str(summary))
+    return results.read_text() + summary.read_text(), orders, couriers
+
+
+def test_event_engine_matches_fixed_step_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    for policy in ('0', '1'):
+        monkeypatch.setenv('FCFS_POLICY', policy)
+        loop, _, _ = _run(tmp_path, f'loop{policy}', monkeypatch, SIM_ENGINE='loop')
+        events, _, _ = _run(tmp_path, f'events{policy}', monkeypatch, SIM_ENGINE='events', SIM_EVENT_TIMES='tick')
+        assert events == loop
+
+    # por defecto cada evento ocurre en su instante
+    monkeypatch.delenv('SIM_EVENT_TIMES')
+    _, orders, couriers = _run(tmp_path, 'exact', monkeypatch, SIM_ENGINE='events')
+    delivered = [o for o in orders if o.status == 'delivered']
+    assert delivered
+    assert sum(c.orders_delivered for c in couriers) == len(delivered)
+    assert all(o.delivery_time >= o.placement_time for o in delivered)
+
+
+def test_tick_ceil():
+    from src.event_engine import tick_ceil
+
+    t0 = datetime(2025, 1, 1, 12, 0)
+    step = timedelta(minutes=5)
+    assert tick_ceil(t0 - step, t0, step) == t0
+    assert tick_ceil(t0 + step, t0, step) == t0 + step
+    assert tick_ceil(t0 + timedelta(seconds=301), t0, step) == t0 + 2 * step
+
+
+def test_pending_orders_and_shift_schedule():
+    from src.sim_index import PendingOrders, ShiftSchedule
+
+    orders, couriers, restaurants, t0 = _instance(seed=6)
+    pending = PendingOrders(restaurants)
+    arrived = sorted(orders, key=lambda o: o.placement_time)
+    for o in arrived:
+        o.status = 'ready'
+        pending.add(o)
+    for rest in restaurants:
+        assert [o.ready_time for o in rest.orders] == sorted(o.ready_time for o in rest.orders)
+
+    limit = t0 + timedelta(minutes=60)
+    scan = [o for rest in restaurants for o in arrived if o.restaurant is rest and o.ready_time <= limit]
+    assert pending.ready_by(limit) == scan
+
+    for o in arrived[::2]:
+        o.status = 'assigned'
+    pending.prune()
+    assert len(pending) == sum(len(rest.orders) for rest in restaurants) == len(arrived[1::2])
+    assert pending.ready_by(limit) == [o for o in scan if o.status == 'ready']
+
+    shifts = ShiftSchedule(couriers)
+    seen = []
+    for minutes in range(0, 60, 5):
+        t = t0 + timedelta(minutes=minutes)
+        due = shifts.due(t)
+        assert due == [c for c in couriers if c.on_time <= t and c not in seen]
+        seen += due
+
+
+def test_sim_time_matches_timedelta(tmp_path, monkeypatch):
+    from src.simtime import SimClock, duration_us, minutes_to_us, seconds_to_us
+
+    rng = random.Random(4)
+    for _ in range(2000):
+        x = rng.choice([rng.uniform(0, 5000), rng.randint(0, 10 ** 6) / 8e6])
+        assert seconds_to_us(x) == duration_us(timedelta(seconds=x))
+        assert minutes_to_us(x) == duration_us(timedelta(minutes=x))
+
+    t0 = datetime(2025, 1, 1, 12, 0)
+    clock = SimClock(t0)
+    t = t0 + timedelta(seconds=rng.uniform(-3600, 3600))
+    assert clock.wall(clock.sim(t)) == t
+
+    # los resultados vuelven a fechas al terminar la simulación
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    _, orders, couriers = _run(tmp_path, 'dates', monkeypatch, SIM_ENGINE='loop')
+    assert all(isinstance(o.placement_time, datetime) for o in orders)
+    assert all(isinstance(o.delivery_time, datetime) for o in orders if o.status == 'delivered')
+    assert all(isinstance(r['completion_time'], datetime) for c in couriers for r in c.route_history)
+
+
+def test_state_store_tracks_objects(tmp_path, monkeypatch):
+    import numpy as np
+
+    from src.main import run_simulation
+    from src.state_store import STATUSES
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    orders, couriers, restaurants, t0 = _instance(seed=5)
+    order_store, courier_store = run_simulation(
+        orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+        results_path=str(tmp_path / 'r.csv'), courier_results_path=str(tmp_path / 'c.csv'))
+
+    assert [STATUSES[s] for s in order_store.status] == [o.status for o in orders]
+    c2d = order_store.click_to_door()
+    for o in orders:
+        expected = o.get_click_to_door()
+        assert np.isnan(c2d[o.row]) if expected is None else c2d[o.row] == expected
+    kpis = order_store.kpis()
+    assert kpis['delivered'] == sum(c.orders_delivered for c in couriers) > 0
+    # ninguna orden se entrega dos veces
+    final = [o.id for c in couriers for r in c.route_history if r['commitment_type'] == 'final' for o in r['orders']]
+    assert len(final) == len(set(final)) == kpis['delivered']
+    assert courier_store.orders_delivered.tolist() == [c.orders_delivered for c in couriers]
+    assert courier_store.total_distance.tolist() == [c.total_distance for c in couriers]
+    for c in couriers:
+        earnings = c.earnings
+        c.final_compensation()
+        assert c.earnings == earnings
+
+
+def test_results_are_streamed(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    import src.main as main
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+    monkeypatch.setenv('RESULTS_BATCH_SIZE', '3')
+    text, orders, couriers = _run(tmp_path, 'csv', monkeypatch)
+    csv = pd.read_csv(tmp_path / 'csv.csv')
+    assert sorted(csv['order_id']) == sorted(o.id for o in orders)
+    delivered = csv[csv['status'] == 'delivered']
+    for c in couriers:
+        for route in c.route_history:
+            if route['commitment_type'] == 'final':
+                rows = delivered[delivered['order_id'].isin([o.id for o in route['orders']])]
+                assert (rows['courier_id'] == c.id).all()
+                assert (rows['bundle_size'] == len(route['orders'])).all()
+    assert csv.loc[csv['status'] != 'delivered', 'bundle_size'].isna().all()
+
+    orders, couriers, restaurants, t0 = _instance()
+    main.run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+                        results_path=str(tmp_path / 'r.parquet'),
+                        courier_results_path=str(tmp_path / 'c.parquet'))
+    parquet = pd.read_parquet(tmp_path / 'r.parquet')
+    assert parquet['order_id'].tolist() == csv['order_id'].tolist()
+    assert np.allclose(parquet['click_to_door'], csv['click_to_door'], equal_nan=True)
+    assert len(pd.read_parquet(tmp_path / 'c.parquet')) == len(couriers)
+
+    # si la corrida falla, lo entregado hasta entonces ya está en disco
+    monkeypatch.setenv('RESULTS_BATCH_SIZE', '1')
+    assign = main.assign_bundles_to_couriers
+    orders, couriers, restaurants, t0 = _instance()
+
+    def failing(*args):
+        if sum(o.status == 'delivered' for o in orders) >= 5:
+            raise RuntimeError('boom')
+        return assign(*args)
+
+    monkeypatch.setattr(main, 'assign_bundles_to_couriers', failing)
+    try:
+        main.run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+                            results_path=str(tmp_path / 'partial.csv'))
+    except RuntimeError:
+        pass
+    partial = pd.read_csv(tmp_path / 'partial.csv')
+    assert len(partial) == sum(o.status == 'delivered' for o in orders) > 0
+    assert (partial['status'] == 'delivered').all()
+    # y los objetos vuelven a tener fechas
+    assert all(isinstance(o.placement_time, datetime) for o in orders)
+    assert all(isinstance(c.off_time, datetime) for c in couriers)
+    assert all(isinstance(route['completion_time'], datetime) for c in couriers for route in c.route_history)
+
+
+def test_results_survive_map_errors(tmp_path, monkeypatch):
+    import sys
+
+    import pandas as pd
+    import pytest
+
+    import src.main as main
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('USE_EUCLIDEAN', '1')
+
+    def broken_map(route, filename):
+        raise RuntimeError('no map')
+
+    # el Parquet se cierra antes de dibujar los mapas
+    monkeypatch.setattr(main, 'save_route_map', broken_map)
+    orders, couriers, restaurants, t0 = _instance()
+    with pytest.raises(RuntimeError):
+        main.run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+                            results_path=str(tmp_path / 'r.parquet'))
+    assert len(pd.read_parquet(tmp_path / 'r.parquet')) == len(orders)
+
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    orders, couriers, restaurants, t0 = _instance()
+    with pytest.raises(ImportError, match='pyarrow'):
+        main.run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=4), start_time=t0,
+                            results_path=str(tmp_path / 'other.parquet'))
+    assert all(isinstance(o.placement_time, datetime) for o in orders)
+
+
+def test_planar_run(tmp_path, monkeypatch):
+    import numpy as np
+
+    from src.getrouteOSMR import set_planar_network
+    from src.main import Courier, Order, Restaurant, run_simulation
+    from src.planar import PlanarNetwork
+
+    # ubicaciones como ids enteros de una red plana (instancias MDRPLib)
+    rng = random.Random(9)
+    xy = np.array([(rng.uniform(0, 8000), rng.uniform(0, 8000)) for _ in range(40)])
+    t0 = datetime(2025, 1, 1, 12, 0)
+    restaurants = [Restaurant(i, i) for i in range(4)]
+    couriers = [Courier(i, t0, t0 + timedelta(hours=2), 4 + i) for i in range(4)]
+    orders = []
+    for k in range(12):
+        placed = t0 + timedelta(minutes=rng.uniform(0, 60))
+        orders.append(Order(k, rng.choice(restaurants), placed, placed + timedelta(minutes=10), 8 + k))
+
+    monkeypatch.chdir(tmp_path)
+    set_planar_network(PlanarNetwork(xy, 320.0))
+    try:
+        order_store, _ = run_simulation(orders, couriers, restaurants, t0 + timedelta(hours=3), start_time=t0,
+                                        results_path=str(tmp_path / 'planar.csv'))
+    finally:
+        set_planar_network(None)
+    assert order_store.kpis()['delivered'] == sum(o.status == 'delivered' for o in orders) > 0